@@ -36,11 +36,427 @@ Here is an example of constructing a simple feature file using fontFeatures::
     font.save("Test-liga.ttf")
 """
 
-from collections import OrderedDict
+from collections import OrderedDict, Counter
 from fontTools.feaLib.ast import ValueRecord as feaLibValueRecord
 from fontTools.feaLib.variableScalar import VariableScalar
 from itertools import chain
-from copy import copy
+from copy import copy, deepcopy
+from hashlib import sha1
+from weakref import WeakSet
+
+
+def _dependOn(obj, dependent):
+    # Calls dependent.changed() the next time obj is changed. Values which
+    # depend on other rules and routines (such as the stage of a chaining
+    # rule) register themselves this way when they are computed.
+    dependents = obj.__dict__.get("_dependents")
+    if dependents is None:
+        dependents = obj.__dict__["_dependents"] = WeakSet()
+    dependents.add(dependent)
+
+
+def _notifyDependents(obj):
+    # Dependents are forgotten first, so that cycles end
+    dependents = obj.__dict__.pop("_dependents", None)
+    if dependents:
+        for dependent in list(dependents):
+            dependent.changed()
+
+
+def _withoutDependents(obj):
+    # Copies and pickles of an object have no dependents of their own
+    state = obj.__dict__.copy()
+    state.pop("_dependents", None)
+    return state
+
+
+class RoutineList(list):
+    """A list of routines which indexes its contents.
+
+    Used for :py:attr:`FontFeatures.routines`, so that routines can be found
+    by name and tested for membership in constant time, while code which
+    modifies the list directly keeps working."""
+
+    def __init__(self, routines=()):
+        super().__init__(routines)
+        self._ids = {}
+        self._names = None
+        self.version = 0  #: Incremented whenever routines are added or removed.
+        self._added(self)
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+    def _added(self, routines, at_end=False):
+        self.version += 1
+        for r in routines:
+            self._ids[id(r)] = self._ids.get(id(r), 0) + 1
+            if at_end and self._names is not None:
+                self._names.setdefault(r.name, r)
+        if not at_end:
+            self._names = None
+
+    def _removed(self, routines):
+        self.version += 1
+        for r in routines:
+            count = self._ids[id(r)] - 1
+            if count:
+                self._ids[id(r)] = count
+            else:
+                del self._ids[id(r)]
+        self._names = None
+
+    def _reindex(self):
+        self._ids = {}
+        self._added(self)
+
+    def named(self, name):
+        """Returns the first routine with the given name, or ``None``."""
+        fresh = self._names is None
+        if fresh:
+            self._names = {}
+            for r in self:
+                self._names.setdefault(r.name, r)
+        r = self._names.get(name)
+        if r is not None and r.name == name:
+            return r
+        if fresh:
+            return None
+        # Routines may have been renamed since the index was built
+        self._names = None
+        return self.named(name)
+
+    def __contains__(self, routine):
+        return id(routine) in self._ids
+
+    def append(self, routine):
+        super().append(routine)
+        self._added([routine], at_end=True)
+
+    def extend(self, routines):
+        routines = list(routines)
+        super().extend(routines)
+        self._added(routines, at_end=True)
+
+    def __iadd__(self, routines):
+        self.extend(routines)
+        return self
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._reindex()
+        return self
+
+    def insert(self, index, routine):
+        super().insert(index, routine)
+        self._added([routine])
+
+    def remove(self, routine):
+        super().remove(routine)
+        self._removed([routine])
+
+    def pop(self, index=-1):
+        routine = super().pop(index)
+        self._removed([routine])
+        return routine
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, key, value):
+        old = self[key]
+        if isinstance(key, slice):
+            value = list(value)
+            super().__setitem__(key, value)
+            self._removed(old)
+            self._added(value)
+        else:
+            super().__setitem__(key, value)
+            self._removed([old])
+            self._added([value])
+
+    def __delitem__(self, key):
+        old = self[key]
+        super().__delitem__(key)
+        self._removed(old if isinstance(key, slice) else [old])
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._names = None
+
+    def reverse(self):
+        super().reverse()
+        self._names = None
+
+
+def _class_key(glyphs):
+    return frozenset(Counter(glyphs).items())
+
+
+class _ClassList(list):
+    # A glyph class stored in a NamedClassDict. Modifying it in place
+    # discards the index of the dictionary which holds it.
+    __slots__ = ("_owner",)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def modify(self, *args):
+        result = method(self, *args)
+        self._owner._by_glyphs = None
+        return result
+
+    modify.__name__ = name
+    return modify
+
+
+for _name in [
+    "append",
+    "extend",
+    "insert",
+    "remove",
+    "pop",
+    "clear",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+]:
+    setattr(_ClassList, _name, _invalidating(_name))
+
+
+class NamedClassDict(dict):
+    """A dictionary of named glyph classes which indexes its contents.
+
+    Used for :py:attr:`FontFeatures.namedClasses`, so that the name of a
+    class can be found from its glyphs without comparing it against every
+    other class. Classes given as lists are stored as copies which keep
+    the index up to date when they are modified in place; classes of other
+    mutable types should be replaced rather than modified."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._by_glyphs = None
+        for name, glyphs in dict(*args, **kwargs).items():
+            super().__setitem__(name, self._tracked(glyphs))
+
+    def _tracked(self, glyphs):
+        if isinstance(glyphs, list) and getattr(glyphs, "_owner", None) is not self:
+            glyphs = _ClassList(glyphs)
+            glyphs._owner = self
+        return glyphs
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def nameFor(self, glyphs):
+        """Returns the name of the first class containing exactly the given
+        glyphs (in any order), or ``None``."""
+        key = _class_key(glyphs)
+        fresh = self._by_glyphs is None
+        if fresh:
+            self._by_glyphs = {}
+            for name, members in self.items():
+                self._by_glyphs.setdefault(_class_key(members), name)
+        name = self._by_glyphs.get(key)
+        if name is None:
+            return None
+        if name in self and _class_key(self[name]) == key:
+            return name
+        if fresh:
+            return None
+        # The class has been modified since the index was built
+        self._by_glyphs = None
+        return self.nameFor(glyphs)
+
+    def __setitem__(self, name, glyphs):
+        replacing = name in self
+        glyphs = self._tracked(glyphs)
+        super().__setitem__(name, glyphs)
+        if replacing:
+            self._by_glyphs = None
+        elif self._by_glyphs is not None:
+            self._by_glyphs.setdefault(_class_key(glyphs), name)
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._by_glyphs = None
+
+    def pop(self, *args):
+        self._by_glyphs = None
+        return super().pop(*args)
+
+    def popitem(self):
+        self._by_glyphs = None
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self._by_glyphs = None
+
+    def setdefault(self, name, glyphs=None):
+        if name not in self:
+            self[name] = glyphs
+        return self[name]
+
+    def update(self, *args, **kwargs):
+        for name, glyphs in dict(*args, **kwargs).items():
+            self[name] = glyphs
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("%s objects are read-only" % type(self).__name__)
+
+
+class _FrozenDict(dict):
+    # A dictionary which cannot be modified, used by FrozenFontFeatures
+    __setitem__ = __delitem__ = pop = popitem = clear = _read_only
+    setdefault = update = __ior__ = _read_only
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+class _FrozenNamedClassDict(NamedClassDict):
+    __setitem__ = __delitem__ = pop = popitem = clear = _read_only
+    setdefault = update = __ior__ = _read_only
+
+
+class GlyphTable:
+    """Canonical copies of glyph names and glyph slots.
+
+    Used by :py:meth:`FontFeatures.compact` to store the slots of rules as
+    tuples, so that each distinct slot, sequence of slots and glyph name is
+    held in memory only once however many rules use it."""
+
+    def __init__(self):
+        self.names = {}
+        self.slots = {}
+        self.sequences = {}
+
+    def glyph(self, name):
+        """Returns the canonical copy of a glyph name."""
+        return self.names.setdefault(name, name)
+
+    def slot(self, glyphs):
+        """Returns the canonical tuple of the given glyph names."""
+        slot = tuple(self.glyph(g) for g in glyphs)
+        return self.slots.setdefault(slot, slot)
+
+    def sequence(self, slots):
+        """Returns the canonical tuple of the given slots."""
+        sequence = tuple(self.slot(s) for s in slots)
+        return self.sequences.setdefault(sequence, sequence)
+
+    def __len__(self):
+        return len(self.slots)
+
+
+# Fingerprints are digests of the repr of nested tuples, so anything which
+# goes into them must have a repr which depends only on its contents.
+def _digest(structure):
+    return sha1(repr(structure).encode("utf-8")).hexdigest()
+
+
+def _slots_key(slots):
+    if slots is None:
+        return None
+    return tuple(
+        slot
+        if isinstance(slot, str)
+        else tuple(sorted(slot))
+        if isinstance(slot, (set, frozenset))
+        else tuple(slot)
+        for slot in slots
+    )
+
+
+def _glyphset_key(glyphs):
+    if glyphs is None or isinstance(glyphs, str):
+        return glyphs
+    return tuple(sorted(glyphs))
+
+
+def _languages_key(languages):
+    return tuple(tuple(pair) for pair in languages or [])
+
+
+_value_attributes = [
+    "xPlacement",
+    "yPlacement",
+    "xAdvance",
+    "yAdvance",
+    "xPlaDevice",
+    "yPlaDevice",
+    "xAdvDevice",
+    "yAdvDevice",
+    "vertical",
+]
+
+
+def _value_key(valuerecord):
+    if valuerecord is None:
+        return None
+    return tuple(getattr(valuerecord, a, None) for a in _value_attributes)
+
+
+def _attribute_key(name, value, routines):
+    if name in _glyph_slot_names:
+        return _slots_key(value)
+    if name == "lookups":
+        return _lookups_key(value, routines)
+    if name == "languages":
+        return _languages_key(value)
+    if isinstance(value, feaLibValueRecord):
+        return _value_key(value)
+    if isinstance(value, dict):
+        return tuple(
+            sorted((k, _attribute_key(k, v, routines)) for k, v in value.items())
+        )
+    if isinstance(value, (list, tuple)):
+        return tuple(_attribute_key(None, v, routines) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    return value
+
+
+def _lookups_key(lookups, routines):
+    def lookup_key(lookup):
+        if isinstance(lookup, RoutineReference):
+            if lookup.routine is None:
+                return lookup.name
+            lookup = lookup.routine
+        return lookup._fingerprint(routines)
+
+    return tuple(
+        tuple(lookup_key(lookup) for lookup in lookuplist) if lookuplist else None
+        for lookuplist in lookups or []
+    )
+
+
+def _languages_overlap(a, b):
+    # No languages means everywhere, and the default script and language
+    # are also applied to the scripts and languages listed alongside them
+    if not a or not b:
+        return True
+
+    def match(x, y, default):
+        return x == y or x in default or y in default
+
+    return any(
+        match(s1, s2, ("DFLT", "*")) and match(l1, l2, ("dflt", "*"))
+        for s1, l1 in a
+        for s2, l2 in b
+    )
 
 
 class FontFeatures:
@@ -49,10 +465,8 @@ class FontFeatures:
     The initializer has no parameters."""
 
     def __init__(self):
-        self.namedClasses = (
-            {}
-        )  #: A mapping of named classes to a list of glyph names which make up the class.
-        self.routines = []  #: All of the layout routines used in this font.
+        self.namedClasses = {}
+        self.routines = []
         self.features = (
             OrderedDict()
         )  #: An ordered dictionary mapping feature tags to a list of routine references.
@@ -63,9 +477,45 @@ class FontFeatures:
         self.glyphclasses = {}  #: A dictionary mapping glyph names to their categories.
         self.scratch = {}  #: Space for items to communicate context to each other.
         self.doneUsageMarking = False
+        self._version = 0
+        self._usage_key = None
+        self._language_index = None
+        self.glyphTable = None  #: A :py:class:`GlyphTable` if slots are compact.
+
+    @property
+    def namedClasses(self):
+        """A mapping of named classes to a list of glyph names which make up
+        the class.
+
+        This is a :py:class:`NamedClassDict`; dictionaries assigned to it are
+        converted."""
+        return self._namedClasses
+
+    @namedClasses.setter
+    def namedClasses(self, classes):
+        if not isinstance(classes, NamedClassDict):
+            classes = NamedClassDict(classes)
+        self._namedClasses = classes
+
+    @property
+    def routines(self):
+        """All of the layout routines used in this font.
+
+        This is a :py:class:`RoutineList`; lists assigned to it are
+        converted."""
+        return self._routines
+
+    @routines.setter
+    def routines(self, routines):
+        if not isinstance(routines, RoutineList):
+            routines = RoutineList(routines)
+        self._routines = routines
 
     def __add__(self, other):
-        """Combine two FontFeatures objects together."""
+        """Combine two FontFeatures objects together.
+
+        The result is a new object; to combine many objects, or to control
+        what happens to classes with the same name, use :py:meth:`merge`."""
         combined = FontFeatures()
         for k in [
             "namedClasses",
@@ -82,6 +532,214 @@ class FontFeatures:
                 setattr(combined, k, getattr(self, k) + getattr(other, k))
         return combined
 
+    def merge(self, *others, collision="rename"):
+        """Moves the contents of other FontFeatures objects into this one.
+
+        Unlike adding objects together, this modifies this object in place,
+        so merging many objects takes time in proportion to their total size.
+        Routines, named classes, anchors, glyph categories and symbol counters
+        are carried over, and the routines of features found in more than one
+        object are joined together. Routines are shared with the other
+        objects, not copied, unless classes they refer to are renamed; in
+        that case the routines of that object are copied before the rules
+        are changed, and the copies are merged.
+
+        A named class made up of the same glyphs, in the same order, as a
+        class already stored is not stored again, and glyph slots of the
+        incoming rules which refer to it by name (``@name``) are changed to
+        refer to the stored class. What happens to a class which has the same
+        name as a stored class but different glyphs depends on ``collision``:
+
+        - ``"rename"``: it is stored under a new name, and slots which refer
+          to it are changed to match.
+        - ``"keep"``: the stored class is kept.
+        - ``"replace"``: it replaces the stored class.
+        - ``"error"``: a ``ValueError`` is raised.
+
+        Anchors are merged glyph by glyph. An anchor which is already stored
+        at a different position is kept with ``"keep"``, raises a
+        ``ValueError`` with ``"error"``, and is replaced otherwise. Errors are
+        raised before any part of the offending object is merged.
+
+        Args:
+            others: :py:class:`FontFeatures` objects.
+            collision (str): The policy for names which are already used.
+
+        Returns: this object."""
+        if collision not in ("rename", "keep", "replace", "error"):
+            raise ValueError("Unknown collision policy '%s'" % collision)
+        for other in others:
+            classes, references = self._mergeClassNames(other, collision)
+            anchors = self._mergeAnchors(other, collision)
+
+            self.namedClasses.update(classes)
+            for glyph, glyphanchors in anchors:
+                self.anchors.setdefault(glyph, {}).update(glyphanchors)
+            if references:
+                # Rename in a copy, so that the other object is unchanged
+                other = _copyKeepingFonts(other, list(other.allRules()))
+                for rule in other.allRules():
+                    rule._renameClassReferences(references)
+            for routine in other.routines:
+                if routine not in self.routines:
+                    self.routines.append(routine)
+            for tag, lookups in other.features.items():
+                self.features.setdefault(tag, []).extend(lookups)
+            self.glyphclasses.update(other.glyphclasses)
+            for category, value in other.symbols.items():
+                self.symbols[category] = max(self.symbols.get(category, 0), value)
+        return self
+
+    def _mergeClassNames(self, other, collision):
+        # Works out which of another object's classes to store under which
+        # names, and which references to them need changing
+        classes = {}
+        references = {}
+
+        def stored(name):
+            if name in classes:
+                return classes[name]
+            return self.namedClasses.get(name)
+
+        for name, glyphs in other.namedClasses.items():
+            existing = self.classNameFor(glyphs)
+            if existing is not None and list(self.namedClasses[existing]) == list(
+                glyphs
+            ):
+                if existing != name:
+                    references["@" + name] = "@" + existing
+                continue
+            current = stored(name)
+            if current is None or list(current) == list(glyphs):
+                classes[name] = glyphs
+                continue
+            if collision == "error":
+                raise ValueError("Glyph class '%s' is already defined" % name)
+            if collision == "keep":
+                continue
+            if collision == "rename":
+                i = 1
+                while (
+                    stored("%s_%i" % (name, i)) is not None
+                    or "%s_%i" % (name, i) in other.namedClasses
+                ):
+                    i = i + 1
+                references["@" + name] = "@%s_%i" % (name, i)
+                name = "%s_%i" % (name, i)
+            classes[name] = glyphs
+        return classes, references
+
+    def _mergeAnchors(self, other, collision):
+        anchors = []
+        for glyph, glyphanchors in other.anchors.items():
+            existing = self.anchors.get(glyph, {})
+            if collision in ("keep", "error"):
+                clashes = [
+                    name
+                    for name, position in glyphanchors.items()
+                    if name in existing and existing[name] != position
+                ]
+                if clashes and collision == "error":
+                    raise ValueError(
+                        "Anchor '%s' of glyph '%s' is already defined"
+                        % (clashes[0], glyph)
+                    )
+                glyphanchors = {
+                    name: position
+                    for name, position in glyphanchors.items()
+                    if name not in clashes
+                }
+            anchors.append((glyph, glyphanchors))
+        return anchors
+
+    def compact(self):
+        """Stores the glyph slots of all rules compactly.
+
+        The slots of each rule become tuples of tuples of glyph names, shared
+        between all rules with identical slots. Rules and routines added
+        later are not compacted until this is called again. Code which
+        modifies slots in place must assign new ones instead once they are
+        compacted."""
+        if self.glyphTable is None:
+            self.glyphTable = GlyphTable()
+        for routine in self.routines:
+            routine.compact(self.glyphTable)
+
+    def freeze(self):
+        """Returns a read-only snapshot of this object.
+
+        See :py:class:`FrozenFontFeatures`. Later changes to this object do
+        not affect the snapshot."""
+        return FrozenFontFeatures(self)
+
+    def _workingCopy(self):
+        # The exporters split, rename and reorder routines, bubble flags and
+        # languages up from rules and add named classes. They do all this to
+        # a copy with its own routines, rules, lookup lists and dictionaries,
+        # which shares the glyph slots, value records and anchors of this
+        # object, so that exporting leaves it unchanged.
+        routines = {}
+
+        def copyRoutine(routine):
+            if id(routine) in routines:
+                return routines[id(routine)]
+            new = routines[id(routine)] = copy(routine)
+            new.__dict__.pop("_frozen", None)
+            if isinstance(routine, ExtensionRoutine):
+                new.routines = [copyRoutine(r) for r in routine.routines]
+            else:
+                new.rules = [copyRule(r) for r in routine.rules]
+            new.usedin = set()
+            new.comments = list(routine.comments)
+            new.languages = list(routine.languages or [])
+            return new
+
+        def copyRule(rule):
+            new = copy(rule)
+            for name in ["_frozen", "_compiled_slots", "_derived"]:
+                new.__dict__.pop(name, None)
+            if getattr(rule, "languages", None) is not None:
+                new.languages = list(rule.languages)
+            if getattr(rule, "lookups", None):
+                new.lookups = [
+                    [copyLookup(lookup) for lookup in lookuplist]
+                    if lookuplist
+                    else lookuplist
+                    for lookuplist in rule.lookups
+                ]
+            for name in ["bases", "marks"]:
+                if isinstance(getattr(rule, name, None), dict):
+                    setattr(new, name, dict(getattr(rule, name)))
+            return new
+
+        def copyLookup(lookup):
+            if isinstance(lookup, RoutineReference):
+                new = copy(lookup)
+                if lookup.routine is not None:
+                    new.routine = copyRoutine(lookup.routine)
+                return new
+            if isinstance(lookup, Routine):
+                return copyRoutine(lookup)
+            return lookup
+
+        ff = FontFeatures()
+        fresh = set(ff.__dict__)
+        for name, value in self.__dict__.items():
+            if name not in fresh and name not in ("fingerprint", "_names"):
+                ff.__dict__[name] = value
+        ff.namedClasses = dict(self.namedClasses)
+        ff.routines = [copyRoutine(r) for r in self.routines]
+        ff.features = OrderedDict(
+            (tag, [copyLookup(lookup) for lookup in lookups])
+            for tag, lookups in self.features.items()
+        )
+        ff.anchors = {glyph: dict(anchors) for glyph, anchors in self.anchors.items()}
+        ff.symbols = dict(self.symbols)
+        ff.glyphclasses = dict(self.glyphclasses)
+        ff.scratch = dict(self.scratch)
+        ff.glyphTable = self.glyphTable
+        return ff
+
     def gensym(self, category):
         """Generate a new unique symbol (used for labeling unlabeled data).
 
@@ -102,10 +760,10 @@ class FontFeatures:
 
         Returns: a :py:class:`Routine` object if the named routine was found
           in the features object. Raises a ``ValueError`` if not."""
-        for r in self.routines:
-            if r.name == name:
-                return r
-        raise ValueError("Can't find routine '%s'" % name)
+        r = self.routines.named(name)
+        if r is None:
+            raise ValueError("Can't find routine '%s'" % name)
+        return r
 
     def referenceRoutine(self, r, do_usecount=True):
         """Store a routine and return a reference to it.
@@ -122,6 +780,18 @@ class FontFeatures:
             r.usecount = r.usecount + 1
         return RoutineReference(routine=r)
 
+    def classNameFor(self, glyphs):
+        """Finds the name of a glyph class.
+
+        Args:
+            glyphs: A sequence of glyph names.
+
+        Returns:
+            The name of the stored glyph class made up of exactly these
+            glyphs, or ``None`` if there is no such class.
+        """
+        return self.namedClasses.nameFor(glyphs)
+
     def getNamedClassFor(self, glyphs, name):
         """Find and optionally stores a named class of glyphs
 
@@ -135,9 +805,9 @@ class FontFeatures:
             class will be returned. If not, then the class will be stored
             and the name provided as the ``name`` argument will be returned.
         """
-        for k, v in self.namedClasses.items():
-            if sorted(glyphs) == sorted(v):
-                return k
+        existing = self.classNameFor(glyphs)
+        if existing is not None:
+            return existing
         self.namedClasses[name] = glyphs
         return name
 
@@ -181,12 +851,18 @@ class FontFeatures:
         Generally used when converting the fontFeatures object to another
         format; allows routines to know where they are being used by annotating
         them with the ``.usedin`` property for optimization purposes.
+
+        The annotations are kept up to date by :py:meth:`partitionRoutine`,
+        and are only recomputed when rules, lookups or the routine list have
+        been changed in some other way since they were made.
         """
-        if self.doneUsageMarking:
+        if self.doneUsageMarking and self._usage_key == self._usageKey():
             return
         for r in self.routines:
             r.usedin = set()
+            _dependOn(r, self)
         for chain_rule in self.allRules(Chaining):
+            _dependOn(chain_rule, self)
             for routinelist in chain_rule.lookups:
                 if not routinelist:
                     continue
@@ -198,10 +874,55 @@ class FontFeatures:
                     else:
                         routine.usedin.add(chain_rule)
         self.doneUsageMarking = True
+        self._usage_key = self._usageKey()
+
+    def _usageKey(self):
+        return (self._version, id(self.routines), self.routines.version)
+
+    def changed(self):
+        """Discards the chain usage marking and the script and language index.
+
+        This is done automatically when the rules or languages of a routine
+        used to make them are reassigned, or when the lookups or languages
+        of one of their rules are."""
+        self._version += 1
+
+    @property
+    def scripts_and_languages(self):
+        """An ordered dictionary mapping each script used by the routines (or,
+        failing that, by their rules) to the list of languages used with it.
+
+        This is worked out when it is first needed, and kept until rules,
+        lookups, languages or the routine list are changed. Language lists
+        modified in place, rather than reassigned, are only noticed once the
+        ``changed()`` method of their routine or rule has been called."""
+        return self._languageIndex()[0]
+
+    @property
+    def routinesByLanguage(self):
+        """A dictionary mapping ``(script, language)`` pairs to the frozenset
+        of routines whose ``languages`` include them.
+
+        This is kept up to date in the same way as
+        :py:attr:`scripts_and_languages`."""
+        return self._languageIndex()[1]
 
     def hoist_languages(self):
-        """Sort routines into scripts and languages and resolve wildcards."""
+        """Sort routines into scripts and languages and resolve wildcards.
+
+        The result is :py:attr:`scripts_and_languages`; this only brings it
+        up to date."""
+        self._languageIndex()
+
+    def _languageIndex(self):
+        key = self._usageKey()
+        if self._language_index is None or self._language_index[0] != key:
+            self._language_index = (key, self._hoistLanguages())
+        return self._language_index[1]
+
+    def _hoistLanguages(self):
         scripts = OrderedDict()
+        by_language = {}
         count = 0
 
         def add_language(p):
@@ -217,11 +938,15 @@ class FontFeatures:
                 scripts[script].append(lang)
 
         for k in self.routines:
+            _dependOn(k, self)
             if k.languages:
                 for lang in k.languages:
                     add_language(lang)
-            else:
+                    by_language.setdefault(tuple(lang), set()).add(k)
+            elif not k.pending:
+                # Rules read from a binary font carry no languages
                 for r in k.rules:
+                    _dependOn(r, self)
                     for lang in r.languages or []:
                         add_language(lang)
 
@@ -231,7 +956,7 @@ class FontFeatures:
         # if count > 0 and not "dflt" in scripts["DFLT"]:
         #     scripts["DFLT"].insert(0, "dflt")
 
-        self.scripts_and_languages = scripts
+        return scripts, {k: frozenset(v) for k, v in by_language.items()}
 
     def hasScriptSupport(self, script):
         """Check if the features object has support for a particular script.
@@ -249,9 +974,13 @@ class FontFeatures:
 
         Checks that all routines referenced in chain rules can actually
         be found within the object, and adds pointers to match named routine
-        references with the relevant :py:class:`Routine` object.
+        references with the relevant :py:class:`Routine` object. Routines
+        whose rules are still pending are skipped, as the references they
+        make are resolved when they are read.
         """
         for routine in self.routines:
+            if routine.pending:
+                continue
             for r in routine.rules:
                 if not isinstance(r, Chaining):
                     continue
@@ -302,9 +1031,17 @@ class FontFeatures:
         the ``.routines`` list of the FontFeatures object."""
         if not routine.rules:
             return
-        self.doneUsageMarking = False
         self.markRoutineUseInChains()
+        allroutines = self._splitRoutine(routine, factor)
+        # Moving rules between routines leaves the chains calling them as
+        # they were, so the usage marking is still good.
+        self._usage_key = self._usageKey()
 
+        self.replaceRoutineWithSplitList(routine, allroutines)
+        self._usage_key = self._usageKey()
+        return allroutines
+
+    def _splitRoutine(self, routine, factor):
         split_routines = {}
         # The first rule stays in the original
         split_routines[factor(routine.rules[0])] = (routine, [routine.rules[0]])
@@ -321,15 +1058,181 @@ class FontFeatures:
         # the fly because we were iterating over it).
         routine_with_first_rule, rulelist = split_routines[factor(routine.rules[0])]
         routine_with_first_rule.rules = rulelist
+        return [x[0] for x in split_routines.values()]
+
+    def partitionAll(self, factor, routines=None):
+        """Splits many routines based on a predicate.
 
-        allroutines = [x[0] for x in split_routines.values()]
-        return self.replaceRoutineWithSplitList(routine, allroutines)
+        This has the same effect as calling :py:meth:`partitionRoutine` on
+        each routine in turn, but computes all of the splits first, and then
+        updates the routine list, chaining lookups and features in a single
+        pass over each.
+
+        Args:
+            factor: A function applied to each of the :py:class:`Rule` objects.
+            routines: A sequence of :py:class:`Routine` objects to split.
+                Defaults to all routines in the FontFeatures object.
+
+        Returns: A dictionary mapping each routine which has rules to the list
+        of routines it was split into, the first of which is the routine
+        itself. Additionally, modifies the ``.routines`` list of the
+        FontFeatures object."""
+        self.markRoutineUseInChains()
+        if routines is None:
+            routines = list(self.routines)
+        partitioned = {}
+        for routine in routines:
+            if routine.rules and routine not in partitioned:
+                partitioned[routine] = self._splitRoutine(routine, factor)
+        split = {id(r): pieces for r, pieces in partitioned.items() if len(pieces) > 1}
+
+        if split:
+            self.routines[:] = [
+                piece for r in self.routines for piece in split.get(id(r), [r])
+            ]
+
+            def expand(lookuplist):
+                if not lookuplist:
+                    return
+                expanded = []
+                for lookup in lookuplist:
+                    if isinstance(lookup, RoutineReference):
+                        pieces = split.get(id(lookup.routine))
+                    else:
+                        pieces = split.get(id(lookup))
+                    if pieces:
+                        expanded.extend(RoutineReference(routine=r) for r in pieces)
+                    else:
+                        expanded.append(lookup)
+                if len(expanded) != len(lookuplist):
+                    lookuplist[:] = expanded
+
+            for chain_rule in self.allRules(Chaining):
+                for lookuplist in chain_rule.lookups:
+                    expand(lookuplist)
+            for lookuplist in self.features.values():
+                expand(lookuplist)
+            for routine, pieces in partitioned.items():
+                for piece in pieces[1:]:
+                    piece.usedin = set(routine.usedin)
+
+        self._usage_key = self._usageKey()
+        return partitioned
+
+    def deduplicateRoutines(self):
+        """Merges routines which do the same thing.
+
+        Routines with the same :py:attr:`Routine.fingerprint` are merged into
+        the first of them: lookups and features which referred to the others
+        refer to it instead, and the others are removed from the ``.routines``
+        list. Routines which are only called from chaining rules are always
+        merged. Routines applied by features are only merged when that cannot
+        change the result: the two must not apply to the same script and
+        language, and no routine applied by features between them which does
+        may involve the same glyphs, since the merged routine is applied in
+        place of the first. The languages of a merged routine are added to the first.
+
+        Returns: A dictionary mapping each removed routine to the routine it
+        was merged into."""
+        self.resolveAllRoutines()
+        featured = set()
+        for lookuplist in self.features.values():
+            for lookup in lookuplist:
+                if isinstance(lookup, RoutineReference):
+                    lookup.resolve(self)
+                    lookup = lookup.routine
+                featured.add(id(lookup))
+
+        reach = {}
+
+        def glyphs_reached(routine):
+            # Glyphs made by the routines a chain calls may be matched too
+            if id(routine) not in reach:
+                reach[id(routine)] = routine.involved_glyphs.union(
+                    *(dep.involved_glyphs for dep in routine.dependencies)
+                )
+            return reach[id(routine)]
+
+        def mergeable(keeper, routine, between):
+            if id(routine) not in featured:
+                return True
+            if id(keeper) in featured and _languages_overlap(
+                keeper.languages, routine.languages
+            ):
+                return False
+            # Routines which are only called from chains are not applied
+            # where they are in the list
+            glyphs = glyphs_reached(routine)
+            return not any(
+                id(r) in featured
+                and _languages_overlap(r.languages, routine.languages)
+                and glyphs & glyphs_reached(r)
+                for r in between
+            )
+
+        fingerprints = {}
+        kept = {}
+        merged = {}
+        routines = list(self.routines)
+        for index, routine in enumerate(routines):
+            candidates = kept.setdefault(routine._fingerprint(fingerprints), [])
+            for keeper_index, keeper in candidates:
+                if not mergeable(keeper, routine, routines[keeper_index + 1 : index]):
+                    continue
+                merged[routine] = keeper
+                keeper.usecount += routine.usecount
+                keeper.usedin = keeper.usedin | routine.usedin
+                if id(routine) in featured:
+                    if id(keeper) in featured:
+                        keeper.languages = keeper.languages + [
+                            l for l in routine.languages if l not in keeper.languages
+                        ]
+                    else:
+                        keeper.languages = list(routine.languages)
+                        featured.add(id(keeper))
+                break
+            else:
+                candidates.append((index, routine))
+
+        if not merged:
+            return merged
+        replacements = {id(r): keeper for r, keeper in merged.items()}
+        keepers = {id(keeper) for keeper in merged.values()}
+        self.routines[:] = [r for r in routines if id(r) not in replacements]
+
+        def repoint(lookup):
+            routine = lookup.routine if isinstance(lookup, RoutineReference) else lookup
+            keeper = replacements.get(id(routine))
+            if keeper is None:
+                return lookup, routine
+            return RoutineReference(routine=keeper), keeper
+
+        for rule in self.allRules():
+            for lookuplist in getattr(rule, "lookups", None) or []:
+                if lookuplist:
+                    lookuplist[:] = [repoint(lookup)[0] for lookup in lookuplist]
+        for lookuplist in self.features.values():
+            # A feature which applied both routines now applies the first once
+            seen = set()
+            repointed = []
+            for lookup in lookuplist:
+                lookup, routine = repoint(lookup)
+                if id(routine) in keepers:
+                    if id(routine) in seen:
+                        continue
+                    seen.add(id(routine))
+                repointed.append(lookup)
+            lookuplist[:] = repointed
+        return merged
 
     def replaceRoutineWithSplitList(self, routine, allroutines):
         self.markRoutineUseInChains()
         index = self.routines.index(routine)
         usedin = routine.usedin
         self.routines[index : index + 1] = allroutines
+        for r in allroutines:
+            if r is not routine:
+                r.usedin = set(usedin)
         for user in usedin:
             for lookuplist in user.lookups:
                 if lookuplist is None:
@@ -366,6 +1269,216 @@ class FontFeatures:
     from .ttLib.FontFeatures import buildBinaryFeatures
 
 
+def _copyKeepingFonts(obj, rules):
+    # Attachment rules refer to their font, which is not copied
+    fonts = {id(rule.font): rule.font for rule in rules if getattr(rule, "font", None)}
+    return deepcopy(obj, fonts)
+
+
+def _frozenLanguages(languages):
+    if languages is None:
+        return None
+    return tuple(tuple(pair) if isinstance(pair, list) else pair for pair in languages)
+
+
+def _freezeRule(rule):
+    # Glyph slots become nested tuples, if compaction has not made them so
+    for name in _glyph_slot_names:
+        slots = getattr(rule, name, None)
+        if isinstance(slots, (list, tuple)):
+            rule.__dict__[name] = tuple(
+                slot if isinstance(slot, str) else tuple(slot) for slot in slots
+            )
+    if getattr(rule, "lookups", None) is not None:
+        rule.__dict__["lookups"] = tuple(
+            tuple(lookuplist) if lookuplist else lookuplist
+            for lookuplist in rule.lookups
+        )
+    for name in ["bases", "marks"]:
+        if isinstance(getattr(rule, name, None), dict):
+            rule.__dict__[name] = _FrozenDict(getattr(rule, name))
+    if getattr(rule, "languages", None) is not None:
+        rule.__dict__["languages"] = _frozenLanguages(rule.languages)
+    rule._frozen = True
+
+
+def _thawRule(rule):
+    rule.__dict__.pop("_frozen", None)
+    if getattr(rule, "lookups", None) is not None:
+        rule.lookups = [
+            list(lookuplist) if lookuplist else lookuplist
+            for lookuplist in rule.lookups
+        ]
+    for name in ["bases", "marks"]:
+        if isinstance(getattr(rule, name, None), dict):
+            setattr(rule, name, dict(getattr(rule, name)))
+    if getattr(rule, "languages", None) is not None:
+        rule.languages = list(rule.languages)
+
+
+def _withExtensions(routines):
+    for routine in routines:
+        yield routine
+        if isinstance(routine, ExtensionRoutine):
+            yield from routine.routines
+
+
+class FrozenFontFeatures(FontFeatures):
+    """A read-only snapshot of a :py:class:`FontFeatures` object.
+
+    Made by :py:meth:`FontFeatures.freeze`. Routine references are resolved,
+    glyph slots are compacted, and the chain usage marking, script and
+    language index, stage, involved glyphs and shaping coverage of each
+    routine are all worked out when the snapshot is made, and never need
+    recomputing. The routine list, the rules of each routine and their
+    glyph slots, lookups and languages are tuples, the dictionaries cannot
+    be modified, methods which would change the object raise a
+    ``TypeError``, and setting attributes of the object, its routines or
+    their rules raises an ``AttributeError``.
+
+    The shaper and the exporters to feature code and binary tables use a
+    snapshot as it is. A mutable copy can be made with :py:meth:`thaw`.
+
+    Snapshots can be pickled, and have a ``fingerprint``, a hash of their
+    routines, features, classes, anchors and glyph categories; snapshots
+    with the same fingerprint compare equal and hash alike. To share one
+    between forked worker processes, make it before forking (and consider
+    ``gc.freeze()``), so that no worker needs to write to it."""
+
+    def __init__(self, ff):
+        ff = _copyKeepingFonts(ff, ff.allRules())
+        ff.resolveAllRoutines()
+        for tag, lookups in ff.features.items():
+            ff.features[tag] = ff.ensureLookupsAreReferences(lookups) or []
+        ff.compact()
+        ff.markRoutineUseInChains()
+        scripts, by_language = ff._languageIndex()
+        state = self.__dict__
+        state.update(ff.__dict__)
+        state["_routines"] = tuple(ff.routines)
+        state["_names"] = {}
+        for routine in reversed(state["_routines"]):
+            state["_names"][routine.name] = routine
+        state["_namedClasses"] = _FrozenNamedClassDict(
+            (name, tuple(glyphs)) for name, glyphs in ff.namedClasses.items()
+        )
+        state["features"] = _FrozenDict(
+            (tag, tuple(lookups)) for tag, lookups in ff.features.items()
+        )
+        state["anchors"] = _FrozenDict(
+            (glyph, _FrozenDict(anchors)) for glyph, anchors in ff.anchors.items()
+        )
+        state["glyphclasses"] = _FrozenDict(ff.glyphclasses)
+        state["symbols"] = _FrozenDict(ff.symbols)
+        state["scratch"] = _FrozenDict(ff.scratch)
+        state["_language_index"] = _FrozenDict(
+            (script, tuple(languages)) for script, languages in scripts.items()
+        ), _FrozenDict(by_language)
+        state["_usage_key"] = self._usageKey()
+
+        namedClasses = self.namedClasses
+        namedClasses.nameFor(())
+        fingerprints = {}
+        for routine in _withExtensions(self.routines):
+            routine.rules = tuple(routine.rules)
+            routine.usedin = frozenset(routine.usedin)
+            routine.comments = tuple(routine.comments)
+            routine.languages = _frozenLanguages(routine.languages)
+            routine._frozen = True
+            for rule in routine.rules:
+                _freezeRule(rule)
+                if isinstance(rule, Chaining):
+                    rule.stage
+            routine.stage
+            routine.involved_glyphs
+            if not isinstance(routine, ExtensionRoutine):
+                routine.glyph_digest(namedClasses)
+                routine.coverage_index(namedClasses)
+        state["fingerprint"] = _digest(
+            (
+                tuple(r._fingerprint(fingerprints) for r in self.routines),
+                tuple(
+                    (tag, tuple(r.routine._fingerprint(fingerprints) for r in lookups))
+                    for tag, lookups in self.features.items()
+                ),
+                tuple(sorted((k, v) for k, v in namedClasses.items())),
+                tuple(sorted((k, sorted(v.items())) for k, v in self.anchors.items())),
+                tuple(sorted(self.glyphclasses.items())),
+            )
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenFontFeatures objects are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenFontFeatures objects are read-only")
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenFontFeatures):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def freeze(self):
+        """Returns this snapshot, which is already frozen."""
+        return self
+
+    def thaw(self):
+        """Returns a mutable copy of this snapshot as a :py:class:`FontFeatures`
+        object."""
+        ff = FontFeatures.__new__(FontFeatures)
+        ff.__dict__.update(_copyKeepingFonts(self.__dict__, self.allRules()))
+        del ff.__dict__["fingerprint"], ff.__dict__["_names"]
+        for routine in _withExtensions(ff.routines):
+            routine.__dict__.pop("_frozen", None)
+            routine.rules = list(routine.rules)
+            routine.usedin = set(routine.usedin)
+            routine.comments = list(routine.comments)
+            if routine.languages is not None:
+                routine.languages = list(routine.languages)
+            for rule in routine.rules:
+                _thawRule(rule)
+        ff.routines = list(ff.routines)
+        ff.namedClasses = dict(ff.namedClasses)
+        ff.features = OrderedDict(
+            (tag, list(lookups)) for tag, lookups in ff.features.items()
+        )
+        ff.anchors = {glyph: dict(anchors) for glyph, anchors in ff.anchors.items()}
+        ff.glyphclasses = dict(ff.glyphclasses)
+        ff.symbols = dict(ff.symbols)
+        ff.scratch = dict(ff.scratch)
+        ff._language_index = None
+        return ff
+
+    def routineNamed(self, name):
+        """Finds a routine with the given name.
+
+        Args:
+            name (str): The name to find
+
+        Returns: a :py:class:`Routine` object if the named routine was found
+          in the features object. Raises a ``ValueError`` if not."""
+        if name not in self._names:
+            raise ValueError("Can't find routine '%s'" % name)
+        return self._names[name]
+
+    def resolveAllRoutines(self):
+        """Does nothing, as references were resolved when the snapshot was
+        made."""
+
+    def _usageKey(self):
+        return "frozen"
+
+    def _languageIndex(self):
+        return self._language_index
+
+    addFeature = referenceRoutine = gensym = merge = compact = _read_only
+    partitionRoutine = partitionAll = replaceRoutineWithSplitList = _read_only
+    deduplicateRoutines = setGlyphClassesFromFont = _read_only
+
+
 class Routine:
     """Represent a Routine (similar to OT Lookup).
 
@@ -373,6 +1486,11 @@ class Routine:
     It can apply to a set of language/script pairs.
     """
 
+    _frozen = False
+    # True while the rules of a routine read lazily from a binary font have
+    # not been read; see fontFeatures.ttLib.unparse
+    pending = False
+
     def __init__(
         self,
         name="",
@@ -388,6 +1506,7 @@ class Routine:
         self.name = name
         self.usecount = 0
         self.usedin = set()
+        self._coverage_index = None
         if rules:
             self.rules = rules
         else:
@@ -401,6 +1520,57 @@ class Routine:
         self.markFilteringSet = markFilteringSet
         self.markAttachmentSet = markAttachmentSet
 
+    def __setattr__(self, name, value):
+        if self._frozen and not name.startswith("_"):
+            raise AttributeError("Routines of FrozenFontFeatures objects are read-only")
+        super().__setattr__(name, value)
+
+    @property
+    def rules(self):
+        """The list of :py:class:`Rule` objects in this Routine."""
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = rules
+        self.changed()
+
+    @property
+    def languages(self):
+        """A list of ``(script, language)`` tuples this Routine applies to."""
+        return self._languages
+
+    @languages.setter
+    def languages(self, languages):
+        self._languages = languages
+        _notifyDependents(self)
+
+    def changed(self):
+        """Discards values computed from this routine's rules.
+
+        This is done automatically when the rules are reassigned or added
+        with :py:meth:`addRule`, or when one of the rules is changed; call it
+        after replacing rules in the list in place, or changing the list of
+        languages in place."""
+        self._coverage_index = None
+        self.__dict__["_derived"] = {}
+        _notifyDependents(self)
+
+    def _memo(self, name, compute):
+        # Rules appended without addRule change the length of the list
+        key = (id(self._rules), len(self._rules))
+        memo = self._derived.get(name)
+        if memo is None or memo[0] != key:
+            if self.__dict__.get("_watching") != key:
+                for rule in self._rules:
+                    _dependOn(rule, self)
+                self._watching = key
+            memo = self._derived[name] = (key, compute())
+        return memo[1]
+
+    def __getstate__(self):
+        return _withoutDependents(self)
+
     def addRule(self, rule):
         """Adds a rule to a Routine.
 
@@ -409,6 +1579,7 @@ class Routine:
         """
         assert isinstance(rule, Rule)
         self.rules.append(rule)
+        self.changed()
 
     def addComment(self, comment):
         """Adds a comment to a Routine.
@@ -421,20 +1592,37 @@ class Routine:
         """
         self.comments.append(comment)
 
+    def compact(self, table):
+        """Stores the glyph slots of this routine's rules and its mark sets
+        as shared tuples from a :py:class:`GlyphTable`."""
+        for rule in self.rules:
+            rule.compact(table)
+        if self.markFilteringSet is not None:
+            self.markFilteringSet = table.slot(self.markFilteringSet)
+        if self.markAttachmentSet is not None:
+            self.markAttachmentSet = table.slot(self.markAttachmentSet)
+
     @property
     def involved_glyphs(self):
-        """Returns the names of all of the glyphs involved in this Routine."""
-        return set().union(*(r.involved_glyphs for r in self.rules))
+        """Returns the names of all of the glyphs involved in this Routine,
+        as a frozenset."""
+        return self._memo(
+            "involved_glyphs",
+            lambda: frozenset().union(*(r.involved_glyphs for r in self.rules)),
+        )
 
     @property
     def stage(self):
         """Returns which shaping stage this routine is used in.
 
         Returns: ``sub`` for substitution stage, ``pos`` for positioning stage."""
+        return self._memo("stage", self._stage)
+
+    def _stage(self):
         for r in self.rules:
             if isinstance(r, Substitution):
                 return "sub"
-            if isinstance(r, Positioning):
+            if isinstance(r, (Positioning, ClassKerning)):
                 return "pos"
             if isinstance(r, Attachment):
                 return "pos"
@@ -450,8 +1638,34 @@ class Routine:
             deps.extend(r.dependencies)
         return deps
 
+    @property
+    def fingerprint(self):
+        """A hash of what this routine does.
+
+        Routines of the same type with the same flags, mark sets and rules
+        (see :py:attr:`Rule.fingerprint`), in the same order, have the same
+        fingerprint. Names, addresses, comments and languages are not
+        included. The fingerprint is a hex string, and does not change from
+        one run to the next."""
+        return self._fingerprint({})
+
+    def _fingerprint(self, routines):
+        # Routines called from many chains are only hashed once
+        if id(self) not in routines:
+            routines[id(self)] = _digest(self._structure(routines))
+        return routines[id(self)]
+
+    def _structure(self, routines):
+        return (
+            type(self).__name__,
+            self.flags,
+            _glyphset_key(self.markFilteringSet),
+            _glyphset_key(self.markAttachmentSet),
+            tuple(rule._fingerprint(routines) for rule in self.rules),
+        )
+
     from .feaLib.Routine import asFea, asFeaAST, feaPreamble
-    from .shaperLib.Routine import apply_to_buffer
+    from .shaperLib.Routine import apply_to_buffer, coverage_index, glyph_digest
     from .xmlLib.Routine import toXML, fromXML
     from .ttLib.Routine import toOTLookup
 
@@ -506,6 +1720,21 @@ class ExtensionRoutine(Routine):
         """Does nothing. Don't set rules here."""
         pass
 
+    def _memo(self, name, compute):
+        # The rules are gathered from the routines each time
+        return compute()
+
+    def compact(self, table):
+        """Compacts the routines under this extension."""
+        for routine in self.routines:
+            routine.compact(table)
+
+    def _structure(self, routines):
+        return (
+            type(self).__name__,
+            tuple(routine._fingerprint(routines) for routine in self.routines),
+        )
+
 
 class RoutineReference:
     """A reference to a Routine object, used in a lookup.
@@ -552,9 +1781,67 @@ class RoutineReference:
         return self.asFeaAST().asFea()
 
 
+# The attributes of rules which hold lists of glyph slots
+_glyph_slot_names = [
+    "input",
+    "precontext",
+    "postcontext",
+    "replacement",
+    "glyphs",
+    "classes1",
+    "classes2",
+]
+
+
 class Rule:
     """A base class for all rules."""
 
+    _slot_attributes = frozenset(
+        [
+            "input",
+            "precontext",
+            "postcontext",
+            "replacement",
+            "glyphs",
+            "bases",
+            "marks",
+        ]
+    )
+
+    _derived_attributes = _slot_attributes | frozenset(
+        ["lookups", "reverse", "force_alt", "languages"]
+    )
+
+    _frozen = False
+
+    def __setattr__(self, name, value):
+        if self._frozen and not name.startswith("_"):
+            raise AttributeError("Rules of FrozenFontFeatures objects are read-only")
+        if name in self._derived_attributes:
+            self.changed()
+        super().__setattr__(name, value)
+
+    def changed(self):
+        """Discards values computed from this rule's glyph slots, lookups and
+        languages.
+
+        This is done automatically when a slot or the languages are
+        reassigned; call it after modifying their contents in place."""
+        self.__dict__.pop("_compiled_slots", None)
+        self.__dict__.pop("_derived", None)
+        _notifyDependents(self)
+
+    def _memo(self, name, compute):
+        derived = self.__dict__.get("_derived")
+        if derived is None:
+            derived = self.__dict__["_derived"] = {}
+        if name not in derived:
+            derived[name] = compute()
+        return derived[name]
+
+    def __getstate__(self):
+        return _withoutDependents(self)
+
     def asFea(self):
         """Returns this Rule as a string of AFDKO feature text."""
         return self.asFeaAST().asFea()
@@ -563,7 +1850,44 @@ class Rule:
         """Computes any text that needs to go in the feature file header."""
         return []
 
-    from .shaperLib.Rule import would_apply_at_position, pre_post_context_matches
+    def compact(self, table):
+        """Replaces the glyph slots of this rule with shared tuples from a
+        :py:class:`GlyphTable`."""
+        for name in _glyph_slot_names:
+            slots = getattr(self, name, None)
+            if slots is not None and all(
+                isinstance(s, (list, tuple, set)) for s in slots
+            ):
+                setattr(self, name, table.sequence(slots))
+
+    def _renameClassReferences(self, references):
+        # references maps "@old" to "@new"; slots are replaced, not modified
+        def rename(slot):
+            if isinstance(slot, str):
+                return references.get(slot, slot)
+            return type(slot)(references.get(g, g) for g in slot)
+
+        for name in _glyph_slot_names:
+            slots = getattr(self, name, None)
+            if not slots:
+                continue
+            renamed = [rename(slot) for slot in slots]
+            if renamed != list(slots):
+                setattr(self, name, renamed)
+        # Attachment rules are keyed by glyph or class
+        for name in ["bases", "marks"]:
+            anchors = getattr(self, name, None)
+            if anchors and any(key in references for key in anchors):
+                renamed = {references.get(k, k): v for k, v in anchors.items()}
+                setattr(self, name, renamed)
+
+    from .shaperLib.Rule import (
+        would_apply_at_position,
+        pre_post_context_matches,
+        shaper_coverage,
+        compiled_slots,
+        _compile_slots,
+    )
     from .xmlLib.Rule import fromXML, toXML, _makeglyphslots, _slotArray
 
     @property
@@ -577,6 +1901,29 @@ class Rule:
         this Routine."""
         return []
 
+    @property
+    def fingerprint(self):
+        """A hash of what this rule does.
+
+        Rules of the same type with the same glyph slots, value records or
+        anchors, flags, languages and lookups have the same fingerprint;
+        lookups are compared by their :py:attr:`Routine.fingerprint`, not by
+        name. Addresses are not included. The fingerprint is a hex string,
+        and does not change from one run to the next."""
+        return self._fingerprint({})
+
+    def _fingerprint(self, routines):
+        return _digest((type(self).__name__,) + self._structure(routines))
+
+    def _structure(self, routines):
+        # Rule types without their own structure are compared by all of
+        # their attributes except the address
+        return tuple(
+            (name, _attribute_key(name, value, routines))
+            for name, value in sorted(self.__dict__.items())
+            if not name.startswith("_") and name != "address"
+        )
+
 
 class Substitution(Rule):
     """Represents a Substitution rule.
@@ -645,15 +1992,33 @@ class Substitution(Rule):
 
     @property
     def involved_glyphs(self):
-        """Returns a set of all glyphs involved in this rule."""
-        i = set(chain.from_iterable(self.input))
-        o = set(chain.from_iterable(self.replacement))
-        b = set(chain.from_iterable(self.precontext))
-        a = set(chain.from_iterable(self.postcontext))
-        return i | o | b | a
+        """Returns a frozenset of all glyphs involved in this rule."""
+        return self._memo(
+            "involved_glyphs",
+            lambda: frozenset(
+                chain.from_iterable(
+                    chain(
+                        self.input, self.replacement, self.precontext, self.postcontext
+                    )
+                )
+            ),
+        )
+
+    def _structure(self, routines):
+        return (
+            _slots_key(self.input),
+            _slots_key(self.replacement),
+            _slots_key(self.precontext),
+            _slots_key(self.postcontext),
+            _lookups_key(self.lookups, routines),
+            self.reverse,
+            self.force_alt,
+            self.flags,
+            _languages_key(self.languages),
+        )
 
     from .feaLib.Substitution import asFeaAST
-    from .shaperLib.Substitution import shaper_inputs, _do_apply
+    from .shaperLib.Substitution import shaper_inputs, _do_apply, _compile_slots
     from .xmlLib.Substitution import _toXML, fromXML
     from .ttLib.Substitution import lookup_type
 
@@ -712,21 +2077,33 @@ class Chaining(Rule):
         """Returns which shaping stage this routine is used in.
 
         Returns: ``sub`` for substitution stage, ``pos`` for positioning stage."""
+        return self._memo("stage", self._stage)
+
+    def _stage(self):
         for lookuplist in self.lookups:
             if not lookuplist:
                 continue
             for aLookup in lookuplist:
                 if not aLookup:
                     continue
-                return aLookup.stage
+                stage = aLookup.stage
+                # The stage changes with the rules of the routine looked up
+                if isinstance(aLookup, RoutineReference):
+                    aLookup = aLookup.routine
+                _dependOn(aLookup, self)
+                return stage
 
     @property
     def involved_glyphs(self):
-        """Returns a set of all glyphs involved in this rule."""
-        i = set(chain.from_iterable(self.input))
-        b = set(chain.from_iterable(self.precontext))
-        a = set(chain.from_iterable(self.postcontext))
-        return i | b | a
+        """Returns a frozenset of all glyphs involved in this rule."""
+        return self._memo(
+            "involved_glyphs",
+            lambda: frozenset(
+                chain.from_iterable(
+                    chain(self.input, self.precontext, self.postcontext)
+                )
+            ),
+        )
 
     @property
     def dependencies(self):
@@ -741,6 +2118,16 @@ class Chaining(Rule):
                     deps.append(aLookup)
         return deps
 
+    def _structure(self, routines):
+        return (
+            _slots_key(self.input),
+            _slots_key(self.precontext),
+            _slots_key(self.postcontext),
+            _lookups_key(self.lookups, routines),
+            self.flags,
+            _languages_key(self.languages),
+        )
+
     from .feaLib.Chaining import asFeaAST, feaPreamble
     from .shaperLib.Chaining import shaper_inputs, _do_apply
     from .xmlLib.Chaining import _toXML, fromXML
@@ -822,11 +2209,25 @@ class Positioning(Rule):
 
     @property
     def involved_glyphs(self):
-        """Returns a set of all glyphs involved in this rule."""
-        i = set(chain.from_iterable(self.glyphs))
-        b = set(chain.from_iterable(self.precontext))
-        a = set(chain.from_iterable(self.postcontext))
-        return i | b | a
+        """Returns a frozenset of all glyphs involved in this rule."""
+        return self._memo(
+            "involved_glyphs",
+            lambda: frozenset(
+                chain.from_iterable(
+                    chain(self.glyphs, self.precontext, self.postcontext)
+                )
+            ),
+        )
+
+    def _structure(self, routines):
+        return (
+            _slots_key(self.glyphs),
+            tuple(_value_key(v) for v in self.valuerecords),
+            _slots_key(self.precontext),
+            _slots_key(self.postcontext),
+            self.flags,
+            _languages_key(self.languages),
+        )
 
     from .feaLib.Positioning import asFeaAST
     from .shaperLib.Positioning import shaper_inputs, _do_apply
@@ -834,6 +2235,142 @@ class Positioning(Rule):
     from .ttLib.Positioning import lookup_type
 
 
+def _denseMatrix(matrix):
+    try:
+        import numpy
+    except ImportError:
+        return [[[int(v) for v in cell] for cell in row] for row in matrix]
+    return numpy.array(matrix, dtype=numpy.int32)
+
+
+class ClassKerning(Rule):
+    """Represents class-based pair positioning as a whole: two lists of glyph
+    classes and a dense matrix of the values applied to each pair of classes.
+
+    This is what a PairPos format 2 subtable holds, and is much smaller than
+    one :py:class:`Positioning` rule per pair of classes. A pair of glyphs
+    matches if the first is in one of the left classes, the second is in one
+    of the right classes and the value for that pair of classes is not zero.
+    Like the classes of a ``ClassDef``, each glyph should appear in only one
+    class on each side.
+
+    Args:
+        classes1: A list of lists of glyph names: the left classes.
+        classes2: A list of lists of glyph names: the right classes.
+        matrix: For each left class, for each right class, a sequence of the
+            values named by ``fields1`` followed by those named by
+            ``fields2``. This is stored as a NumPy array of shape
+            ``(len(classes1), len(classes2), len(fields1) + len(fields2))``
+            if NumPy is available, and as nested lists otherwise.
+        fields1: The :py:class:`ValueRecord` attributes (``xPlacement``,
+            ``yPlacement``, ``xAdvance`` or ``yAdvance``) adjusted on the
+            first glyph.
+        fields2: The attributes adjusted on the second glyph.
+
+    Example::
+
+        kerning = ClassKerning(
+            [["A", "Aacute"], ["V", "W"]],
+            [["V", "W"], ["o", "e"]],
+            [[[-80], [0]], [[0], [-60]]],
+        )
+        # pos [A Aacute] [V W] -80;
+        # pos [V W] [e o] -60;
+    """
+
+    def __init__(
+        self,
+        classes1,
+        classes2,
+        matrix,
+        fields1=("xAdvance",),
+        fields2=(),
+        address=None,
+        languages=None,
+        flags=0,
+    ):
+        self.precontext = []
+        self.postcontext = []
+        self.classes1 = classes1
+        self.classes2 = classes2
+        self.fields1 = tuple(fields1)
+        self.fields2 = tuple(fields2)
+        self.matrix = _denseMatrix(matrix)
+        self.address = address
+        self.languages = languages
+        self.flags = flags
+        self.stage = "pos"
+
+    _derived_attributes = Rule._derived_attributes | frozenset(
+        ["classes1", "classes2", "matrix", "fields1", "fields2"]
+    )
+
+    def valuerecords(self, i, j):
+        """Returns the two :py:class:`ValueRecord` objects applied to a pair of
+        glyphs in left class ``i`` and right class ``j``."""
+        values = self.matrix[i][j]
+        split = len(self.fields1)
+        return (
+            ValueRecord(
+                **{f: int(v) or None for f, v in zip(self.fields1, values[:split])}
+            ),
+            ValueRecord(
+                **{f: int(v) or None for f, v in zip(self.fields2, values[split:])}
+            ),
+        )
+
+    def pairs(self):
+        """Yields ``(left class, right class)`` index pairs for each non-zero
+        value in the matrix, a row at a time."""
+        for i, row in enumerate(self.matrix):
+            for j, values in enumerate(row):
+                if any(values):
+                    yield i, j
+
+    def positionings(self):
+        """Returns this rule as a list of equivalent :py:class:`Positioning`
+        rules, one for each pair of classes with a non-zero value."""
+        return [
+            Positioning(
+                [self.classes1[i], self.classes2[j]],
+                list(self.valuerecords(i, j)),
+                address=self.address,
+                languages=self.languages,
+                flags=self.flags,
+            )
+            for i, j in self.pairs()
+        ]
+
+    @property
+    def involved_glyphs(self):
+        """Returns a frozenset of all glyphs involved in this rule."""
+        return self._memo(
+            "involved_glyphs",
+            lambda: frozenset(chain.from_iterable(chain(self.classes1, self.classes2))),
+        )
+
+    def _structure(self, routines):
+        return (
+            _slots_key(self.classes1),
+            _slots_key(self.classes2),
+            self.fields1,
+            self.fields2,
+            repr([[[int(v) for v in cell] for cell in row] for row in self.matrix]),
+            self.flags,
+            _languages_key(self.languages),
+        )
+
+    from .feaLib.ClassKerning import asFeaAST
+    from .shaperLib.ClassKerning import (
+        shaper_inputs,
+        would_apply_at_position,
+        _compile_slots,
+        _do_apply,
+    )
+    from .xmlLib.ClassKerning import _toXML, fromXML
+    from .ttLib.ClassKerning import lookup_type
+
+
 class Attachment(Rule):
     """Represents an Attachment rule.
 
@@ -901,19 +2438,41 @@ class Attachment(Rule):
         self.languages = languages or []
         self.force_markmark = force_markmark
 
+    def compact(self, table):
+        """Replaces the glyph names of this rule with shared copies from a
+        :py:class:`GlyphTable`."""
+        self.bases = {table.glyph(g): a for g, a in self.bases.items()}
+        self.marks = {table.glyph(g): a for g, a in self.marks.items()}
+
+    def _structure(self, routines):
+        # The anchor names only label the attachment
+        return (
+            self.is_cursive,
+            tuple(sorted(self.bases.items())),
+            tuple(sorted(self.marks.items())),
+            self.force_markmark,
+            self.flags,
+            _languages_key(self.languages),
+        )
+
     @property
     def is_cursive(self):
         """Returns true if this is a cursive attachment rule."""
         return self.base_name == "cursive_entry" or self.base_name == "entry"  # XXX
 
     from .feaLib.Attachment import asFeaAST, feaPreamble
-    from .shaperLib.Attachment import shaper_inputs, _do_apply, would_apply_at_position
+    from .shaperLib.Attachment import (
+        shaper_inputs,
+        shaper_coverage,
+        _do_apply,
+        would_apply_at_position,
+    )
     from .xmlLib.Attachment import _toXML, fromXML
     from .ttLib.Attachment import lookup_type
 
     @property
     def involved_glyphs(self):
-        """Returns a set of all glyphs involved in this rule."""
-        b = set(self.bases.keys())
-        m = set(self.marks.keys())
-        return b | m
+        """Returns a frozenset of all glyphs involved in this rule."""
+        return self._memo(
+            "involved_glyphs", lambda: frozenset(chain(self.bases, self.marks))
+        )
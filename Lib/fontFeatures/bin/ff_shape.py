@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-from fontFeatures.shaperLib.Buffer import Buffer
 from fontFeatures.ttLib import unparse
 from fontTools.ttLib import TTFont
 from fontFeatures.shaperLib.Shaper import Shaper
@@ -21,8 +20,22 @@ def main(args=None):
     parser.add_argument("--no-positions", dest="np", action='store_true', help="Do not output glyph positions")
     parser.add_argument("--additional", help='Additional information')
     parser.add_argument('--features', help='Feature string')
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to shape an input file with",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="Directory in which to cache the layout read from the font",
+    )
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-u', help='Unicodes')
+    group.add_argument(
+        "--input", metavar="FILE", help="File of newline-delimited strings to shape"
+    )
     group.add_argument('string', metavar='STRING',
                         help='Text to shape', nargs="?")
 
@@ -37,18 +50,19 @@ def main(args=None):
 
     font = load(args.font)
     if args.font.endswith(".ttf") or args.font.endswith(".otf"):
-        ff = unparse(TTFont(args.font))
+        ff = unparse(TTFont(args.font), cache=args.cache)
     if args.u:
         args.u = re.sub("[uU]+|0x", "", args.u)
         splitup = re.split(r"[\s,]", args.u)
         args.string = "".join([chr(int(x,16)) for x in splitup])
 
-    buf = Buffer(font, unicodes=args.string)
-    shaper = Shaper(ff, font)
-    if args.features:
-        shaper.execute(buf, features=args.features)
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            texts = [line.rstrip("\n") for line in f]
     else:
-        shaper.execute(buf)
+        texts = [args.string]
+
+    shaper = Shaper(ff, font)
     serialize_options = {}
     if args.ngn:
         serialize_options["names"] = False
@@ -58,9 +72,12 @@ def main(args=None):
         serialize_options["position"] = False
     if args.additional:
         serialize_options["additional"] = args.additional
-    if buf.direction == "RTL":
-        buf.items = list(reversed(buf.items))
-    print(buf.serialize(**serialize_options))
+    for buf in shaper.execute_many(
+        texts, features=args.features or [], workers=args.workers
+    ):
+        if buf.direction == "RTL":
+            buf.items = list(reversed(buf.items))
+        print(buf.serialize(**serialize_options))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
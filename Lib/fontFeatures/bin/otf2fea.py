@@ -46,6 +46,14 @@ def main(args=None):
     parser.add_argument(
         "--config", default=None, help="config file to process", metavar="CONFIG"
     )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        dest="workers",
+        type=int,
+        default=None,
+        help="Number of processes to read lookups in",
+    )
     parser.add_argument(
         "-O", "--optimize", dest="optimize", type=int, default=1, help="Run optimizer"
     )
@@ -64,7 +72,13 @@ def main(args=None):
         sys.exit(1)
 
     font = TTFont(args.input, fontNumber=args.index)
-    ff = unparse(font, do_gdef=args.gdef, doLookups=(not args.nolookups), config=config)
+    ff = unparse(
+        font,
+        do_gdef=args.gdef,
+        doLookups=(not args.nolookups),
+        config=config,
+        workers=args.workers,
+    )
     # if args.optimize:
     #     Optimizer(ff).optimize(level=args.optimize)
 
@@ -149,7 +149,13 @@ def main(args=None):
                 routine = rr.routine
                 delete_me = False
                 pairs = set()
+                rules = []
                 for rule in routine.rules:
+                    if isinstance(rule, fontFeatures.ClassKerning):
+                        rules.extend(rule.positionings())
+                    else:
+                        rules.append(rule)
+                for rule in rules:
                     if isinstance(rule, fontFeatures.Positioning):
                         # Is it pair positioning
                         if len(rule.glyphs) != 2:
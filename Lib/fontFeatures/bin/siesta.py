@@ -139,12 +139,12 @@ def main(args=None):
                 if isinstance(rule, fontFeatures.Attachment):
                     fullinput = [list(rule.bases.keys())] + [list(rule.marks.keys())]
                 else:
-                    fullinput = (
-                        rule.precontext
-                        + getattr(rule, "input", [])
-                        + getattr(rule, "glyphs", [])
-                        + rule.postcontext
-                    )
+                    fullinput = [
+                        *rule.precontext,
+                        *getattr(rule, "input", []),
+                        *getattr(rule, "glyphs", []),
+                        *rule.postcontext,
+                    ]
                 allowable = []
                 for slot in fullinput:
                     this_slot = []
@@ -19,10 +19,13 @@ def gensym(ff):
 
 
 def replaceLongWithClasses(i, ff):
-    for ix, gc in enumerate(i):
+    result = []
+    for gc in i:
         if len(gc) > 5:
             classname = ff.getNamedClassFor(sorted(gc), "class" + gensym(ff))
-            i[ix] = ["@" + classname]
+            gc = ["@" + classname]
+        result.append(gc)
+    return result
 
 
 def feaPreamble(self, ff):
@@ -30,9 +33,9 @@ def feaPreamble(self, ff):
         ff.scratch["glyphclasses"] = {
             tuple(sorted(ff.namedClasses[g])): g for g in ff.namedClasses.keys()
         }
-    replaceLongWithClasses(self.input, ff)
-    replaceLongWithClasses(self.precontext, ff)
-    replaceLongWithClasses(self.postcontext, ff)
+    self.input = replaceLongWithClasses(self.input, ff)
+    self.precontext = replaceLongWithClasses(self.precontext, ff)
+    self.postcontext = replaceLongWithClasses(self.postcontext, ff)
     from fontFeatures import RoutineReference
 
     # Ensure all linked routines have names
@@ -0,0 +1,9 @@
+import fontTools.feaLib.ast as feaast
+
+
+def asFeaAST(self):
+    # One pair positioning statement for each pair of classes
+    b = feaast.Block()
+    for rule in self.positionings():
+        b.statements.append(rule.asFeaAST())
+    return b
@@ -1,6 +1,7 @@
 # Code for converting a FontFeatures object into feaLib statements
 import fontTools.feaLib.ast as feaast
-from fontFeatures.feaLib.Routine import lookup_type
+from collections import OrderedDict
+from fontFeatures.feaLib.Routine import lookup_type, rule_kind
 import copy
 
 
@@ -67,6 +68,8 @@ def asFeaAST(self, do_gdef=True):
     translation to AFDKO code."""
     from fontFeatures import Routine
 
+    # Routines are split, renamed and reordered in a working copy
+    self = self._workingCopy()
     ff = feaast.FeatureFile()
 
     add_language_system_statements(self, ff)
@@ -80,36 +83,39 @@ def asFeaAST(self, do_gdef=True):
     # to one another, because FEA syntax is stupid.
 
     # Now arrange them by type/etc.
+    routines = OrderedDict()
     for k, v in self.features.items():
         for reference in v:
-            routine = reference.routine
-            # If a rule has >1 language it must first be split
-            newrules = []
-            for r in routine.rules:
-                if len(r.languages or []) > 1:
-                    for language in r.languages:
-                        newrule = copy.copy(r)
-                        newrule.languages = [language]
-                        newrules.append(newrule)
-                else:
-                    newrules.append(r)
-            routine.rules = newrules
-            partitioned = self.partitionRoutine(
-                routine,
-                lambda rule: tuple(
-                    [tuple(rule.languages or []), type(rule), lookup_type(rule)]
-                ),
-            )
-            if routine.name and partitioned and len(partitioned) > 1:
-                for p in partitioned:
-                    rule = p.rules[0]
-                    language = (rule.languages or [("DFLT", "dflt")])[0]
-                    p.name = p.name + "%s_%s_%s_%i" % (
-                        language[0].strip(),
-                        language[1].strip(),
-                        type(rule).__name__,
-                        lookup_type(rule),
-                    )
+            routines[reference.routine] = True
+    for routine in routines:
+        # If a rule has >1 language it must first be split
+        newrules = []
+        for r in routine.rules:
+            if len(r.languages or []) > 1:
+                for language in r.languages:
+                    newrule = copy.copy(r)
+                    newrule.languages = [language]
+                    newrules.append(newrule)
+            else:
+                newrules.append(r)
+        routine.rules = newrules
+    partitions = self.partitionAll(
+        lambda rule: tuple(
+            [tuple(rule.languages or []), rule_kind(rule), lookup_type(rule)]
+        ),
+        routines,
+    )
+    for routine, partitioned in partitions.items():
+        if routine.name and len(partitioned) > 1:
+            for p in partitioned:
+                rule = p.rules[0]
+                language = (rule.languages or [("DFLT", "dflt")])[0]
+                p.name = p.name + "%s_%s_%s_%i" % (
+                    language[0].strip(),
+                    language[1].strip(),
+                    rule_kind(rule).__name__,
+                    lookup_type(rule),
+                )
 
     for r in self.routines:
         r.usecount = 0
@@ -6,12 +6,20 @@ from fontFeatures.feaLib import bad_statement_to_comment
 
 
 def lookup_type(rule):
-    from fontFeatures import Substitution, Positioning, Attachment, Chaining
+    from fontFeatures import (
+        Substitution,
+        Positioning,
+        ClassKerning,
+        Attachment,
+        Chaining,
+    )
 
     if isinstance(rule, Substitution):
         return sub_lookup_type(rule)
     if isinstance(rule, Positioning):
         return pos_lookup_type(rule)
+    if isinstance(rule, ClassKerning):
+        return rule.lookup_type()
     if isinstance(rule, Attachment):
         return rule.is_cursive
     if isinstance(rule, Chaining):
@@ -19,6 +27,16 @@ def lookup_type(rule):
     raise ValueError
 
 
+def rule_kind(rule):
+    """Returns the class of rule whose statements a rule is written as: class
+    kerning is written as pair positioning, so both may share a lookup."""
+    from fontFeatures import Positioning, ClassKerning
+
+    if isinstance(rule, ClassKerning):
+        return Positioning
+    return type(rule)
+
+
 counter = 0
 
 
@@ -46,6 +64,8 @@ def feaPreamble(self, ff):
 
 
 def asFeaAST(self):
+    from fontFeatures import ClassKerning
+
     if self.name:
         f = feaast.LookupBlock(name=self.name)
     else:
@@ -86,7 +106,13 @@ def asFeaAST(self):
             f.statements.append(
                 feaast.Comment("\n".join([f"# {n}" for n in x.note.split("\n")]))
             )
-        f.statements.append(bad_statement_to_comment(x.asFeaAST()))
+        statement = x.asFeaAST()
+        if isinstance(x, ClassKerning):
+            # Each pair of classes is commented out on its own if need be
+            for pair in statement.statements:
+                f.statements.append(bad_statement_to_comment(pair))
+            continue
+        f.statements.append(bad_statement_to_comment(statement))
     return f
 
 
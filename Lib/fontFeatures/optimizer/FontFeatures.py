@@ -2,6 +2,17 @@ from fontFeatures import Chaining, Routine
 import logging
 
 
+class DeduplicateRoutines:
+    level = 2
+
+    def apply(self, ff):
+        logger = logging.getLogger("fontFeatures")
+        for routine, keeper in ff.deduplicateRoutines().items():
+            logger.info(
+                "Merging duplicate routines %s , %s" % (keeper.name, routine.name)
+            )
+
+
 class MergeNonOverlappingRoutines:
     level = 2
 
@@ -80,4 +91,4 @@ class MergeNonOverlappingRoutines:
         return True
 
 
-optimizations = [MergeNonOverlappingRoutines]
+optimizations = [DeduplicateRoutines, MergeNonOverlappingRoutines]
@@ -1,5 +1,5 @@
 from fontTools.otlLib.builder import ClassDefBuilder
-from fontFeatures import Substitution, Positioning, Chaining
+from fontFeatures import Substitution, Positioning, ClassKerning, Chaining
 import logging
 import copy
 
@@ -14,22 +14,28 @@ class MoveLongCoverageToClassDefinition:
         return str(ff.scratch["index"])
 
     def replaceLongWithClasses(self, i, ff):
-        for ix, gc in enumerate(i):
+        result = []
+        for gc in i:
             if len(gc) > 5:
                 classname = ff.getNamedClassFor(gc, "class" + self.gensym(ff))
-                i[ix] = ["@" + classname]
+                gc = ["@" + classname]
+            result.append(gc)
+        return result
 
     def apply(self, routine, ff):
         for rule in routine.rules:
             if isinstance(rule, Substitution):
-                self.replaceLongWithClasses(rule.input, ff)
-                self.replaceLongWithClasses(rule.precontext, ff)
-                self.replaceLongWithClasses(rule.postcontext, ff)
-                self.replaceLongWithClasses(rule.replacement, ff)
+                rule.input = self.replaceLongWithClasses(rule.input, ff)
+                rule.precontext = self.replaceLongWithClasses(rule.precontext, ff)
+                rule.postcontext = self.replaceLongWithClasses(rule.postcontext, ff)
+                rule.replacement = self.replaceLongWithClasses(rule.replacement, ff)
             if isinstance(rule, Positioning):
-                self.replaceLongWithClasses(rule.glyphs, ff)
-                self.replaceLongWithClasses(rule.precontext, ff)
-                self.replaceLongWithClasses(rule.postcontext, ff)
+                rule.glyphs = self.replaceLongWithClasses(rule.glyphs, ff)
+                rule.precontext = self.replaceLongWithClasses(rule.precontext, ff)
+                rule.postcontext = self.replaceLongWithClasses(rule.postcontext, ff)
+            if isinstance(rule, ClassKerning):
+                rule.classes1 = self.replaceLongWithClasses(rule.classes1, ff)
+                rule.classes2 = self.replaceLongWithClasses(rule.classes2, ff)
 
         return []
 
@@ -144,8 +150,8 @@ class EnsureFormat2Chaining:
                         postcontext=copy.deepcopy(rule.postcontext),
                         lookups=rule.lookups[:],
                     )
-                    setattr(new_rule, which, getattr(new_rule, which)[:])
-                    setattr(rule, which, getattr(rule, which)[:])
+                    setattr(new_rule, which, list(getattr(new_rule, which)))
+                    setattr(rule, which, list(getattr(rule, which)))
                     getattr(rule, which)[ix] = list(set(slot) - intersection)
                     getattr(new_rule, which)[ix] = list(intersection)
                     additional_rules.append(new_rule)
@@ -7,6 +7,15 @@ def shaper_inputs(self):
     return [self.bases.keys(), self.marks.keys()]
 
 
+def shaper_coverage(self, namedclasses={}):
+    """Returns the set of glyphs at which this rule may start matching. Mark
+    attachments are tested at the position of the mark; cursive attachments
+    may match anywhere, so ``None`` is returned."""
+    if self.is_cursive:
+        return None
+    return self.compiled_slots(namedclasses).input[1]
+
+
 def find_base_backwards(self, buf, ix):
     """Looks backwards in a buffer from index ``ix`` to find the nearest base."""
     start_ix = ix
@@ -26,17 +35,10 @@ def find_base_backwards(self, buf, ix):
 
 def would_apply_at_position(self, buf, ix, namedclasses={}):
     """Tests to see if this rule would apply at position ``ix`` of the buffer."""
-    from fontFeatures.shaperLib.Rule import _expand_slot
-
     logging.getLogger("fontFeatures.shaperLib").debug(
         "Testing if rule would apply at position %i" % (ix)
     )
-    if namedclasses:
-        marks = _expand_slot(self.marks.keys(), namedclasses)
-        bases = _expand_slot(self.bases.keys(), namedclasses)
-    else:
-        marks = self.marks.keys()
-        bases = self.bases.keys()
+    bases, marks = self.compiled_slots(namedclasses).input
 
     if self.is_cursive:
         if ix == 0:
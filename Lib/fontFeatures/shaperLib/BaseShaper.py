@@ -25,7 +25,11 @@ def _is_default_ignorable(c):
 
 
 class BaseShaper:
-    """A complex shaper object."""
+    """A complex shaper object.
+
+    A complex shaper is created for each buffer to be shaped, and holds the
+    state of that shaping run: the plan, the font, the buffer and the user
+    features."""
 
     def __init__(self, plan, font, buf, features=[]):
         self.plan = plan
@@ -35,7 +39,6 @@ class BaseShaper:
 
     def shape(self):
         """Shape a buffer."""
-        self.plan.fontfeatures.resolveAllRoutines()
         # self.buffer.set_unicode_props()
         # self.insert_dotted_circles()
         # self.buffer.form_clusters()
@@ -150,22 +153,10 @@ class BaseShaper:
 
     def _run_stage(self, current_stage):
         self.plan.msg("Running %s stage" % current_stage)
-        self.plan.fontfeatures.hoist_languages()
-        for stage in self.plan.stages:
-            lookups = []
+        # Feature masks may have been set up since the buffer was last masked
+        self.buffer.clear_mask_cache()
+        for stage, lookups in zip(self.plan.stages, self.plan.lookups):
             if isinstance(stage, list):  # Features
-                for f in stage:
-                    if f not in self.plan.fontfeatures.features:
-                        continue
-
-                    routines = self.plan.fontfeatures.features[f]
-                    routines = [
-                        x.routine if isinstance(x, RoutineReference) else x
-                        for x in routines
-                    ]
-                    lookups.extend(
-                        [(routine, f) for routine in self._filter_by_lang(routines)]
-                    )
                 self.plan.msg("Processing features: %s" % ",".join(stage))
                 for r, feature in lookups:
                     self.plan.msg(
@@ -183,7 +174,8 @@ class BaseShaper:
             else:
                 # It's a pause. We only support GSUB pauses.
                 if current_stage == "sub":
-                    stage(current_stage)
+                    stage(self, current_stage)
+                    self.buffer.clear_mask_cache()
 
     def _filter_by_lang(self, routines):
         script = self.script_to_opentype.get(self.buffer.script, "DFLT")
@@ -195,16 +187,13 @@ class BaseShaper:
         ):
             return routines  # !
         language = self.buffer.language or "dflt"
+        by_language = self.plan.fontfeatures.routinesByLanguage
         if script in s_l and (script, language) != ("DFLT", "dflt"):
-            return [
-                x for x in routines if x.languages and (script, language) in x.languages
-            ]
+            wanted = by_language.get((script, language), frozenset())
+            return [x for x in routines if x in wanted]
         else:
-            return [
-                x
-                for x in routines
-                if not x.languages or ("DFLT", language) in x.languages
-            ]
+            wanted = by_language.get(("DFLT", language), frozenset())
+            return [x for x in routines if not x.languages or x in wanted]
 
     def delete_default_ignorables(self):
         """Remove all items from the buffer which are ignorable."""
@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from fontFeatures import ValueRecord
 from fontFeatures.utils import categorize_glyph
 from youseedee import ucd_data
+from bisect import bisect_left
+from collections.abc import Mapping
 import sys
 import warnings
 
@@ -17,12 +19,29 @@ def _add_value_records(vr1, vr2):
         vr1.yAdvance = (vr1.yAdvance or 0) + (vr2.yAdvance or 0)
 
 
-@dataclass
-class BufferItem:
-    # codepoint: int
-    # glyph: str
-    # position: ValueRecord
-    # category: str
+# Category bits share their values with the lookup flags which ignore
+# that category, so that ``item.category_bits & flags`` is non-zero for
+# ignored items.
+_category_bits = {"base": 0x2, "ligature": 0x4, "mark": 0x8}
+
+
+def _copy_value(value):
+    # Feature masks (and any other mutable attributes) must not be shared
+    # between a snapshot and the buffers restored from it.
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class BaseBufferItem:
+    """The behaviour shared by all buffer items.
+
+    This class has no storage of its own; subclasses decide how the
+    attributes of an item are stored."""
+
+    __slots__ = ()
 
     def __repr__(self):
         s = ""
@@ -67,8 +86,11 @@ class BufferItem:
 
     def prep_glyph(self, font):
         if "pytest" in sys.modules:
-            if self.glyph in font.exported_glyphs():
-                self.gid = font.exported_glyphs().index(self.glyph)
+            # Not font.exported_glyphs(), as iterating over babelfont's
+            # GlyphList is not thread-safe.
+            exported = [g.name for g in font.glyphs.values() if g.exported]
+            if self.glyph in exported:
+                self.gid = exported.index(self.glyph)
             else:
                 self.gid = -1  # ?
         self.substituted = False
@@ -98,6 +120,7 @@ class BufferItem:
         except Exception as e:
             warnings.warn("Error getting category: %s" % str(e))
             self._fallback_categorize()
+        self.category_bits = _category_bits.get(self.category[0], 0)
 
     def _fallback_categorize(self):
         if not self.codepoint:
@@ -118,6 +141,25 @@ class BufferItem:
         _add_value_records(self.position, vr2)
 
 
+@dataclass
+class BufferItem(BaseBufferItem):
+    # codepoint: int
+    # glyph: str
+    # position: ValueRecord
+    # category: str
+
+    category_bits = 0
+
+    def shaped_fields(self):
+        """Returns a dictionary of the attributes of this item, other than
+        its codepoint and position."""
+        return {
+            k: v
+            for k, v in vars(self).items()
+            if not k.startswith("_") and k not in ("codepoint", "position")
+        }
+
+
 class Buffer:
     """A buffer holding either characters to be shaped or shaped glyphs."""
 
@@ -136,6 +178,16 @@ class Buffer:
         self.mask = []
         self.flags = 0
         self.current_feature_mask = None
+        self.markFilteringSet = None
+        self.markAttachmentSet = None
+        self._dirty = None
+        self._mask_len = 0
+        self._mask_cache = {}
+        self._mask_cache_items = None
+        self._digest = None
+        self._digest_items = None
+        self.routines_applied = 0
+        self.routines_skipped = 0
         if glyphs:
             self.store_glyphs(glyphs)
             self.clear_mask()
@@ -157,7 +209,51 @@ class Buffer:
         Args:
             glyphs (list or str): A list of characters.
         """
-        self.items = [self.itemclass.new_unicode(ord(char)) for char in unistring]
+        self.items = [self._new_item(ord(char)) for char in unistring]
+
+    def _new_item(self, codepoint):
+        return self.itemclass.new_unicode(codepoint)
+
+    def snapshot(self):
+        """Returns the shaped contents of the buffer.
+
+        The snapshot is a tuple which records, for each item, its codepoint,
+        every other attribute set on it during shaping (glyph, category,
+        cluster, syllable and attachment information, feature masks and so
+        on) and its position. It can be passed to :py:meth:`restore` to
+        recreate the shaped contents of the buffer without shaping it again."""
+        result = []
+        for item in self.items:
+            attributes = tuple(
+                (a, _copy_value(value)) for a, value in item.shaped_fields().items()
+            )
+            position = getattr(item, "position", None)
+            if position is not None:
+                position = (
+                    position.xPlacement,
+                    position.yPlacement,
+                    position.xAdvance,
+                    position.yAdvance,
+                )
+            result.append((item.codepoint, attributes, position))
+        return tuple(result)
+
+    def restore(self, snapshot):
+        """Replaces the contents of the buffer with a :py:meth:`snapshot`."""
+        self.items = []
+        for codepoint, attributes, position in snapshot:
+            item = self._new_item(codepoint)
+            for a, value in attributes:
+                setattr(item, a, _copy_value(value))
+            if position is not None:
+                item.position = ValueRecord(
+                    xPlacement=position[0],
+                    yPlacement=position[1],
+                    xAdvance=position[2],
+                    yAdvance=position[3],
+                )
+            self.items.append(item)
+        self.clear_mask()
 
     def guess_segment_properties(self):
         """Try to automatically determine the script and direction properties."""
@@ -199,9 +295,11 @@ class Buffer:
     def __setitem__(self, key, value):
         indexed = self.mask[key]
         if len(indexed) == 1:  # Easy
+            self._mark_dirty(indexed[0], len(self.items) - indexed[0] - 1)
             self.items[indexed[0] : indexed[0] + 1] = value
             return
         if len(value) == 1:  # Also easy
+            self._mark_dirty(indexed[0], len(self.items) - indexed[-1] - 1)
             self.items[indexed[0]] = value[0]
             for i in reversed(indexed[1:]):
                 del self.items[i]
@@ -212,16 +310,122 @@ class Buffer:
     def __len__(self):
         return len(self.mask)
 
+    def _mark_dirty(self, start, tail):
+        # The dirty region is stored as the number of untouched items at
+        # the start and at the end of the buffer, so that it remains valid
+        # as items are inserted and removed within it.
+        if self._dirty:
+            start = min(start, self._dirty[0])
+            tail = min(tail, self._dirty[1])
+        self._dirty = (start, tail)
+
+    def mark_dirty(self, ix):
+        """Notes that the item at (masked) position ``ix`` has been changed,
+        so that it is recategorised on the next call to :py:meth:`update`."""
+        item_ix = self.mask[ix]
+        self._mark_dirty(item_ix, len(self.items) - item_ix - 1)
+
     def update(self):
-        """Categorises glyphs and recomputes masks.
+        """Recategorises changed glyphs and patches the mask.
+
+        Called internally when the contents of the buffer changes. Only the
+        items changed through the buffer (by slice assignment or
+        :py:meth:`mark_dirty`) are recategorised; if ``buffer.items`` has
+        been modified directly, call :py:meth:`recategorize` instead."""
+        if self._dirty is None:
+            if len(self.items) != self._mask_len:
+                self.recategorize()
+            return
+        start, tail = self._dirty
+        self._recategorize_dirty()
+        self._patch_mask(start, self._mask_len - tail, len(self.items) - tail)
+        self._store_mask()
 
-        Called internally when the contents of the buffer changes."""
+    def _recategorize_dirty(self):
+        if self._dirty is None:
+            return
+        start, tail = self._dirty
+        changed = self.items[start : len(self.items) - tail]
+        for g in changed:
+            g.recategorize(self.font)
+        self._forget_masks()
+        if self._digest is not None:
+            self._digest.update(g.glyph for g in changed)
+
+    def recategorize(self):
+        """Categorises all glyphs and recomputes masks."""
         for g in self.items:
             g.recategorize(self.font)
+        self.clear_mask_cache()
         self.recompute_mask()
 
+    def clear_mask_cache(self):
+        """Forgets all memoized masks.
+
+        Masks are cached per combination of flags, filtering sets and feature
+        until the buffer changes. Changes made through the buffer and changes
+        to the length of ``buffer.items`` are noticed automatically; call this
+        after otherwise modifying the items (reordering them, or changing
+        their glyphs or feature masks) directly."""
+        self._forget_masks()
+        self._digest = None
+
+    def _forget_masks(self):
+        self._mask_cache = {}
+        self._mask_cache_items = None
+
+    def glyph_digest(self):
+        """Returns a set which contains every glyph in the buffer.
+
+        The set is maintained as the buffer changes, and may also contain
+        glyphs which have since been substituted away."""
+        if self._digest is None or self._digest_items is not self.items:
+            self._digest = {item.glyph for item in self.items}
+            self._digest_items = self.items
+        elif self._dirty is not None:
+            start, tail = self._dirty
+            self._digest.update(
+                item.glyph for item in self.items[start : len(self.items) - tail]
+            )
+        return self._digest
+
+    def match_slots(self, compiled):
+        """Returns the precontext, input and postcontext slots of a rule's
+        :py:class:`fontFeatures.shaperLib.Rule.CompiledSlots`, in the form
+        expected by :py:meth:`glyphs_match`."""
+        return compiled.precontext, compiled.input, compiled.postcontext
+
+    def glyphs_match(self, items, slots):
+        """Tests whether each of the given items has a glyph in the
+        corresponding slot returned by :py:meth:`match_slots`."""
+        if len(items) != len(slots):
+            return False
+        for item, slot in zip(items, slots):
+            if item.glyph not in slot:
+                return False
+        return True
+
+    def _mask_key(self):
+        # Filtering sets are keyed by identity; the cache entry holds a
+        # reference to them so that their ids cannot be reused.
+        return (
+            self.flags,
+            id(self.markFilteringSet),
+            id(self.markAttachmentSet),
+            self.current_feature_mask,
+        )
+
+    def _store_mask(self):
+        self._mask_cache_items = (id(self.items), len(self.items))
+        self._mask_cache[self._mask_key()] = (
+            self.markFilteringSet,
+            self.markAttachmentSet,
+            self.mask,
+        )
+
     def clear_mask(self):
         """Clear the buffer mask."""
+        self.clear_mask_cache()
         self.flags = 0
         self.markFilteringSet = None
         self.markAttachmentSet = None
@@ -239,6 +443,37 @@ class Buffer:
         self.markAttachmentSet = markAttachmentSet
         self.recompute_mask()
 
+    def _mask_predicate(self):
+        self.flags = self.flags or 0
+        flags = self.flags
+        feature = self.current_feature_mask
+        if not (flags & 0xFF1E) and not feature:
+            return None
+        ignored = flags & 0xE  # IgnoreBases, IgnoreLigatures, IgnoreMarks
+        filtering = None
+        if flags & 0x10:
+            filtering = frozenset(self.markFilteringSet)
+        attachment = None
+        if flags & 0xFF00:
+            attachment = frozenset(self.markAttachmentSet)
+        return self._make_predicate(ignored, filtering, attachment, feature)
+
+    def _make_predicate(self, ignored, filtering, attachment, feature):
+        def visible(item):
+            bits = item.category_bits
+            if bits & ignored:
+                return False
+            if bits == 0x8:
+                if filtering is not None and item.glyph not in filtering:
+                    return False
+                if attachment is not None and item.glyph not in attachment:
+                    return False
+            if feature and item.feature_masks.get(feature):
+                return False
+            return True
+
+        return visible
+
     def recompute_mask(self):
         """Computes the mask property
 
@@ -246,43 +481,48 @@ class Buffer:
         "view" of the buffer. For example, if ``buffer.flags == 0x8``, then the
         indices of all mark glyphs will be excluded from ``buffer.mask``.
         """
-        mask = range(0, len(self.items))
-        self.flags = self.flags or 0
-        if self.flags & 0x2:  # IgnoreBases
-            mask = list(filter(lambda ix: self.items[ix].category[0] != "base", mask))
-        if self.flags & 0x4:  # IgnoreLigatures
-            mask = list(
-                filter(lambda ix: self.items[ix].category[0] != "ligature", mask)
-            )
-        if self.flags & 0x8:  # IgnoreMarks
-            mask = list(filter(lambda ix: self.items[ix].category[0] != "mark", mask))
-        if self.flags & 0x10:  # UseMarkFilteringSet
-            mask = list(
-                filter(
-                    lambda ix: self.items[ix].category[0] != "mark"
-                    or self.items[ix].glyph in self.markFilteringSet,
-                    mask,
-                )
-            )
-        if self.flags & 0xFF00:  # MarkAttachmentType
-            mask = list(
-                filter(
-                    lambda ix: self.items[ix].category[0] != "mark"
-                    or self.items[ix].glyph in self.markAttachmentSet,
-                    mask,
-                )
-            )
-
-        if self.current_feature_mask:
-            feature = self.current_feature_mask
-            mask = list(
-                filter(
-                    lambda ix: (feature not in self.items[ix].feature_masks)
-                    or (not self.items[ix].feature_masks[feature]),
-                    mask,
-                )
-            )
-        self.mask = mask
+        self._recategorize_dirty()
+        self._dirty = None
+        self._mask_len = len(self.items)
+        if self._mask_cache_items not in (None, (id(self.items), len(self.items))):
+            # The items have been replaced or resized behind our back
+            self.clear_mask_cache()
+        cached = self._mask_cache.get(self._mask_key())
+        if cached is not None:
+            self.mask = cached[2]
+            return
+        visible = self._mask_predicate()
+        if visible is None:
+            self.mask = range(0, len(self.items))
+        else:
+            self.mask = [ix for ix, item in enumerate(self.items) if visible(item)]
+        self._store_mask()
+
+    def _patch_mask(self, start, old_end, new_end):
+        # Recompute the mask for items[start:new_end], which replaced the
+        # items[start:old_end] present when the mask was last computed, and
+        # shift the indices of the items which follow.
+        visible = self._mask_predicate()
+        if visible is None:
+            self.mask = range(0, len(self.items))
+        else:
+            mask = self.mask
+            if not isinstance(mask, list):
+                mask = list(mask)
+            left = bisect_left(mask, start)
+            right = bisect_left(mask, old_end)
+            middle = [ix for ix in range(start, new_end) if visible(self.items[ix])]
+            delta = new_end - old_end
+            if delta:
+                tail = mask[right:]
+                del mask[left:]
+                mask.extend(middle)
+                mask.extend(map(delta.__add__, tail))
+            else:
+                mask[left:right] = middle
+            self.mask = mask
+        self._mask_len = len(self.items)
+        self._dirty = None
 
     def set_feature_mask(self, feature):
         """Applies the mask for a particular feature."""
@@ -292,6 +532,7 @@ class Buffer:
     def move_item(self, src, dest):
         """Moves an item from src to dest."""
         self.items[dest:dest] = [self.items.pop(src)]
+        self.clear_mask_cache()
 
     def merge_clusters(self, start, end):
         """Currently unimplemented."""
@@ -37,7 +37,7 @@ def _do_apply(self, buf, ix, namedclasses={}):
                 newix = __find_masked_ix(buf, unmasked_ix)
                 if rule.would_apply_at_position(
                     buf, newix, namedclasses
-                ) and rule._do_apply(buf, newix):
+                ) and rule._do_apply(buf, newix, namedclasses=namedclasses):
                     break
 
     buf.set_mask(flags, markFilteringSet, markAttachmentSet)
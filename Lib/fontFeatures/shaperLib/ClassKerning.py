@@ -0,0 +1,52 @@
+from itertools import chain
+
+
+def shaper_inputs(self):
+    return [list(chain(*self.classes1)), list(chain(*self.classes2))]
+
+
+def _compile_slots(self, namedclasses):
+    from fontFeatures.shaperLib.Rule import CompiledSlots, _expand_slot
+
+    compiled = CompiledSlots(self, namedclasses)
+    # Glyph to class index, so that a pair is matched with two dictionary
+    # lookups and one matrix lookup
+    compiled.rows = {}
+    for i, glyphs in enumerate(self.classes1):
+        for g in _expand_slot(glyphs, namedclasses):
+            compiled.rows.setdefault(g, i)
+    compiled.columns = {}
+    for j, glyphs in enumerate(self.classes2):
+        for g in _expand_slot(glyphs, namedclasses):
+            compiled.columns.setdefault(g, j)
+    return compiled
+
+
+def _cell(self, buf, ix, namedclasses):
+    pair = buf[ix : ix + 2]
+    if len(pair) != 2:
+        return None
+    compiled = self.compiled_slots(namedclasses)
+    i = compiled.rows.get(pair[0].glyph)
+    j = compiled.columns.get(pair[1].glyph)
+    if i is None or j is None:
+        return None
+    return i, j
+
+
+def would_apply_at_position(self, buf, ix, namedclasses={}):
+    cell = _cell(self, buf, ix, namedclasses)
+    if cell is None:
+        return False
+    return any(self.matrix[cell[0]][cell[1]])
+
+
+def _do_apply(self, buf, ix, namedclasses={}):
+    i, j = _cell(self, buf, ix, namedclasses)
+    vr1, vr2 = self.valuerecords(i, j)
+    pair = buf[ix : ix + 2]
+    pair[0].add_position(vr1)
+    if not vr2:
+        return
+    pair[1].add_position(vr2)
+    return 1
@@ -0,0 +1,504 @@
+"""A compact alternative to :py:class:`fontFeatures.shaperLib.Buffer.Buffer`.
+
+A :py:class:`CompactBuffer` keeps the glyph IDs, codepoints, categories,
+clusters, positions and feature masks of its items in parallel arrays held
+by an :py:class:`ItemStore`, instead of in attributes and dictionaries on
+each item. The items of the buffer are :py:class:`CompactBufferItem` views
+onto a row of the store, so code written against the ``BufferItem`` API
+(including the complex shapers) keeps working unchanged::
+
+    buf = CompactBuffer(font, unicodes="Hello")
+    Shaper(ff, font).execute(buf)
+    print(buf.serialize())
+
+Ordinary ``BufferItem`` objects may be mixed into a compact buffer; they
+are simply handled more slowly.
+
+Compact items have no ``__dict__``: besides the attributes held in the
+store, they only have room for the attributes set by the shapers
+(``gid``, syllable, joining and attachment information).
+"""
+from array import array
+from collections.abc import MutableMapping
+from fontFeatures.shaperLib.Buffer import Buffer, BaseBufferItem
+import threading
+import weakref
+
+_SUBSTITUTED = 0x1
+_LIGATED = 0x2
+_MULTIPLIED = 0x4
+_POSITIONED = 0x8
+
+_position_fields = ("xPlacement", "yPlacement", "xAdvance", "yAdvance")
+
+# Attributes of a CompactBufferItem held in the store, apart from the
+# codepoint and position
+_stored_fields = (
+    "glyph",
+    "category",
+    "category_bits",
+    "cluster",
+    "substituted",
+    "ligated",
+    "multiplied",
+    "feature_masks",
+)
+
+# Attributes of a CompactBufferItem set by the shapers and held on the item
+_item_fields = (
+    "gid",
+    "syllable_index",
+    "syllable",
+    "attach_type",
+    "attach_chain",
+    "arabic_joining",
+    "syllabic_category",
+    "syllabic_position",
+    "positional_category",
+    "syllabic_positional_category",
+)
+
+
+class GlyphTable:
+    """Maps glyph names to glyph IDs.
+
+    Glyph IDs are indices into the glyph order given when the table is
+    created; names not found in it are given new IDs as they are met.
+    Use :py:func:`glyph_table` to get the table shared by all compact
+    buffers of a font."""
+
+    def __init__(self, glyph_order=()):
+        self.glyph_names = list(glyph_order)
+        self.glyph_ids = {g: i for i, g in enumerate(self.glyph_names)}
+        self._lock = threading.Lock()
+
+    def glyph_id(self, glyph):
+        """Returns the glyph ID of the given glyph name, allocating one if
+        the name is not in the glyph order."""
+        if glyph is None:
+            return -1
+        gid = self.glyph_ids.get(glyph)
+        if gid is None:
+            with self._lock:
+                gid = self.glyph_ids.get(glyph)
+                if gid is None:
+                    self.glyph_names.append(glyph)
+                    gid = self.glyph_ids[glyph] = len(self.glyph_names) - 1
+        return gid
+
+
+_glyph_tables = {}
+
+
+def glyph_table(font):
+    """Returns the :py:class:`GlyphTable` shared by the compact buffers of
+    a font, creating it from the font's glyph order on first use."""
+    table = _glyph_tables.get(id(font))
+    if table is None:
+        table = GlyphTable(font.glyphs.keys())
+        table = _glyph_tables.setdefault(id(font), table)
+        weakref.finalize(font, _glyph_tables.pop, id(font), None)
+    return table
+
+
+class ItemStore:
+    """Parallel arrays holding the contents of buffer items.
+
+    Each item owns a row of the store, so an item keeps its row however the
+    items of the buffer are reordered. When an item is garbage collected
+    its row is released, and reused by the next item created in the store.
+
+    Args:
+        glyphs: An optional :py:class:`GlyphTable` (or list of glyph names)
+            giving the glyph IDs stored in the rows.
+    """
+
+    def __init__(self, glyphs=()):
+        if not isinstance(glyphs, GlyphTable):
+            glyphs = GlyphTable(glyphs)
+        self.glyphs = glyphs
+        self.category_names = ["unknown"]
+        self.category_ids = {"unknown": 0}
+        self.features = {}
+        self.codepoint = array("l")
+        self.glyph = array("l")
+        self.category = array("B")
+        self.subcategory = array("h")
+        self.category_bits = array("B")
+        self.cluster = array("l")
+        self.flags = array("B")
+        self.xPlacement = array("d")
+        self.yPlacement = array("d")
+        self.xAdvance = array("d")
+        self.yAdvance = array("d")
+        self.feature_set = []
+        self.feature_value = []
+        self.free_rows = []
+
+    def __len__(self):
+        return len(self.glyph) - len(self.free_rows)
+
+    def _columns(self):
+        return (
+            self.codepoint,
+            self.glyph,
+            self.category,
+            self.subcategory,
+            self.category_bits,
+            self.cluster,
+            self.flags,
+            self.xPlacement,
+            self.yPlacement,
+            self.xAdvance,
+            self.yAdvance,
+            self.feature_set,
+            self.feature_value,
+        )
+
+    def _allocate(self, values):
+        try:
+            row = self.free_rows.pop()
+        except IndexError:
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+            return len(self.glyph) - 1
+        for column, value in zip(self._columns(), values):
+            column[row] = value
+        return row
+
+    def new_row(self):
+        """Adds an empty row to the store and returns its index."""
+        return self._allocate((-1, -1, 0, -1, 0, -1, 0, 0, 0, 0, 0, 0, 0))
+
+    def copy_row(self, row):
+        """Adds a copy of the given row to the store and returns its index."""
+        return self._allocate([column[row] for column in self._columns()])
+
+    def release_row(self, row):
+        """Marks a row as unused, so that it can be handed out again."""
+        self.free_rows.append(row)
+
+    def glyph_id(self, glyph):
+        """Returns the glyph ID of the given glyph name."""
+        return self.glyphs.glyph_id(glyph)
+
+    @property
+    def glyph_names(self):
+        return self.glyphs.glyph_names
+
+    def category_id(self, category):
+        cid = self.category_ids.get(category)
+        if cid is None:
+            cid = self.category_ids[category] = len(self.category_names)
+            self.category_names.append(category)
+        return cid
+
+    def feature_bit(self, feature):
+        """Returns the bit used to store masks for the given feature."""
+        bit = self.features.get(feature)
+        if bit is None:
+            bit = self.features[feature] = 1 << len(self.features)
+        return bit
+
+
+def _column_property(name):
+    def getter(self):
+        return getattr(self._store, name)[self._row]
+
+    def setter(self, value):
+        getattr(self._store, name)[self._row] = value or 0
+
+    return property(getter, setter)
+
+
+def _flag_property(flag):
+    def getter(self):
+        return bool(self._store.flags[self._row] & flag)
+
+    def setter(self, value):
+        if value:
+            self._store.flags[self._row] |= flag
+        else:
+            self._store.flags[self._row] &= ~flag
+
+    return property(getter, setter)
+
+
+class PositionView:
+    """The position of a :py:class:`CompactBufferItem`, with the same
+    placement and advance attributes as a ``ValueRecord``."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    xPlacement = _column_property("xPlacement")
+    yPlacement = _column_property("yPlacement")
+    xAdvance = _column_property("xAdvance")
+    yAdvance = _column_property("yAdvance")
+
+    def __repr__(self):
+        return "<PositionView %s>" % ", ".join(
+            "%s=%g" % (f, getattr(self, f)) for f in _position_fields
+        )
+
+
+class FeatureMaskView(MutableMapping):
+    """The feature masks of a :py:class:`CompactBufferItem`, stored as bits
+    and presented as a mapping of feature tags to booleans."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, feature):
+        bit = self._store.features.get(feature, 0)
+        if not self._store.feature_set[self._row] & bit:
+            raise KeyError(feature)
+        return bool(self._store.feature_value[self._row] & bit)
+
+    def get(self, feature, default=None):
+        bit = self._store.features.get(feature, 0)
+        if not self._store.feature_set[self._row] & bit:
+            return default
+        return bool(self._store.feature_value[self._row] & bit)
+
+    def __setitem__(self, feature, value):
+        store, row = self._store, self._row
+        bit = store.feature_bit(feature)
+        store.feature_set[row] |= bit
+        if value:
+            store.feature_value[row] |= bit
+        else:
+            store.feature_value[row] &= ~bit
+
+    def __delitem__(self, feature):
+        bit = self._store.features.get(feature, 0)
+        if not self._store.feature_set[self._row] & bit:
+            raise KeyError(feature)
+        self._store.feature_set[self._row] &= ~bit
+        self._store.feature_value[self._row] &= ~bit
+
+    def __iter__(self):
+        present = self._store.feature_set[self._row]
+        return iter([f for f, bit in self._store.features.items() if present & bit])
+
+    def __len__(self):
+        return bin(self._store.feature_set[self._row]).count("1")
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactBufferItem(BaseBufferItem):
+    """A view of one row of an :py:class:`ItemStore`.
+
+    Glyphs are stored as glyph IDs; the ``glyph`` attribute translates them
+    to and from glyph names. Attributes which are not part of the store
+    (syllable information, attachment chains and so on) are held in slots
+    on the item. The item has no ``__dict__``, so other attributes cannot
+    be set on it."""
+
+    __slots__ = ("_store", "_row") + _item_fields
+
+    @classmethod
+    def _new(klass, store, row):
+        self = klass()
+        self._store = store
+        self._row = row
+        return self
+
+    @classmethod
+    def new_unicode(klass, codepoint, store=None):
+        if store is None:
+            store = ItemStore()
+        self = klass._new(store, store.new_row())
+        self.codepoint = codepoint
+        return self
+
+    @classmethod
+    def new_glyph(klass, glyph, font, store=None):
+        if store is None:
+            store = ItemStore(glyph_table(font))
+        self = klass._new(store, store.new_row())
+        self.glyph = glyph
+        self.prep_glyph(font)
+        return self
+
+    def __copy__(self):
+        new = self._new(self._store, self._store.copy_row(self._row))
+        for name in _item_fields:
+            if hasattr(self, name):
+                setattr(new, name, getattr(self, name))
+        return new
+
+    def __del__(self):
+        self._store.release_row(self._row)
+
+    def shaped_fields(self):
+        fields = {
+            name: getattr(self, name) for name in _item_fields if hasattr(self, name)
+        }
+        for name in _stored_fields:
+            fields[name] = getattr(self, name)
+        return fields
+
+    @property
+    def codepoint(self):
+        codepoint = self._store.codepoint[self._row]
+        return None if codepoint < 0 else codepoint
+
+    @codepoint.setter
+    def codepoint(self, codepoint):
+        self._store.codepoint[self._row] = -1 if codepoint is None else codepoint
+
+    @property
+    def glyph_id(self):
+        """The glyph ID of this item, or -1 if it has no glyph."""
+        return self._store.glyph[self._row]
+
+    @property
+    def glyph(self):
+        gid = self._store.glyph[self._row]
+        return None if gid < 0 else self._store.glyphs.glyph_names[gid]
+
+    @glyph.setter
+    def glyph(self, glyph):
+        self._store.glyph[self._row] = self._store.glyph_id(glyph)
+
+    @property
+    def category(self):
+        store, row = self._store, self._row
+        subcategory = store.subcategory[row]
+        return (
+            store.category_names[store.category[row]],
+            None if subcategory < 0 else subcategory,
+        )
+
+    @category.setter
+    def category(self, category):
+        store, row = self._store, self._row
+        store.category[row] = store.category_id(category[0])
+        store.subcategory[row] = -1 if category[1] is None else category[1]
+
+    category_bits = _column_property("category_bits")
+    substituted = _flag_property(_SUBSTITUTED)
+    ligated = _flag_property(_LIGATED)
+    multiplied = _flag_property(_MULTIPLIED)
+
+    @property
+    def cluster(self):
+        """The index of the character this item was shaped from."""
+        return self._store.cluster[self._row]
+
+    @cluster.setter
+    def cluster(self, cluster):
+        self._store.cluster[self._row] = cluster
+
+    @property
+    def position(self):
+        if not self._store.flags[self._row] & _POSITIONED:
+            raise AttributeError("position")
+        return PositionView(self._store, self._row)
+
+    @position.setter
+    def position(self, vr):
+        store, row = self._store, self._row
+        store.flags[row] |= _POSITIONED
+        for field in _position_fields:
+            getattr(store, field)[row] = getattr(vr, field) or 0
+
+    @property
+    def feature_masks(self):
+        return FeatureMaskView(self._store, self._row)
+
+    @feature_masks.setter
+    def feature_masks(self, masks):
+        self._store.feature_set[self._row] = 0
+        self._store.feature_value[self._row] = 0
+        view = self.feature_masks
+        for feature, value in masks.items():
+            view[feature] = value
+
+
+class CompactBuffer(Buffer):
+    """A :py:class:`fontFeatures.shaperLib.Buffer.Buffer` whose items are
+    stored in parallel arrays.
+
+    Takes the same arguments as ``Buffer``. Glyph IDs follow the glyph
+    order of the font. Masks are computed directly from the arrays, and
+    rules and mark filtering sets are matched against glyph IDs."""
+
+    itemclass = CompactBufferItem
+
+    def __init__(self, font, *args, **kwargs):
+        self.store = ItemStore(glyph_table(font))
+        super().__init__(font, *args, **kwargs)
+
+    def store_glyphs(self, glyphs):
+        self.items = [
+            self.itemclass.new_glyph(g, self.font, store=self.store) for g in glyphs
+        ]
+        for ix, item in enumerate(self.items):
+            item.cluster = ix
+
+    def store_unicode(self, unistring):
+        super().store_unicode(unistring)
+        for ix, item in enumerate(self.items):
+            item.cluster = ix
+
+    def _new_item(self, codepoint):
+        return self.itemclass.new_unicode(codepoint, store=self.store)
+
+    def match_slots(self, compiled):
+        return compiled.glyph_ids(self.store.glyphs)
+
+    def glyphs_match(self, items, slots):
+        if len(items) != len(slots):
+            return False
+        store = self.store
+        glyph = store.glyph
+        itemclass = self.itemclass
+        for item, slot in zip(items, slots):
+            if item.__class__ is itemclass and item._store is store:
+                gid = glyph[item._row]
+            else:
+                gid = store.glyph_id(item.glyph)
+            if gid not in slot:
+                return False
+        return True
+
+    def _make_predicate(self, ignored, filtering, attachment, feature):
+        slow = super()._make_predicate(ignored, filtering, attachment, feature)
+        store = self.store
+        itemclass = self.itemclass
+        category_bits = store.category_bits
+        glyph = store.glyph
+        feature_value = store.feature_value
+        feature = store.features.get(feature, 0) if feature else 0
+        if filtering is not None:
+            filtering = frozenset(store.glyph_id(g) for g in filtering)
+        if attachment is not None:
+            attachment = frozenset(store.glyph_id(g) for g in attachment)
+
+        def visible(item):
+            if item.__class__ is not itemclass or item._store is not store:
+                return slow(item)
+            row = item._row
+            bits = category_bits[row]
+            if bits & ignored:
+                return False
+            if bits == 0x8:
+                if filtering is not None and glyph[row] not in filtering:
+                    return False
+                if attachment is not None and glyph[row] not in attachment:
+                    return False
+            if feature and feature_value[row] & feature:
+                return False
+            return True
+
+        return visible
@@ -1,6 +1,6 @@
 import logging
 
-__all__ = ["apply_to_buffer"]
+__all__ = ["apply_to_buffer", "coverage_index", "glyph_digest"]
 
 
 def is_forward(rules):
@@ -19,15 +19,96 @@ def is_forward(rules):
     return not clearly_reverse
 
 
+class CoverageIndex:
+    """Maps the glyph at a buffer position to the rules of a routine which
+    could possibly start matching there, in routine order."""
+
+    def __init__(self, rules, namedclasses):
+        self.namedclasses = namedclasses
+        self.rulecount = len(rules)
+        self.by_glyph = {}
+        self.wildcards = []
+        self.merged = {}
+        for ix, rule in enumerate(rules):
+            coverage = rule.shaper_coverage(namedclasses)
+            if coverage is None:
+                self.wildcards.append((ix, rule))
+                continue
+            for g in coverage:
+                self.by_glyph.setdefault(g, []).append((ix, rule))
+        # The glyphs at which a rule could start to match
+        self.digest = None if self.wildcards else frozenset(self.by_glyph)
+
+    def rules_for(self, glyph):
+        """Returns the rules which may apply at a position holding ``glyph``."""
+        if glyph not in self.merged:
+            candidates = self.by_glyph.get(glyph, [])
+            if self.wildcards:
+                candidates = sorted(candidates + self.wildcards, key=lambda x: x[0])
+            self.merged[glyph] = [r for _, r in candidates]
+        return self.merged[glyph]
+
+
+def _coverage(self, namedclasses):
+    index = self._coverage_index
+    if (
+        index is not None
+        and index.namedclasses is namedclasses
+        and index.rulecount == len(self.rules)
+    ):
+        return index
+    self._coverage_index = CoverageIndex(self.rules, namedclasses)
+    return self._coverage_index
+
+
+def coverage_index(self, namedclasses={}):
+    """Returns a :py:class:`CoverageIndex` for this routine.
+
+    The index is built lazily and rebuilt when the rules change. If rules
+    within the routine carry flags different to the routine's own, each rule
+    must be visited in order to set the buffer mask, so ``None`` is returned
+    and every rule is tested."""
+    if any(r.flags and r.flags != self.flags for r in self.rules):
+        return None
+    return _coverage(self, namedclasses)
+
+
+def glyph_digest(self, namedclasses={}):
+    """Returns the set of glyphs at which a rule of this routine could start
+    to match, or ``None`` if a rule could start at any glyph.
+
+    A routine whose digest has no glyph in common with the buffer's
+    :py:meth:`fontFeatures.shaperLib.Buffer.Buffer.glyph_digest` cannot
+    apply, and is skipped by :py:meth:`apply_to_buffer`."""
+    return _coverage(self, namedclasses).digest
+
+
+def _candidate_rules(self, index, buf, i):
+    if index is None:
+        return self.rules
+    if i >= len(buf):
+        return []
+    return index.rules_for(buf[i].glyph)
+
+
 def apply_to_buffer(self, buf, stage=None, feature=None, namedclasses={}):
+    if stage and self.pending and self.stage != stage:
+        # Don't read a lazily unparsed routine just to skip its rules
+        return
+    digest = glyph_digest(self, namedclasses)
+    if digest is not None and digest.isdisjoint(buf.glyph_digest()):
+        buf.routines_skipped += 1
+        return
+    buf.routines_applied += 1
     buf.set_mask(self.flags, self.markFilteringSet, self.markAttachmentSet)
     if feature:
         buf.set_feature_mask(feature)
+    index = self.coverage_index(namedclasses)
     # XXX reverse sub routines must go backwards here
     if is_forward(self.rules):
         i = 0
         while i < len(buf):  # (which may change!)
-            for r in self.rules:
+            for r in _candidate_rules(self, index, buf, i):
                 if stage and r.stage != stage:
                     continue
                 if r.flags:
@@ -45,7 +126,7 @@ def apply_to_buffer(self, buf, stage=None, feature=None, namedclasses={}):
     else:
         i = len(buf)
         while i >= 0:
-            for r in self.rules:
+            for r in _candidate_rules(self, index, buf, i):
                 if stage and r.stage != stage:
                     continue
                 if r.flags:
@@ -3,6 +3,8 @@ import logging
 __all__ = [
     "would_apply_at_position",
     "pre_post_context_matches",
+    "shaper_coverage",
+    "compiled_slots",
     "_expand_slot",
 ]
 
@@ -21,40 +23,99 @@ def _expand_slot(slot, namedclasses={}):
     return expanded
 
 
-def glyphs_match(buffer_glyphs, routine_glyphs, namedclasses={}):
-    if len(buffer_glyphs) != len(routine_glyphs):
-        return False
-    for a, b in zip(buffer_glyphs, routine_glyphs):
-        if a.glyph not in _expand_slot(b, namedclasses):
-            return False
-    return True
+def _compile_slot(slot, namedclasses={}):
+    if any(g.startswith("@") for g in slot):
+        return frozenset(_expand_slot(slot, namedclasses))
+    return frozenset(slot)
+
+
+class CompiledSlots:
+    """The glyph slots of a rule, with named classes resolved to frozensets
+    so that testing a buffer glyph against a slot is a set lookup."""
+
+    def __init__(self, rule, namedclasses):
+        self.namedclasses = namedclasses
+        self.precontext = tuple(
+            _compile_slot(s, namedclasses) for s in getattr(rule, "precontext", [])
+        )
+        self.postcontext = tuple(
+            _compile_slot(s, namedclasses) for s in getattr(rule, "postcontext", [])
+        )
+        self.input = tuple(_compile_slot(s, namedclasses) for s in rule.shaper_inputs())
+        self._glyph_ids = None
+
+    def glyph_ids(self, table):
+        """Returns the precontext, input and postcontext slots as frozensets
+        of glyph IDs taken from the given
+        :py:class:`fontFeatures.shaperLib.CompactBuffer.GlyphTable`."""
+        cached = self._glyph_ids
+        if cached is None or cached[0] is not table:
+
+            def ids(slots):
+                return tuple(
+                    frozenset(table.glyph_id(g) for g in slot) for slot in slots
+                )
+
+            cached = self._glyph_ids = (
+                table,
+                ids(self.precontext),
+                ids(self.input),
+                ids(self.postcontext),
+            )
+        return cached[1:]
+
+
+def compiled_slots(self, namedclasses={}):
+    """Returns a :py:class:`CompiledSlots` object for this rule.
+
+    The compiled slots are cached on the rule, and discarded when its glyph
+    slots are reassigned or a different named class dictionary is used."""
+    compiled = self.__dict__.get("_compiled_slots")
+    if compiled is None or compiled.namedclasses is not namedclasses:
+        compiled = self._compile_slots(namedclasses)
+        self._compiled_slots = compiled
+    return compiled
+
+
+def _compile_slots(self, namedclasses):
+    return CompiledSlots(self, namedclasses)
+
+
+def shaper_coverage(self, namedclasses={}):
+    """Returns the set of glyphs which may appear at the position where this
+    rule starts matching, or ``None`` if the rule may match anywhere."""
+    coverage = self.compiled_slots(namedclasses).input
+    if len(coverage) < 1:
+        return set()
+    return coverage[0]
 
 
 def pre_post_context_matches(self, buf, ix, namedclasses={}):
-    if hasattr(self, "precontext") and self.precontext:
-        if ix < len(self.precontext):
+    precontext_slots, input_slots, postcontext_slots = buf.match_slots(
+        self.compiled_slots(namedclasses)
+    )
+    if precontext_slots:
+        if ix < len(precontext_slots):
             logging.getLogger("fontFeatures.shaperLib").debug(
                 " - No, not enough precontext"
             )
             return False
-        precontext = buf[ix - len(self.precontext) : ix]
-        if not glyphs_match(precontext, self.precontext, namedclasses):
+        precontext = buf[ix - len(precontext_slots) : ix]
+        if not buf.glyphs_match(precontext, precontext_slots):
             logging.getLogger("fontFeatures.shaperLib").debug(
                 " - No, precontext doesn't match %s != %s"
                 % (i2s(precontext), self.precontext)
             )
             return False
-    if hasattr(self, "postcontext") and self.postcontext:
-        coverage = self.shaper_inputs()
-        coverage_l = len(coverage)
-        end_of_coverage = ix + coverage_l
-        if end_of_coverage + len(self.postcontext) > len(buf):
+    if postcontext_slots:
+        end_of_coverage = ix + len(input_slots)
+        if end_of_coverage + len(postcontext_slots) > len(buf):
             logging.getLogger("fontFeatures.shaperLib").debug(
                 " - No, not enough postcontext"
             )
             return False
-        postcontext = buf[end_of_coverage : end_of_coverage + len(self.postcontext)]
-        if not glyphs_match(postcontext, self.postcontext, namedclasses):
+        postcontext = buf[end_of_coverage : end_of_coverage + len(postcontext_slots)]
+        if not buf.glyphs_match(postcontext, postcontext_slots):
             logging.getLogger("fontFeatures.shaperLib").debug(
                 " - No, postcontext doesn't match %s != %s"
                 % (i2s(postcontext), self.postcontext)
@@ -67,15 +128,15 @@ def would_apply_at_position(self, buf, ix, namedclasses={}):
     logging.getLogger("fontFeatures.shaperLib").debug(
         "Testing if rule would apply at position %i" % (ix)
     )
-    coverage = self.shaper_inputs()
+    coverage = buf.match_slots(self.compiled_slots(namedclasses))[1]
     coverage_l = len(coverage)
     if coverage_l < 1:
         return False
     buffer_glyphs = buf[ix : ix + coverage_l]
 
-    if not glyphs_match(buffer_glyphs, coverage, namedclasses):
+    if not buf.glyphs_match(buffer_glyphs, coverage):
         logging.getLogger("fontFeatures.shaperLib").debug(
-            " - No! %s != %s" % (i2s(buffer_glyphs), coverage)
+            " - No! %s != %s" % (i2s(buffer_glyphs), self.shaper_inputs())
         )
         return False
 
@@ -83,6 +144,6 @@ def would_apply_at_position(self, buf, ix, namedclasses={}):
         return False
 
     logging.getLogger("fontFeatures.shaperLib").debug(
-        " - Yes! %s == %s" % (i2s(buffer_glyphs), coverage)
+        " - Yes! %s == %s" % (i2s(buffer_glyphs), self.shaper_inputs())
     )
     return True
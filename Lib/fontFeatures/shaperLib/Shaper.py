@@ -1,30 +1,173 @@
 """A Python Unicode Shaping Engine."""
 
-from fontFeatures import FontFeatures
+from fontFeatures import FontFeatures, RoutineReference
 from .BaseShaper import BaseShaper
+from .Buffer import Buffer
 from .ArabicShaper import ArabicShaper
 from .IndicShaper import IndicShaper
 from .MyanmarShaper import MyanmarShaper
 from .HangulShaper import HangulShaper
 from .KhmerShaper import KhmerShaper
 from .USEShaper import USEShaper
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import logging
 import re
+import threading
+
+
+class ShapePlan:
+    """A compiled plan for shaping buffers.
+
+    A plan holds the complex shaper class, the shaping stages and the
+    language-filtered routines of each stage for buffers sharing a script,
+    language and direction and shaped with the same user features. Plans
+    are created and cached by :py:meth:`Shaper.plan`.
+
+    Args:
+        shaper: The :py:class:`Shaper` creating this plan.
+        buf: A buffer with the script, language and direction to plan for.
+        user_features: A list of feature dictionaries as returned by
+            ``Shaper._parse_user_feature_string``.
+    """
+
+    def __init__(self, shaper, buf, user_features):
+        self.fontfeatures = shaper.fontfeatures
+        self.msg = shaper.msg
+        self.user_features = user_features
+        self.fontfeatures.resolveAllRoutines()
+        self.fontfeatures.hoist_languages()
+        self.complexshaper = shaper.categorize(buf)
+        self._template = self.complexshaper(self, shaper.babelfont, buf)
+        self.stages = [[]]
+        self.collect_features(buf)
+        self.lookups = [self._stage_lookups(stage) for stage in self.stages]
+        del self._template
+
+    def _stage_lookups(self, stage):
+        if not isinstance(stage, list):
+            return None
+        lookups = []
+        for f in stage:
+            if f not in self.fontfeatures.features:
+                continue
+            routines = [
+                x.routine if isinstance(x, RoutineReference) else x
+                for x in self.fontfeatures.features[f]
+            ]
+            lookups.extend(
+                [(routine, f) for routine in self._template._filter_by_lang(routines)]
+            )
+        return lookups
+
+    def add_pause(self, thing=None):
+        """Add a pause in the shaping stage. Used internally.
+
+        ``thing`` is a method of the complex shaper; when the pause is reached
+        it is called on the complex shaper shaping the buffer."""
+        if thing:
+            if getattr(thing, "__self__", None) is self._template:
+                thing = thing.__func__
+            else:
+                thing = _unbound(thing)
+            self.stages.append(thing)
+        self.stages.append([])
+
+    def add_features(self, *tags):
+        """Adds feature tags to the current shaping stage."""
+        for t in tags:
+            if any([isinstance(x, list) and t in x for x in self.stages]):
+                continue
+            self.stages[-1].append(t)
+
+    def disable_feature(self, tag):
+        """Removes a feature from processing."""
+        for s in self.stages:
+            if isinstance(s, list) and tag in s:
+                s.remove(tag)
+
+    def collect_features(self, buf):
+        """Determine the features, and their order, to process the buffer."""
+        self.add_features("rvrn")
+        self.add_pause()
+        if buf.direction == "LTR":
+            self.add_features("ltra", "ltrm")
+        elif buf.direction == "RTL":
+            self.add_features("rtla", "rtlm")
+        self.add_features("frac", "numr", "dnom", "rand")
+        # trak?
+        self._template.collect_features(self)
+        # common features
+        self.add_features("abvm", "blwm", "ccmp", "locl", "mark", "mkmk", "rlig")
+        if buf.direction == "LTR" or buf.direction == "RTL":
+            self.add_features("calt", "clig", "curs", "dist", "kern", "liga", "rclt")
+        else:
+            self.add_features("vert")
+        for uf in self.user_features:
+            if not uf["value"]:  # Turn it off if it's already on
+                self.disable_feature(uf["tag"])
+            else:
+                self.add_features(uf["tag"])
+        if hasattr(self._template, "override_features"):
+            self._template.override_features(self)
+
+
+_worker_shaper = None
+
+
+def _init_worker(ff, font, max_plans):
+    global _worker_shaper
+    _worker_shaper = Shaper(ff, font, max_plans=max_plans)
+
+
+def _shape_chunk(texts, features):
+    results = []
+    for text in texts:
+        buf = Buffer(_worker_shaper.babelfont, unicodes=text)
+        _worker_shaper.execute(buf, features)
+        # The font is not sent back to the parent process
+        buf.font = None
+        results.append(buf)
+    return results
+
+
+def _unbound(thing):
+    def pause(complexshaper, stage):
+        return thing(stage)
+
+    return pause
 
 
 class Shaper:
     """Initialize a shaping engine.
 
+    Shaping plans are cached, so if the ``FontFeatures`` object is modified
+    after shaping, call :py:meth:`clear_plans` before shaping again.
+
+    The state of each call to :py:meth:`execute` is held by the complex
+    shaper created for that call, and the ``FontFeatures`` object is only
+    read while shaping, so a single ``Shaper`` may be used to shape
+    different buffers concurrently from several threads.
+
     Args:
         ff: A :py:class:`fontFeatures.FontFeatures` object.
         font: A ``Babelfont`` font object.
         message_function: A function called with a message and buffer object.
+        max_plans: The number of shaping plans to keep.
+        cache: An optional
+            :py:class:`fontFeatures.shaperLib.ShapingCache.ShapingCache` in
+            which to remember the results of shaping.
     """
 
-    def __init__(self, ff, font, message_function=None):
+    def __init__(self, ff, font, message_function=None, max_plans=32, cache=None):
         assert isinstance(ff, FontFeatures)
         self.fontfeatures = ff
         self.babelfont = font
+        self.max_plans = max_plans
+        self.cache = cache
+        self._plans = OrderedDict()
+        self._plans_lock = threading.Lock()
         if message_function:
             self.msg = message_function
         else:
@@ -37,19 +180,108 @@ class Shaper:
             buf: :py:class:`fontFeatures.shaperLib.buffer.Buffer` object.
             features: either a list of feature tags or a feature string ("+foox,-barx")
         """
-        # Choose complex shaper
-        self.complexshaper = self.categorize(buf)(self, self.babelfont, buf, features)
-        self.msg("Using %s" % type(self.complexshaper).__name__)
-        self.stages = [[]]
         if isinstance(features, str):
-            self.user_features = self._parse_user_feature_string(features)
-        else:
-            self.user_features = features
-        self.collect_features(buf)
-        self.complexshaper.shape()
+            features = self._parse_user_feature_string(features)
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self, buf, features)
+            snapshot = key and self.cache.get(key, self.babelfont)
+            if snapshot:
+                buf.restore(snapshot)
+                return buf
+        plan = self.plan(buf, features)
+        complexshaper = plan.complexshaper(plan, self.babelfont, buf, features)
+        self.msg("Using %s" % type(complexshaper).__name__)
+        complexshaper.shape()
         buf.clear_mask()
+        if key:
+            self.cache.put(key, self.babelfont, buf.snapshot())
         return buf
 
+    def execute_many(self, texts, features=[], workers=1, chunksize=64):
+        """Shape a number of strings.
+
+        With more than one worker, the strings are shaped in a pool of
+        processes, each holding its own copy of the shaper; the strings are
+        sent to the workers ``chunksize`` at a time. Results are returned in
+        the order of the input as they become available.
+
+        Args:
+            texts: An iterable of strings.
+            features: either a list of feature tags or a feature string ("+foox,-barx")
+            workers: The number of processes to shape with. If 1, the strings
+                are shaped in this process.
+            chunksize: The number of strings sent to a worker at a time.
+
+        Returns:
+            A generator of shaped :py:class:`fontFeatures.shaperLib.Buffer.Buffer`
+            objects, one for each string.
+        """
+        if workers <= 1:
+            for text in texts:
+                yield self.execute(Buffer(self.babelfont, unicodes=text), features)
+            return
+        texts = iter(texts)
+        chunks = iter(lambda: list(islice(texts, chunksize)), [])
+        with ProcessPoolExecutor(
+            workers,
+            initializer=_init_worker,
+            initargs=(self.fontfeatures, self.babelfont, self.max_plans),
+        ) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_shape_chunk, chunk, features))
+                # Keep a bounded number of chunks in flight
+                if len(pending) >= 2 * workers:
+                    yield from self._collect_chunk(pending.popleft())
+            while pending:
+                yield from self._collect_chunk(pending.popleft())
+
+    def _collect_chunk(self, future):
+        for buf in future.result():
+            buf.font = self.babelfont
+            yield buf
+
+    def plan(self, buf, features=[]):
+        """Returns a :py:class:`ShapePlan` for shaping the given buffer.
+
+        Plans are cached by the script, language and direction of the buffer
+        and by the user features; the least recently used plan is discarded
+        once ``max_plans`` plans are held.
+
+        Args:
+            buf: :py:class:`fontFeatures.shaperLib.buffer.Buffer` object.
+            features: either a list of feature tags or a feature string ("+foox,-barx")
+        """
+        if isinstance(features, str):
+            features = self._parse_user_feature_string(features)
+        key = (
+            buf.script,
+            buf.language,
+            buf.direction,
+            tuple((f["tag"], f["value"]) for f in features),
+        )
+        with self._plans_lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+            # Planning resolves and hoists the routines of the FontFeatures
+            # object, so must not run concurrently with other planning.
+            plan = ShapePlan(self, buf, features)
+            self._plans[key] = plan
+            if len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+            return plan
+
+    def clear_plans(self):
+        """Discards all cached shaping plans, and any cached results of
+        shaping with this shaper's ``FontFeatures`` object."""
+        with self._plans_lock:
+            self._plans.clear()
+        if self.cache is not None:
+            self.cache.invalidate(self.fontfeatures)
+
     def default_message_function(self, msg, buffer=None, serialize_options=None):
         """A logger function to be used if one is not provided in the constructor.
 
@@ -77,50 +309,6 @@ class Shaper:
                 outfeat.append({"tag": f, "value": True})
         return outfeat
 
-    def add_pause(self, thing=None):
-        """Add a pause in the shaping stage. Used internally."""
-        if thing:
-            self.stages.append(thing)
-        self.stages.append([])
-
-    def add_features(self, *tags):
-        """Adds feature tags to the current shaping stage."""
-        for t in tags:
-            if any([isinstance(x, list) and t in x for x in self.stages]):
-                continue
-            self.stages[-1].append(t)
-
-    def disable_feature(self, tag):
-        """Removes a feature from processing."""
-        for s in self.stages:
-            if isinstance(s, list) and tag in s:
-                s.remove(tag)
-
-    def collect_features(self, buf):
-        """Determine the features, and their order, to process the buffer."""
-        self.add_features("rvrn")
-        self.add_pause()
-        if buf.direction == "LTR":
-            self.add_features("ltra", "ltrm")
-        elif buf.direction == "RTL":
-            self.add_features("rtla", "rtlm")
-        self.add_features("frac", "numr", "dnom", "rand")
-        # trak?
-        self.complexshaper.collect_features(self)
-        # common features
-        self.add_features("abvm", "blwm", "ccmp", "locl", "mark", "mkmk", "rlig")
-        if buf.direction == "LTR" or buf.direction == "RTL":
-            self.add_features("calt", "clig", "curs", "dist", "kern", "liga", "rclt")
-        else:
-            self.add_features("vert")
-        for uf in self.user_features:
-            if not uf["value"]:  # Turn it off if it's already on
-                self.disable_feature(uf["tag"])
-            else:
-                self.add_features(uf["tag"])
-        if hasattr(self.complexshaper, "override_features"):
-            self.complexshaper.override_features(self)
-
     def categorize(self, buf):
         """Returns the appropriate complex shaper class to shape this buffer."""
         if buf.script == "Arabic":
@@ -0,0 +1,103 @@
+"""A cache of shaping results.
+
+Running text repeats the same words many times. When text is shaped one
+segment (such as a word) at a time, a :py:class:`ShapingCache` passed to
+the :py:class:`fontFeatures.shaperLib.Shaper.Shaper` remembers the shaped
+glyphs and positions of each segment, so that repeated segments are not
+shaped again::
+
+    cache = ShapingCache(maxsize=10000)
+    shaper = Shaper(ff, font, cache=cache)
+    for word in words:
+        buf = Buffer(font, unicodes=word)
+        shaper.execute(buf)
+    print(cache.info())
+
+Only buffers of characters are cached; buffers of glyphs are always
+shaped. If the ``FontFeatures`` object is modified, call
+:py:meth:`ShapingCache.invalidate` (or ``Shaper.clear_plans``).
+"""
+from collections import OrderedDict, namedtuple
+import threading
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class ShapingCache:
+    """A bounded LRU cache of shaping results.
+
+    Results are keyed by the ``FontFeatures`` object and font, the text of
+    the buffer, its script, language and direction, and the features
+    requested. The cache may be shared between shapers and threads.
+
+    Args:
+        maxsize: The maximum number of results to keep.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, shaper, buf, features):
+        """Returns the cache key for shaping ``buf`` with ``shaper`` and the
+        given list of feature dictionaries, or ``None`` if the buffer cannot
+        be cached."""
+        if not buf.items or not all(
+            item.glyph is None and item.codepoint is not None for item in buf.items
+        ):
+            return None
+        return (
+            shaper.fontfeatures,
+            id(shaper.babelfont),
+            "".join(chr(item.codepoint) for item in buf.items),
+            buf.script,
+            buf.language,
+            buf.direction,
+            tuple((f["tag"], f["value"]) for f in features),
+        )
+
+    def get(self, key, font):
+        """Returns the cached snapshot for ``key``, or ``None``."""
+        with self._lock:
+            entry = self._results.get(key)
+            # Guard against a font being freed and its id reused
+            if entry is None or entry[0] is not font:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, font, snapshot):
+        """Stores the snapshot of a shaped buffer."""
+        with self._lock:
+            self._results[key] = (font, snapshot)
+            self._results.move_to_end(key)
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def invalidate(self, fontfeatures=None):
+        """Discards cached results.
+
+        Args:
+            fontfeatures: If given, only results shaped with this
+                ``FontFeatures`` object are discarded.
+        """
+        with self._lock:
+            if fontfeatures is None:
+                self._results.clear()
+                return
+            for key in [k for k in self._results if k[0] is fontfeatures]:
+                del self._results[key]
+
+    def info(self):
+        """Returns the hits, misses, maximum size and current size of the
+        cache."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._results))
+
+    def __len__(self):
+        return len(self._results)
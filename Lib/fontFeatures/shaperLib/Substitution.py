@@ -5,20 +5,32 @@ def shaper_inputs(self):
     return self.input
 
 
-def _do_apply(self, buf, ix, namedclasses={}):
-    from fontFeatures.shaperLib.Rule import _expand_slot
+def _compile_slots(self, namedclasses):
+    from fontFeatures.shaperLib.Rule import CompiledSlots, _expand_slot
+
+    compiled = CompiledSlots(self, namedclasses)
+    compiled.single_mapping = None
+    if len(self.input) == 1 and len(self.replacement) == 1:
+        replacements = _expand_slot(self.replacement[0], namedclasses)
+        inputs = _expand_slot(self.input[0], namedclasses)
+        compiled.single_mapping = {}
+        for i, g in enumerate(inputs):
+            if len(replacements) == 1:
+                compiled.single_mapping.setdefault(g, replacements[0])
+            elif i < len(replacements):
+                compiled.single_mapping.setdefault(g, replacements[i])
+    return compiled
 
+
+def _do_apply(self, buf, ix, namedclasses={}):
     coverage = buf[ix : ix + len(self.input)]
     newstuff = []
     # Handle single subst first
-    if len(self.input) == 1 and len(self.replacement) == 1:
-        replacements = _expand_slot(self.replacement[0], namedclasses)
-        if len(replacements) == 1:
-            buf[ix].glyph = replacements[0]
-        else:
-            inputs = _expand_slot(self.input[0], namedclasses)
-            buf[ix].glyph = replacements[inputs.index(buf[ix].glyph)]
+    mapping = self.compiled_slots(namedclasses).single_mapping
+    if mapping is not None:
+        buf[ix].glyph = mapping[buf[ix].glyph]
         buf[ix].prep_glyph(buf.font)
+        buf.mark_dirty(ix)
         return
 
     delta = len(self.replacement) - 1
@@ -5,6 +5,10 @@ def lookup_type(self):
     """Mixin to determine the GSUB/GPOS lookup type of a fontFeatures.Chaining object
 
     Returns: integer GSUB/GPOS lookup type."""
+    return self._memo("lookup_type", lambda: _lookup_type(self))
+
+
+def _lookup_type(self):
     if self.stage == "pos":
         return 8
     else:
@@ -0,0 +1,8 @@
+"""ttLib.ClassKerning: Converting ClassKerning rules to TrueType."""
+
+
+def lookup_type(self):
+    """Mixin to determine the GPOS lookup type of a fontFeatures.ClassKerning object
+
+    Returns: integer GPOS lookup type."""
+    return 2
@@ -25,12 +25,13 @@ def buildBinaryFeatures(self, font, axes=[]):
         axes: an optional list of objects conforming to the
           ``fontTools.designspaceLib.AxisDescriptor`` protocol.
     """
+    # Routines are split and reordered in a working copy
+    self = self._workingCopy()
     self.resolveAllRoutines()
     reorderRoutines(self)
 
     # Partition rules based on lookup types
-    for r in self.routines:
-        self.partitionRoutine(r, lambda rule: rule.lookup_type())
+    self.partitionAll(lambda rule: rule.lookup_type())
 
     # XXX first build gdef for mark attachment classes
     if axes:
@@ -125,9 +126,10 @@ def arrangeByScripts(self):
     Returns an ordered dictionary; the keys are tuples of
     ``(feature_tag, script_tag, language_tag))``, and the values are a list of
     routines."""
-    for r in self.routines:
-        if any(rule.languages for rule in r.rules):
-            self.partitionRoutine(r, lambda rule: tuple(rule.languages or []))
+    self.partitionAll(
+        lambda rule: tuple(rule.languages or []),
+        [r for r in self.routines if any(rule.languages for rule in r.rules)],
+    )
 
     for r in self.routines:
         if not r.rules:
@@ -107,30 +107,66 @@ class GPOSUnparser(GTableUnparser):
                         )
                         b.addRule(spos)
             else:
-                class1 = self._invertClassDef(subtable.ClassDef1.classDefs, self.font)
-                class2 = self._invertClassDef(subtable.ClassDef2.classDefs, self.font)
-                for ix1, c1 in enumerate(subtable.Class1Record):
-                    if ix1 not in class1:
-                        continue  # XXX
-                    for ix2, c2 in enumerate(c1.Class2Record):
-                        if ix2 not in class2:
-                            continue  # XXX
-                        vr1 = self.makeValueRecord(c2.Value1)
-                        vr2 = self.makeValueRecord(c2.Value2)
-                        if not vr1 and not vr2:
-                            continue
-                        firstClass = list(
-                            set(class1[ix1]) & set(subtable.Coverage.glyphs)
-                        )
-                        spos = fontFeatures.Positioning(
-                            [firstClass, class2[ix2]],
-                            [vr1, vr2],
-                            address=self.currentLookup,
-                            flags=lookup.LookupFlag,
-                        )
-                        b.addRule(spos)
+                kerning = self._unparseClassKerning(subtable, lookup)
+                if kerning:
+                    b.addRule(kerning)
         return b, []
 
+    def _unparseClassKerning(self, subtable, lookup):
+        class1 = self._invertClassDef(subtable.ClassDef1.classDefs, self.font)
+        class2 = self._invertClassDef(subtable.ClassDef2.classDefs, self.font)
+        coverage = self._coverageSet(subtable.Coverage)
+        fields1 = self._valueFields(subtable.ValueFormat1)
+        fields2 = self._valueFields(subtable.ValueFormat2)
+        matrix = []
+        classes1 = []
+        used2 = set()
+        for ix1, c1 in enumerate(subtable.Class1Record):
+            row = []
+            for ix2, c2 in enumerate(c1.Class2Record):
+                values = [getattr(c2.Value1, f[0].upper() + f[1:]) for f in fields1]
+                values += [getattr(c2.Value2, f[0].upper() + f[1:]) for f in fields2]
+                if ix1 not in class1 or ix2 not in class2:
+                    values = [0] * len(values)  # XXX
+                elif any(values):
+                    used2.add(ix2)
+                row.append(values)
+            matrix.append(row)
+            # Only glyphs in the coverage table can start a pair
+            if ix1 in class1 and any(any(values) for values in row):
+                classes1.append(list(set(class1[ix1]) & coverage))
+            else:
+                classes1.append([])
+        if not used2:
+            return None  # Nothing to position
+        # Class 0 holds every glyph not otherwise classified, so is only
+        # gathered if it is used
+        classes2 = [
+            class2[ix2] if ix2 in used2 else [] for ix2 in range(subtable.Class2Count)
+        ]
+        return fontFeatures.ClassKerning(
+            classes1,
+            classes2,
+            matrix,
+            fields1=fields1,
+            fields2=fields2,
+            address=self.currentLookup,
+            flags=lookup.LookupFlag,
+        )
+
+    def _valueFields(self, valueFormat):
+        # The fontFeatures.ValueRecord attributes set by a ValueFormat
+        return [
+            name
+            for name, mask in (
+                ("xPlacement", 0x0001),
+                ("yPlacement", 0x0002),
+                ("xAdvance", 0x0004),
+                ("yAdvance", 0x0008),
+            )
+            if valueFormat & mask
+        ]
+
     def unparseCursiveAttachment(self, lookup):
         """Turn a GPOS3 (cursive attachment) subtable into a fontFeatures Routine."""
         b = fontFeatures.Routine(name=self.getname("CursiveAttachment" + self.gensym()))
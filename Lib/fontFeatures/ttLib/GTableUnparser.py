@@ -3,11 +3,20 @@ GTableUnparser: Base class for reading binary GSUB/GPOS tables
 ==============================================================
 """
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from fontTools.misc.xmlWriter import XMLWriter
+from fontTools.ttLib import TTFont, newTable
 import fontFeatures
 from io import BytesIO
+import re
+import threading
 import warnings
 
+# Worker processes generate placeholders in place of names, which are
+# filled in by the parent process; see GTableUnparser._fillNames
+_PLACEHOLDER = re.compile("\x00([0-9]+)\x00")
+_RENAMED = "\x01"
+
 
 def glyph(x):
     """Helper routine to document that a glyph name goes in a slot."""
@@ -15,6 +24,27 @@ def glyph(x):
     return [x]
 
 
+class _InvertedClassDef(dict):
+    # Glyph lists by class, where the glyphs of class 0 (all those not listed
+    # in the class definition) are only gathered when first asked for
+
+    def __init__(self, classZero):
+        super().__init__()
+        self._classZero = classZero
+
+    def __missing__(self, klass):
+        if klass != 0:
+            raise KeyError(klass)
+        self[0] = self._classZero()
+        return self[0]
+
+    def __contains__(self, klass):
+        return klass == 0 or super().__contains__(klass)
+
+    def get(self, klass, default=None):
+        return self[klass] if klass in self else default
+
+
 class GTableUnparser:
     """Base class for reading binary GSUB/GPOS tables."""
 
@@ -42,6 +72,10 @@ class GTableUnparser:
         self.sharedClasses = {}
         self.languageSystems = languageSystems
         self.sharedLookups = OrderedDict()
+        self._glyphOrder = None
+        self._invertedClassDefs = {}
+        self._coverageSets = {}
+        self._placeholderNames = False
 
     def _unparse_lookups(self, slr, inputs, in_lookups=None):
         lookups = []
@@ -75,30 +109,56 @@ class GTableUnparser:
         assert len(lookups) == len(inputs)
         return lookups, note
 
+    def _glyphOrderSet(self, font):
+        if self._glyphOrder is None or self._glyphOrder[0] is not font:
+            self._glyphOrder = (font, set(font.getGlyphOrder()))
+        return self._glyphOrder[1]
+
     def _invertClassDef(self, a, font):
-        classes = {}
+        # Returns a dictionary mapping classes to lists of glyphs, cached for
+        # each classDefs dictionary. Class 0 is only worked out when needed.
+        cached = self._invertedClassDefs.get(id(a))
+        if cached is not None and cached[0] is a:
+            return cached[1]
+        classes = _InvertedClassDef(lambda: self._glyphOrderSet(font) - set(a.keys()))
         for glyph, klass in a.items():
             if klass not in classes:
                 classes[klass] = []
             classes[klass].append(glyph)
-        glyphset = set(font.getGlyphOrder())
-        classes[0] = glyphset - set(a.keys())
+        self._invertedClassDefs[id(a)] = (a, classes)
         return classes
 
+    def _coverageSet(self, coverage):
+        # The glyphs of a coverage table as a set, cached like class
+        # definitions
+        cached = self._coverageSets.get(id(coverage))
+        if cached is None or cached[0] is not coverage:
+            cached = self._coverageSets[id(coverage)] = (coverage, set(coverage.glyphs))
+        return cached[1]
+
     def getname(self, n):
         """Renames its input using the configuration dictionary"""
+        if self._placeholderNames and _PLACEHOLDER.search(n):
+            # Renamed once the generated name is known
+            return _RENAMED + n
         return self.config.get(n, n)
 
     def gensym(self):
         """Generates a new unique name"""
         self.index = self.index + 1
+        if self._placeholderNames:
+            return "\x00%i\x00" % self.index
         return str(self.index)
 
-    def unparse(self, doLookups=True):
-        """Unparse the table to the fontFeatures object."""
+    def unparse(self, doLookups=True, lazy=False, workers=None):
+        """Unparse the table to the fontFeatures object.
+
+        If ``lazy`` is true, lookups are read on demand; if ``workers`` is
+        given, they are read in that many processes. See
+        :py:meth:`unparseLookups`."""
         if not self.table.ScriptList:
             return
-        self.unparseLookups()
+        self.unparseLookups(lazy=lazy, workers=workers)
         self.collectFeatures()
         self.fontFeatures.resolveAllRoutines()
 
@@ -161,24 +221,50 @@ class GTableUnparser:
                 )
         self.features = features
 
-    def unparseLookups(self):
-        """Unparses the lookups to fontFeatures routines."""
+    def unparseLookups(self, lazy=False, workers=None):
+        """Unparses the lookups to fontFeatures routines.
+
+        If ``lazy`` is true, each lookup becomes a
+        :py:class:`fontFeatures.ttLib.LazyRoutine.LazyRoutine`
+        whose rules are only unparsed when they are first needed.
+
+        If ``workers`` is more than one, the lookups are shared out between
+        that many worker processes, each of which reads the table from the
+        font file (or, for a font not read from a file, from its compiled
+        data). The routines are identical to those read in this process."""
         if not self.table.LookupList:
             return
+        if lazy:
+            from .LazyRoutine import LazyRoutine
+
+            self._lazyLock = threading.RLock()
+            for lookupIdx, lookup in enumerate(self.table.LookupList.Lookup):
+                r = LazyRoutine(self, lookup, lookupIdx)
+                self.lookups.append(r)
+                self.fontFeatures.routines.append(r)
+            return
         # Create a dummy list first, to allow resolving chained lookups
         for _ in self.table.LookupList.Lookup:
             r = fontFeatures.Routine()
             self.lookups.append(r)
             self.fontFeatures.routines.append(r)
 
-        for lookupIdx, lookup in enumerate(self.table.LookupList.Lookup):
-            routine, deps = self.unparseLookup(lookup, lookupIdx)
+        if workers and workers > 1:
+            unparsed = self._unparseInWorkers(workers)
+        else:
+            unparsed = (
+                self.unparseLookup(lookup, lookupIdx)
+                for lookupIdx, lookup in enumerate(self.table.LookupList.Lookup)
+            )
+        for lookupIdx, (routine, deps) in enumerate(unparsed):
             debug = self.getDebugInfo(self._table, lookupIdx)
             if debug:
                 routine.address = (self._table, lookupIdx, *debug)
                 if debug[1]:
                     routine.name = debug[1]
             self._copyRoutineToRoutine(routine, self.lookups[lookupIdx])
+            if self.fontFeatures.glyphTable is not None:
+                self.lookups[lookupIdx].compact(self.fontFeatures.glyphTable)
 
     def _copyRoutineToRoutine(self, src, dst):
         dst.name = src.name
@@ -193,6 +279,69 @@ class GTableUnparser:
         dst.markFilteringSet = src.markFilteringSet
         dst.markAttachmentSet = src.markAttachmentSet
 
+    def _unparseInWorkers(self, workers):
+        tasks = range(len(self.table.LookupList.Lookup))
+        tables = {
+            tag: _tableData(self.font, tag)
+            for tag in [self._table, "GDEF"]
+            if tag in self.font
+        }
+        initargs = (type(self), tables, self.font.getGlyphOrder(), self.config)
+        with ProcessPoolExecutor(
+            workers, initializer=_startWorker, initargs=initargs
+        ) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = pool.map(_unparseInWorker, tasks, chunksize=chunksize)
+            for lookupIdx, (routine, symbols, references, caught) in zip(
+                tasks, results
+            ):
+                self.currentLookup = lookupIdx
+                # Names are generated in lookup order, as in a serial read
+                self._fillNames(routine, symbols)
+                references = iter(references)
+                for message, category in caught:
+                    warnings.warn(message, category)
+                # Mark sets are shared between routines using the same set
+                self._fix_flags(routine, self.table.LookupList.Lookup[lookupIdx])
+                # Link up the rules as _unparseInWorker unlinked them
+                for rule in routine.rules:
+                    if isinstance(rule, fontFeatures.Attachment):
+                        rule.font = self.font
+                    if not isinstance(rule, fontFeatures.Chaining):
+                        continue
+                    for lookuplist in rule.lookups:
+                        for reference in lookuplist or []:
+                            reference.routine = self.lookups[next(references)]
+                            reference.name = reference.routine.name
+                yield routine, []
+
+    def _fillNames(self, routine, symbols):
+        # Replaces the placeholders a worker made for generated names in the
+        # names of a routine and its rules with names generated here, in the
+        # order in which the worker made them
+        names = [self.gensym() for _ in range(symbols)]
+
+        def fill(value):
+            renamed = value.startswith(_RENAMED)
+            value = _PLACEHOLDER.sub(
+                lambda m: names[int(m.group(1)) - 1], value.lstrip(_RENAMED)
+            )
+            return self.getname(value) if renamed else value
+
+        routines = [routine] + list(getattr(routine, "routines", []))
+        for item in routines + list(routine.rules):
+            for key, value in list(item.__dict__.items()):
+                if isinstance(value, str) and _PLACEHOLDER.search(value):
+                    setattr(item, key, fill(value))
+
+    def _lookupName(self, lookup):
+        lookupType = self.lookupTypes[lookup.LookupType]
+        if lookupType == "Extension" and lookup.SubTable:
+            lookupType = self.lookupTypes[lookup.SubTable[0].ExtensionLookupType]
+        if lookupType in ["Contextual", "ChainedContextual"]:
+            lookupType = lookupType + self._table
+        return self.getname(lookupType + self.gensym())
+
     def unparseLookup(self, lookup, lookupIdx):
         """Dispatches to the appropriate lookup unparser."""
         self.currentLookup = lookupIdx
@@ -392,7 +541,8 @@ class GTableUnparser:
             rules = getattr(ruleset, ruleattr)
             inputclass = inputs.get(classId, [])
             # The coverage filters the input class...
-            inputclass = [g for g in inputclass if g in sub.Coverage.glyphs]
+            coverage = self._coverageSet(sub.Coverage)
+            inputclass = [g for g in inputclass if g in coverage]
             for r in rules:
                 if chain:
                     prefix = list(reversed([backtrack[x] for x in r.Backtrack]))
@@ -441,3 +591,74 @@ class GTableUnparser:
         if note:
             rule.note = note
         b.addRule(rule)
+
+
+def _tableData(font, tag):
+    # The current data of a table. A table which has not been loaded is
+    # taken as stored in the font file, without compiling it again; a loaded
+    # table may have been modified, so it is compiled.
+    reader = font.reader
+    if not font.isLoaded(tag) and reader is not None and tag in reader:
+        return reader[tag]
+    return font.getTableData(tag)
+
+
+# The unparser of a worker process started by GTableUnparser._unparseInWorkers
+_worker = None
+
+
+def _lazyFont(tables, glyphOrder):
+    # A font made from table data, whose lookups are only decompiled when
+    # they are used
+    font = TTFont(lazy=True)
+    font.setGlyphOrder(glyphOrder)
+    for tag, data in tables.items():
+        font[tag] = newTable(tag)
+        font[tag].decompile(data, font)
+    return font
+
+
+def _lazyTable(font, tag):
+    # A table of the font which has not been decompiled yet, read without
+    # decompiling its lookups. Used by a process which leaves them to its
+    # workers.
+    if font.isLoaded(tag):
+        return font[tag]
+    return _lazyFont({tag: _tableData(font, tag)}, font.getGlyphOrder())[tag]
+
+
+def _startWorker(unparserClass, tables, glyphOrder, config):
+    global _worker
+    font = _lazyFont(tables, glyphOrder)
+    _worker = unparserClass(
+        font[unparserClass._table], fontFeatures.FontFeatures(), {}, font, config
+    )
+    _worker._placeholderNames = True
+    for _ in _worker.table.LookupList.Lookup:
+        _worker.lookups.append(fontFeatures.Routine())
+    _worker.lookupIndices = {id(r): ix for ix, r in enumerate(_worker.lookups)}
+
+
+def _unparseInWorker(lookupIdx):
+    _worker.index = 0
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        routine, _ = _worker.unparseLookup(
+            _worker.table.LookupList.Lookup[lookupIdx], lookupIdx
+        )
+    # The routine is sent back without the worker's font, mark sets or
+    # placeholder routines, with the number of names it generated;
+    # references are sent as the lookup indices they point to
+    routine.markFilteringSet = routine.markAttachmentSet = None
+    references = []
+    for rule in routine.rules:
+        if isinstance(rule, fontFeatures.Attachment):
+            rule.font = None
+        if not isinstance(rule, fontFeatures.Chaining):
+            continue
+        for lookuplist in rule.lookups:
+            for reference in lookuplist or []:
+                references.append(_worker.lookupIndices[id(reference.routine)])
+                reference.routine = None
+    caught = [(str(w.message), w.category) for w in caught]
+    return routine, _worker.index, references, caught
@@ -0,0 +1,99 @@
+"""
+LazyRoutine: A routine read from a binary lookup on demand
+==========================================================
+"""
+import fontFeatures
+
+
+class LazyRoutine(fontFeatures.Routine):
+    """A routine read from a binary lookup the first time its rules are needed.
+
+    These are made by :py:func:`fontFeatures.ttLib.unparse` when called with
+    ``lazy=True``. The name, flags, mark sets and languages of the routine are
+    available straight away; the lookup's subtables are only unparsed when
+    :py:attr:`rules` (or anything computed from them) is first accessed.
+    Lookups called from chaining rules stay unread until they are needed in
+    turn. While the rules are unread, :py:attr:`pending` is true.
+
+    Rules may be read from several threads at once: the routines read from
+    one table are loaded one at a time, and other threads wait until the
+    rules are ready. If reading a lookup fails, it is tried again the next
+    time the rules are needed.
+
+    Args:
+        unparser: The :py:class:`GTableUnparser` reading the table.
+        lookup: The ``otTables.Lookup`` object to read.
+        lookupIdx: Its index in the lookup list.
+    """
+
+    def __init__(self, unparser, lookup, lookupIdx):
+        super().__init__(name=unparser._lookupName(lookup))
+        unparser._fix_flags(self, lookup)
+        debug = unparser.getDebugInfo(unparser._table, lookupIdx)
+        if debug:
+            self.address = (unparser._table, lookupIdx, *debug)
+            if debug[1]:
+                self.name = debug[1]
+        self._source = (unparser, lookup, lookupIdx)
+        self._pending_stage = "sub" if unparser._table == "GSUB" else "pos"
+        self._rules = None
+
+    @property
+    def pending(self):
+        """True if the rules of this routine have not yet been read."""
+        return self._rules is None
+
+    @property
+    def rules(self):
+        """The list of :py:class:`Rule` objects in this Routine, read from the
+        lookup on first access."""
+        if self._rules is None:
+            self._load()
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = rules
+        self.changed()
+
+    def _load(self):
+        source = self._source
+        if source is None:
+            # Loaded by another thread
+            return
+        unparser, lookup, lookupIdx = source
+        with unparser._lazyLock:
+            if self._rules is not None:
+                return
+            routine, _ = unparser.unparseLookup(lookup, lookupIdx)
+            table = unparser.fontFeatures.glyphTable
+            if table is not None:
+                for rule in routine.rules:
+                    rule.compact(table)
+                if self.markFilteringSet is not None:
+                    self.markFilteringSet = table.slot(self.markFilteringSet)
+                if self.markAttachmentSet is not None:
+                    self.markAttachmentSet = table.slot(self.markAttachmentSet)
+            self.comments = routine.comments
+            # Only now can other threads see the rules
+            self.rules = routine.rules
+            self._source = None
+
+    def _memo(self, name, compute):
+        self.rules
+        return super()._memo(name, compute)
+
+    @property
+    def stage(self):
+        """Returns which shaping stage this routine is used in, without reading
+        the rules if they are still pending.
+
+        Returns: ``sub`` for substitution stage, ``pos`` for positioning stage."""
+        if self._rules is None:
+            return self._pending_stage
+        return super().stage
+
+    def __getstate__(self):
+        # Copies and pickles hold the rules, not the font they came from
+        self.rules
+        return super().__getstate__()
@@ -5,6 +5,10 @@ def lookup_type(self):
     """Mixin to determine the GPOS lookup type of a fontFeatures.Positioning object
 
     Returns: integer GPOS lookup type."""
+    return self._memo("lookup_type", lambda: _lookup_type(self))
+
+
+def _lookup_type(self):
     if not self.has_context:
         if len(self.glyphs) == 1:
             return 1
@@ -73,7 +73,12 @@ def buildPos(self, font, lookuptype, ff):
                 builder.add_pos(rule.address, glyph, ot_valuerecs[0])
     elif lookuptype == 2:
         builder = otl.PairPosBuilder(font, self.address)
+        import fontFeatures
+
         for rule in self.rules:
+            if isinstance(rule, fontFeatures.ClassKerning):
+                buildClassKerning(rule, builder, ff)
+                continue
             ot_valuerecs = [
                 x.toOTValueRecord(ff, pairPosContext=True) for x in rule.valuerecords
             ]
@@ -167,6 +172,20 @@ def buildPos(self, font, lookuptype, ff):
     return builders
 
 
+def buildClassKerning(rule, builder, ff):
+    """Adds each pair of classes of a ClassKerning rule to a PairPosBuilder,
+    which gathers them back into PairPos format 2 subtables."""
+    for i, j in rule.pairs():
+        vr1, vr2 = rule.valuerecords(i, j)
+        builder.addClassPair(
+            rule.address,
+            tuple(rule.classes1[i]),
+            vr1.toOTValueRecord(ff, pairPosContext=True),
+            tuple(rule.classes2[j]),
+            vr2.toOTValueRecord(ff, pairPosContext=True),
+        )
+
+
 def buildSub(self, font, lookuptype, ff):
     """Build a GSUB subtable."""
     builders = []
@@ -5,6 +5,10 @@ def lookup_type(self, forFea=False):
     """Mixin to determine the GSUB lookup type of a fontFeatures.Substitution object
 
     Returns: integer GSUB lookup type."""
+    return self._memo(("lookup_type", forFea), lambda: _lookup_type(self, forFea))
+
+
+def _lookup_type(self, forFea):
     if self.reverse:
         return 8
     if not self.replacement:
@@ -0,0 +1,168 @@
+"""
+UnparseCache: Keeping unparsed fonts on disk
+============================================
+"""
+from hashlib import sha1
+import os
+import pickle
+import tempfile
+
+from .GTableUnparser import _tableData
+
+# Increment this when a change to the unparsers alters what they return
+CACHE_FORMAT = 2
+
+
+def _libraryVersion():
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        return version("fontFeatures")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class UnparseCache:
+    """A directory of :py:class:`fontFeatures.FontFeatures` objects read from
+    binary fonts, used by :py:func:`fontFeatures.ttLib.unparse` when given a
+    ``cache`` argument.
+
+    Entries are keyed on a digest of the font's GSUB, GPOS and GDEF table
+    data, its glyph order and the arguments to ``unparse``, so a changed font
+    is read afresh. Tables which have been loaded are compiled to make the
+    digest, so that changes made to them in memory are seen. Each entry is a pickle; the font the rules refer to is not
+    stored, but supplied by the caller when the entry is loaded. Once the
+    entries take up more than ``max_size`` bytes, the least recently used are
+    removed.
+
+    Args:
+        directory: The directory to keep entries in, created if needed.
+            Defaults to ``fontFeatures`` in the user's cache directory
+            (``$XDG_CACHE_HOME``, or ``~/.cache``).
+        max_size: The number of bytes the entries may take up.
+    """
+
+    suffix = ".pickle"
+
+    def __init__(self, directory=None, max_size=256 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(
+                os.environ.get("XDG_CACHE_HOME")
+                or os.path.join(os.path.expanduser("~"), ".cache"),
+                "fontFeatures",
+            )
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, font, options):
+        """Returns the key of the entry for a font.
+
+        Args:
+            font: A ``TTFont`` object.
+            options: A dictionary of the other arguments to ``unparse``.
+        """
+        digest = sha1()
+        digest.update(repr((CACHE_FORMAT, _libraryVersion())).encode())
+        for name, value in sorted(options.items()):
+            if isinstance(value, dict):
+                value = sorted(value.items())
+            digest.update(repr((name, value)).encode())
+        for tag in ["GSUB", "GPOS", "GDEF"]:
+            if tag in font:
+                data = _tableData(font, tag)
+                digest.update(repr((tag, len(data))).encode())
+                digest.update(data)
+        digest.update("\0".join(font.getGlyphOrder()).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def load(self, key, font):
+        """Returns the ``FontFeatures`` object stored under a key, or ``None``.
+
+        Unreadable entries are removed.
+
+        Args:
+            key: A key returned by :py:meth:`key`.
+            font: The ``TTFont`` object the key was made from.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                unpickler = pickle.Unpickler(f)
+                unpickler.persistent_load = lambda pid: font
+                ff = unpickler.load()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # Mark the entry as recently used
+        except OSError:
+            pass
+        return ff
+
+    def store(self, key, ff, font):
+        """Stores a ``FontFeatures`` object under a key, then removes the least
+        recently used entries if the cache has grown too large.
+
+        Args:
+            key: A key returned by :py:meth:`key`.
+            ff: The ``FontFeatures`` object read from the font.
+            font: The ``TTFont`` object it was read from.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+                pickler.persistent_id = lambda obj: "font" if obj is font else None
+                pickler.dump(ff)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            self._remove(temporary)
+            raise
+        self.evict()
+
+    def entries(self):
+        """Returns ``(path, size, last used)`` for each entry, least recently
+        used first."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is no
+        larger than ``max_size``."""
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+            self._remove(path)
+            size -= entry_size
+
+    def clear(self):
+        """Removes every entry."""
+        for path, _, _ in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
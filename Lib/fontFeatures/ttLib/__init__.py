@@ -9,6 +9,8 @@ from collections import OrderedDict
 from .GDEFUnparser import GDEFUnparser
 from .GSUBUnparser import GSUBUnparser
 from .GPOSUnparser import GPOSUnparser
+from .GTableUnparser import _lazyTable
+from .UnparseCache import UnparseCache
 
 
 def unparseLanguageSystems(tables):
@@ -41,7 +43,16 @@ def unparseLanguageSystems(tables):
     return scripts
 
 
-def unparse(font, do_gdef=False, doLookups=True, config={}):
+def unparse(
+    font,
+    do_gdef=False,
+    doLookups=True,
+    config={},
+    compact=False,
+    lazy=False,
+    workers=None,
+    cache=None,
+):
     """Convert a binary OpenType font into a fontFeatures object
 
     Args:
@@ -50,23 +61,69 @@ def unparse(font, do_gdef=False, doLookups=True, config={}):
         doLookups: Whether the lookups should be read, or just the script/language
             information and top-level features.
         config: A dictionary of glyph class and routine names.
+        compact: Boolean. Whether the glyph slots of rules should be stored
+            compactly as each lookup is read. See
+            :py:meth:`fontFeatures.FontFeatures.compact`.
+        lazy: Boolean. Whether each lookup should only be read when the rules
+            of its routine are first needed. The routines are
+            :py:class:`fontFeatures.ttLib.LazyRoutine.LazyRoutine` objects,
+            named after their lookup type. Shaping then only reads the lookups
+            of the features and languages it uses; open the font with
+            ``TTFont(path, lazy=True)`` so that fontTools leaves the other
+            subtables undecompiled as well.
+        workers: The number of processes in which to read the lookups of
+            each table. The result is the same as reading them in this
+            process, which is the default. Workers read the tables from the
+            font file, so changes made to a loaded table are not seen.
+        cache: An :py:class:`fontFeatures.ttLib.UnparseCache.UnparseCache`,
+            the name of a directory for one, or ``True`` for one in the
+            default directory. The object read from a font is stored in the
+            cache, and returned again when the same font is read with the
+            same arguments. Cannot be combined with ``lazy``.
     """
-    gsub_gpos = [font[tableTag] for tableTag in ("GSUB", "GPOS") if tableTag in font]
-    from fontFeatures import FontFeatures
+    if lazy and workers:
+        raise ValueError("Lookups can be read lazily or in workers, not both")
+    if cache is not None and cache is not False:
+        if lazy:
+            raise ValueError("Lazily read lookups cannot be cached")
+        if not isinstance(cache, UnparseCache):
+            cache = UnparseCache(None if cache is True else cache)
+        key = cache.key(
+            font,
+            dict(do_gdef=do_gdef, doLookups=doLookups, config=config, compact=compact),
+        )
+        ff = cache.load(key, font)
+        if ff is None:
+            ff = unparse(font, do_gdef, doLookups, config, compact, workers=workers)
+            cache.store(key, ff, font)
+        return ff
+    tables = {}
+    for tableTag in ("GSUB", "GPOS"):
+        if tableTag not in font:
+            continue
+        if workers and workers > 1:
+            # Only the workers need the lookups decompiled
+            tables[tableTag] = _lazyTable(font, tableTag)
+        else:
+            tables[tableTag] = font[tableTag]
+    gsub_gpos = list(tables.values())
+    from fontFeatures import FontFeatures, GlyphTable
 
     ff = FontFeatures()
+    if compact:
+        ff.glyphTable = GlyphTable()
 
     languageSystems = unparseLanguageSystems(gsub_gpos)
 
-    if "GSUB" in font:
+    if "GSUB" in tables:
         GSUBUnparser(
-            font["GSUB"], ff, languageSystems, font=font, config=config
-        ).unparse(doLookups=doLookups)
+            tables["GSUB"], ff, languageSystems, font=font, config=config
+        ).unparse(doLookups=doLookups, lazy=lazy, workers=workers)
 
-    if "GPOS" in font:
+    if "GPOS" in tables:
         GPOSUnparser(
-            font["GPOS"], ff, languageSystems, font=font, config=config
-        ).unparse(doLookups=doLookups)
+            tables["GPOS"], ff, languageSystems, font=font, config=config
+        ).unparse(doLookups=doLookups, lazy=lazy, workers=workers)
 
     if "GDEF" in font and do_gdef:
         GDEFUnparser(font["GDEF"], ff).unparse()
@@ -0,0 +1,37 @@
+"""Routines for converting ClassKerning rules to and from XML."""
+
+from lxml import etree
+
+
+def _toXML(self, root):
+    self._makeglyphslots(root, "classes1", self.classes1)
+    self._makeglyphslots(root, "classes2", self.classes2)
+    wrapper = etree.SubElement(root, "matrix")
+    wrapper.set("fields1", " ".join(self.fields1))
+    wrapper.set("fields2", " ".join(self.fields2))
+    for row in self.matrix:
+        xmlrow = etree.SubElement(wrapper, "row")
+        for values in row:
+            cell = etree.SubElement(xmlrow, "cell")
+            cell.text = " ".join(str(int(v)) for v in values)
+    return root
+
+
+@classmethod
+def fromXML(klass, el):
+    """Creates a rule from a lxml Element object."""
+    matrix = el.find("matrix")
+    rows = [
+        [[int(v) for v in (cell.text or "").split()] for cell in row.findall("cell")]
+        for row in matrix.findall("row")
+    ]
+    return klass(
+        klass._slotArray(klass, el.find("classes1")) or [],
+        klass._slotArray(klass, el.find("classes2")) or [],
+        rows,
+        fields1=matrix.get("fields1", "").split(),
+        fields2=matrix.get("fields2", "").split(),
+        address=el.get("address"),
+        languages=el.get("languages"),
+        flags=int(el.get("flags", 0)),
+    )
@@ -8,14 +8,16 @@ def fromXML(klass, el):
     """Creates a Rule from a lxml Element object."""
     import fontFeatures
 
-    subklass = getattr(fontFeatures, el.tag.title())
+    # The tag is the class name with its first letter lowered
+    subklass = getattr(fontFeatures, el.tag[0].upper() + el.tag[1:])
     assert subklass
     return subklass.fromXML(el)
 
 
 def toXML(self):
     """Serializes a Rule to a lxml Element object."""
-    root = etree.Element(self.__class__.__name__.lower())
+    name = self.__class__.__name__
+    root = etree.Element(name[0].lower() + name[1:])
     put_address(self, root)
     put_languages(self, root)
     if hasattr(self, "reverse") and self.reverse:
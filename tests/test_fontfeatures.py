@@ -1,5 +1,17 @@
-from fontFeatures import FontFeatures, Routine
+from fontFeatures import (
+    FontFeatures,
+    Routine,
+    Substitution,
+    Positioning,
+    Chaining,
+    ValueRecord,
+    Rule,
+    Attachment,
+)
+from fontFeatures.optimizer import Optimizer
+from fontFeatures.optimizer.FontFeatures import DeduplicateRoutines
 from lxml import etree
+import pytest
 import re
 
 
@@ -87,3 +99,276 @@ def test_routine_named():
     f1 = FontFeatures()
     f1.addFeature("onex", [r1])
     assert f1.routineNamed("One") == r1
+
+
+def test_routine_index():
+    r1 = Routine(name="One")
+    r2 = Routine(name="Two")
+    r3 = Routine(name="Three")
+    f1 = FontFeatures()
+    f1.addFeature("onex", [r1, r2])
+    assert r2 in f1.routines and r3 not in f1.routines
+    assert f1.routineNamed("Two") == r2
+
+    # Direct modification of the routine list is tolerated
+    f1.routines.append(r3)
+    assert f1.routineNamed("Three") == r3
+    f1.routines[0:2] = [r2]
+    assert r1 not in f1.routines
+    with pytest.raises(ValueError):
+        f1.routineNamed("One")
+    f1.routines = [r1]
+    assert f1.routineNamed("One") == r1 and r3 not in f1.routines
+
+    r1.name = "Renamed"
+    assert f1.routineNamed("Renamed") == r1
+
+
+def test_class_registry():
+    f1 = FontFeatures()
+    assert f1.getNamedClassFor(["b", "a"], "AB") == "AB"
+    assert f1.getNamedClassFor(["a", "b"], "Other") == "AB"
+    assert f1.classNameFor(("b", "a")) == "AB"
+    assert f1.classNameFor(["a", "a", "b"]) is None
+    assert f1.classNameFor(["c"]) is None
+
+    # Assigned dictionaries and direct modification are tolerated
+    f1.namedClasses = {"C": ["c"]}
+    assert f1.classNameFor(["c"]) == "C"
+    f1.namedClasses["C"] = ["d"]
+    assert f1.classNameFor(["c"]) is None
+    assert f1.classNameFor(["d"]) == "C"
+    del f1.namedClasses["C"]
+    assert f1.getNamedClassFor(["d"], "D") == "D"
+    f1.namedClasses["D"].append("e")
+    assert f1.classNameFor(["d"]) is None
+    assert f1.getNamedClassFor(["e", "d"], "Other") == "D"
+    f1.namedClasses["D"][0] = "f"
+    assert f1.classNameFor(["f", "e"]) == "D"
+    assert len(f1.namedClasses) == 1
+
+    f2 = FontFeatures()
+    f2.namedClasses["E"] = ["e"]
+    combined = f1 + f2
+    assert combined.classNameFor(["e"]) == "E"
+
+
+def test_derived_values_cached():
+    s1 = Substitution([["a"]], [["b"]])
+    s2 = Substitution([["c"]], [["d"]], precontext=[["x"]])
+    r1 = Routine(rules=[s1])
+    assert r1.involved_glyphs == {"a", "b"}
+    assert r1.involved_glyphs is r1.involved_glyphs
+    assert s1.lookup_type() == 1
+
+    r1.addRule(s2)
+    assert r1.involved_glyphs == {"a", "b", "c", "d", "x"}
+    assert s2.lookup_type() == 6
+    s2.precontext = []
+    assert r1.involved_glyphs == {"a", "b", "c", "d"}
+    assert s2.lookup_type() == 1
+
+    # Contents modified in place must be reported
+    s1.input[0].append("e")
+    s1.changed()
+    assert "e" in r1.involved_glyphs
+
+    # The stage of a chain follows the routines it calls
+    chain = Chaining([["a"]], lookups=[[r1]])
+    r2 = Routine(rules=[chain])
+    assert r2.stage == "sub" and chain.lookup_type() == 6
+    r1.rules = [Positioning([["a"]], [ValueRecord(xAdvance=10)])]
+    assert r2.stage == "pos" and chain.lookup_type() == 8
+
+    # Changes elsewhere keep what has been worked out
+    glyphs = r2.involved_glyphs
+    s3 = Substitution([["f"]], [["g"]])
+    Routine(rules=[s3]).languages = [("latn", "dflt")]
+    s3.input = [["h"]]
+    assert r2.involved_glyphs is glyphs
+
+
+def test_compact():
+    s1 = Substitution([["a", "b"]], [["c", "d"]])
+    s2 = Substitution([["a", "b"]], [["e", "f"]], precontext=[["x"]])
+    f1 = FontFeatures()
+    f1.addFeature("onex", [Routine(rules=[s1, s2])])
+    fea = f1.asFea()
+    f1.compact()
+    assert s1.input is s2.input
+    assert s1.precontext == () and s2.precontext == (("x",),)
+    assert f1.asFea() == fea
+
+    # Compacted slots are replaced, not modified
+    s2.input = [["a"]]
+    assert s1.input == (("a", "b"),)
+    assert s2.involved_glyphs == {"a", "e", "f", "x"}
+
+
+def test_deduplicate_routines():
+    def single():
+        return Routine(rules=[Substitution([["a"]], [["b"]])])
+
+    called1, called2, blocked = single(), single(), single()
+    assert called1.fingerprint == called2.fingerprint
+    assert Routine(rules=[Substitution([["a"]], [["c"]])]).fingerprint != (
+        called1.fingerprint
+    )
+    assert Routine(rules=called1.rules, flags=8).fingerprint != called1.fingerprint
+    kern1 = Routine(rules=[Positioning([["a"]], [ValueRecord(xAdvance=10)])])
+    kern2 = Routine(rules=[Positioning([["a"]], [ValueRecord(xAdvance=10)])])
+    kern1.languages, kern2.languages = [("latn", "dflt")], [("cyrl", "dflt")]
+    assert kern1.fingerprint == kern2.fingerprint
+    chain1 = Chaining([["a"]], lookups=[[called1]])
+    chain2 = Chaining([["a"]], postcontext=[["x"]], lookups=[[called2]])
+    assert chain1.fingerprint == Chaining([["a"]], lookups=[[called2]]).fingerprint
+
+    f1 = FontFeatures()
+    f1.addFeature("calt", [Routine(rules=[chain1]), Routine(rules=[chain2])])
+    f1.routines.extend([called1, called2])
+    f1.addFeature("ss02", [Routine(rules=[Substitution([["a"]], [["c"]])])])
+    f1.addFeature("ss01", [blocked])
+    f1.addFeature("kern", [kern1, kern2])
+    merged = f1.deduplicateRoutines()
+    # The two kerning routines apply to different scripts. Merging blocked
+    # would apply it before the ss02 routine, which involves the same glyphs
+    assert merged == {called2: called1, kern2: kern1}
+    assert called2 not in f1.routines and kern2 not in f1.routines
+    assert chain2.lookups[0][0].routine is called1
+    assert [r.routine for r in f1.features["kern"]] == [kern1]
+    assert kern1.languages == [("latn", "dflt"), ("cyrl", "dflt")]
+    assert f1.features["ss01"][0].routine is blocked
+    assert f1.deduplicateRoutines() == {}
+
+    # Rule types without a structure of their own are compared attribute
+    # by attribute
+    class Swash(Rule):
+        def __init__(self, glyphs, languages=None):
+            self.glyphs = glyphs
+            self.bases = {"@caps": "top"}
+            self.languages = languages
+
+    assert Swash([["a"]]).fingerprint == Swash([("a",)]).fingerprint
+    assert Swash([["a"]]).fingerprint != Swash([["b"]]).fingerprint
+    assert Swash([["a"]]).fingerprint != Swash([["a"]], ["latn/dflt"]).fingerprint
+
+
+def test_deduplicate_optimization():
+    def build():
+        f = FontFeatures()
+        for script in ["latn", "cyrl"]:
+            rule = Substitution([["a"]], [["b"]])
+            f.addFeature("ss01", [Routine(rules=[rule], languages=[(script, "dflt")])])
+        return f
+
+    # Only run when asked for a higher optimization level
+    f = build()
+    Optimizer(f).optimize(level=1)
+    assert len(f.routines) == 2
+    f = build()
+    DeduplicateRoutines().apply(f)
+    assert len(f.routines) == 1
+
+
+def test_merge():
+    base = FontFeatures()
+    base.namedClasses["Caps"] = ["A", "B"]
+    base.namedClasses["Dup"] = ["x", "y"]
+    base.anchors["a"] = {"top": (300, 200)}
+    base.addFeature("liga", [Routine(name="One")])
+    base.gensym("class")
+
+    fragments = []
+    for i in range(3):
+        f = FontFeatures()
+        f.namedClasses["Caps"] = ["C", str(i)]
+        f.namedClasses["Same"] = ["x", "y"]
+        rule = Substitution([["@Caps"], ["@Same"]], [["z"]])
+        f.addFeature("liga", [Routine(rules=[rule])])
+        f.anchors["a"] = {"bottom": (300, -20)}
+        f.glyphclasses["z"] = "base"
+        f.gensym("class")
+        f.gensym("class")
+        fragments.append(f)
+
+    assert base.merge(*fragments) is base
+    assert len(base.features["liga"]) == 4
+    assert base.namedClasses["Caps"] == ["A", "B"]
+    assert base.namedClasses["Caps_3"] == ["C", "2"]
+    assert "Same" not in base.namedClasses
+    rule = base.features["liga"][3].routine.rules[0]
+    assert rule.input == [["@Caps_3"], ["@Dup"]]
+    # The merged objects are unchanged
+    assert fragments[2].routines[0].rules[0].input == [["@Caps"], ["@Same"]]
+    assert base.anchors["a"] == {"top": (300, 200), "bottom": (300, -20)}
+    assert base.glyphclasses["z"] == "base"
+    assert base.gensym("class") == "class3"
+
+    clash = FontFeatures()
+    clash.namedClasses["Caps"] = ["Q"]
+    clash.anchors["a"] = {"top": (0, 0)}
+    with pytest.raises(ValueError):
+        base.merge(clash, collision="error")
+    assert base.namedClasses["Caps"] == ["A", "B"]
+    base.merge(clash, collision="keep")
+    assert base.namedClasses["Caps"] == ["A", "B"]
+    assert base.anchors["a"]["top"] == (300, 200)
+    base.merge(clash, collision="replace")
+    assert base.namedClasses["Caps"] == ["Q"]
+    assert base.anchors["a"]["top"] == (0, 0)
+
+    marks = FontFeatures()
+    marks.namedClasses["Caps"] = ["R"]
+    attach = Attachment("top", "_top", {"@Caps": (0, 0)}, {"acute": (0, 0)})
+    marks.addFeature("mark", [Routine(rules=[attach])])
+    base.merge(marks)
+    merged = base.features["mark"][0].routine.rules[0]
+    assert merged.bases == {"@Caps_4": (0, 0)}
+    assert attach.bases == {"@Caps": (0, 0)}
+
+
+def test_freeze():
+    import pickle
+
+    f1 = FontFeatures()
+    sub = Routine(name="sub", rules=[Substitution([["a"]], [["b"]])])
+    f1.addFeature("calt", [Routine(rules=[Chaining([["a"]], lookups=[[sub]])])])
+    f1.namedClasses["AB"] = ["a", "b"]
+    fea = f1.asFea()
+    # Exporting leaves the object unchanged
+    assert list(f1.routines) == [f1.features["calt"][0].routine]
+    assert not f1.routines[0].name and f1.asFea() == fea
+    frozen = f1.freeze()
+    f1.routines[0].rules = []
+    assert frozen.routineNamed("sub").rules[0].input == (("a",),)
+    assert frozen.routineNamed("sub").usedin
+    assert frozen.namedClasses["AB"] == ("a", "b")
+
+    with pytest.raises(AttributeError):
+        frozen.routines = []
+    with pytest.raises(TypeError):
+        frozen.addFeature("liga", [Routine()])
+    with pytest.raises(TypeError):
+        frozen.namedClasses["CD"] = ["c", "d"]
+    with pytest.raises(AttributeError):
+        frozen.routineNamed("sub").rules.append(Substitution([["c"]], [["d"]]))
+    with pytest.raises(AttributeError):
+        frozen.routineNamed("sub").name = "x"
+    rule = frozen.routineNamed("sub").rules[0]
+    with pytest.raises(AttributeError):
+        rule.input = [["c"]]
+    with pytest.raises(AttributeError):
+        rule.input[0].append("z")
+    with pytest.raises(AttributeError):
+        frozen.features["calt"][0].routine.rules[0].lookups[0].append(sub)
+
+    assert frozen.asFea() == fea
+    assert frozen.asFea() == fea
+    assert len(frozen.routines) == 2 and not frozen.features["calt"][0].routine.name
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+    assert len({frozen, pickle.loads(pickle.dumps(frozen))}) == 1
+
+    thawed = frozen.thaw()
+    thawed.addFeature("liga", [Routine(rules=[Substitution([["c"]], [["d"]])])])
+    assert "liga" not in frozen.features
+    assert thawed.freeze() != frozen
@@ -133,3 +133,22 @@ feature locl {
     r1 = Routine(rules=[s1], languages=[("arab", "URD "), ("arab", "FAR ")])
     f.addFeature("locl", [r1])
     assert f.asFea(do_gdef=False) == expected
+
+
+def test_language_index():
+    f = FontFeatures()
+    s1 = Substitution([["a"]], ["b"], languages=[("arab", "URD ")])
+    r1 = Routine(rules=[s1])
+    r2 = Routine(rules=[Substitution([["a"]], ["c"])], languages=[("latn", "dflt")])
+    f.addFeature("locl", [r1, r2])
+    assert f.scripts_and_languages == {"arab": ["URD "], "latn": ["dflt"]}
+    assert f.scripts_and_languages is f.scripts_and_languages
+    assert f.routinesByLanguage == {("latn", "dflt"): frozenset([r2])}
+
+    s1.languages = [("arab", "FAR ")]
+    assert f.scripts_and_languages["arab"] == ["FAR "]
+    r1.languages = [("arab", "SND ")]
+    assert f.scripts_and_languages["arab"] == ["SND "]
+    assert f.routinesByLanguage[("arab", "SND ")] == frozenset([r1])
+    f.routines.remove(r2)
+    assert f.hasScriptSupport("arab") and not f.hasScriptSupport("latn")
@@ -1,4 +1,5 @@
-from fontFeatures import Positioning, ValueRecord
+from fontFeatures import Positioning, ClassKerning, ValueRecord, FontFeatures, Routine
+from fontFeatures.optimizer.Routine import MoveLongCoverageToClassDefinition
 from lxml import etree
 
 import unittest
@@ -31,3 +32,37 @@ class TestPositioning(unittest.TestCase):
         v = ValueRecord(xAdvance=120)
         s = Positioning(["a", "b"], [v, ValueRecord()])
         self.assertEqual(s.asFea(), "pos a b 120;")
+
+    def test_class_kerning(self):
+        s = ClassKerning(
+            [["A", "Aacute"], ["V", "W"]],
+            [["V", "W"], ["o", "e"]],
+            [[[-80], [0]], [[0], [-60]]],
+        )
+        self.assertEqual(list(s.pairs()), [(0, 0), (1, 1)])
+        self.assertEqual(s.valuerecords(1, 1)[0].xAdvance, -60)
+        self.assertEqual(
+            s.asFea(), "    pos [A Aacute] [V W] -80;\n    pos [V W] [e o] -60;\n"
+        )
+        self.assertEqual(s.lookup_type(), 2)
+        self.assertEqual(s.involved_glyphs, {"A", "Aacute", "V", "W", "o", "e"})
+        self.assertEqual(
+            etree.tostring(s.toXML()),
+            b'<classKerning><classes1><slot><glyph>A</glyph><glyph>Aacute</glyph></slot><slot><glyph>V</glyph><glyph>W</glyph></slot></classes1><classes2><slot><glyph>V</glyph><glyph>W</glyph></slot><slot><glyph>o</glyph><glyph>e</glyph></slot></classes2><matrix fields1="xAdvance" fields2=""><row><cell>-80</cell><cell>0</cell></row><row><cell>0</cell><cell>-60</cell></row></matrix></classKerning>',
+        )
+        self.roundTrip(s)
+        rt = ClassKerning.fromXML(s.toXML())
+        self.assertEqual(rt.fingerprint, s.fingerprint)
+
+    def test_class_kerning_long_classes(self):
+        s = ClassKerning(
+            [["A", "Aacute", "Agrave", "Acircumflex", "Atilde", "Adieresis"]],
+            [["V"]],
+            [[[-80]]],
+        )
+        ff = FontFeatures()
+        MoveLongCoverageToClassDefinition().apply(Routine(rules=[s]), ff)
+        self.assertEqual(s.classes1, [["@class1"]])
+        self.assertEqual(s.classes2, [["V"]])
+        self.assertEqual(len(ff.namedClasses["class1"]), 6)
+        self.assertEqual(s.asFea(), "    pos @class1 V -80;\n")
@@ -55,3 +55,66 @@ def test_routine_partition_not_needed():
     r.rules = []
     f.partitionRoutine(r, lambda rule: tuple(rule.languages or []))
     assert len(f.routines) == 1
+
+
+def test_routine_partition_keeps_usage():
+    f = FontFeatures()
+
+    s1 = Substitution([["A"]], [["A.grk"]], languages=["grek/*"])
+    s2 = Substitution([["A"]], [["A.esp"]], languages=["latn/ESP "])
+    r = Routine(rules=[s1, s2])
+    f.routines.append(r)
+    c = Chaining([["A"]], lookups=[[RoutineReference(routine=r)]])
+    f.routines.append(Routine(rules=[c]))
+
+    f.markRoutineUseInChains()
+    scans = []
+    allRules = f.allRules
+    f.allRules = lambda *args: scans.append(args) or allRules(*args)
+
+    # Partitioning updates the marking rather than rescanning
+    split = f.partitionRoutine(r, lambda rule: tuple(rule.languages or []))
+    assert [x.usedin for x in split] == [{c}, {c}]
+    assert split[0].usedin is not split[1].usedin
+    f.markRoutineUseInChains()
+    assert not scans
+
+    # Other edits are noticed
+    c.lookups = [[RoutineReference(routine=split[0])]]
+    f.markRoutineUseInChains()
+    assert len(scans) == 1
+    assert split[0].usedin == {c} and split[1].usedin == set()
+
+
+def test_partition_all():
+    f = FontFeatures()
+
+    s1 = Substitution([["A"]], [["A.grk"]], languages=["grek/*"])
+    s2 = Substitution([["A"]], [["A.esp"]], languages=["latn/ESP "])
+    r = Routine(rules=[s1, s2])
+    s3 = Substitution([["B"]], [["B.grk"]], languages=["grek/*"])
+    s4 = Substitution([["B"]], [["B.esp"]], languages=["latn/ESP "])
+    r3 = Routine(rules=[s3, s4])
+    f.routines.append(r)
+    c = Chaining(
+        [["A"], ["B"]],
+        lookups=[[RoutineReference(routine=r)], [RoutineReference(routine=r3)]],
+    )
+    r2 = Routine(rules=[c])
+    f.routines.append(r2)
+    f.routines.append(r3)
+    f.addFeature("locl", [r, r3])
+
+    partitioned = f.partitionAll(lambda rule: tuple(rule.languages or []))
+    assert list(partitioned.keys()) == [r, r2, r3]
+    assert partitioned[r2] == [r2]
+    assert partitioned[r][0] is r and partitioned[r3][0] is r3
+    assert f.routines == partitioned[r] + [r2] + partitioned[r3]
+    assert [x.rules for x in partitioned[r]] == [[s1], [s2]]
+
+    assert [x.routine for x in c.lookups[0]] == partitioned[r]
+    assert [x.routine for x in c.lookups[1]] == partitioned[r3]
+    assert [x.routine for x in f.features["locl"]] == f.routines[0:2] + f.routines[3:]
+
+    # Usage in chains is marked before it is copied to the new routines
+    assert all(x.usedin == {c} for x in partitioned[r] + partitioned[r3])
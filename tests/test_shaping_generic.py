@@ -1,8 +1,14 @@
-from fontFeatures import FontFeatures, Substitution, Routine
-from fontFeatures.shaperLib.Buffer import Buffer
+from fontFeatures import FontFeatures, Substitution, Routine, ClassKerning
+from fontFeatures.shaperLib.Buffer import Buffer, BufferItem
+from fontFeatures.shaperLib.CompactBuffer import CompactBuffer
 from fontFeatures.shaperLib.Shaper import Shaper
+from fontFeatures.shaperLib.ShapingCache import ShapingCache
 from babelfont import load
 import pytest
+from copy import copy
+from concurrent.futures import ThreadPoolExecutor
+from fontTools.ttLib import TTFont
+from fontFeatures.ttLib import unparse
 
 
 @pytest.mark.skip("Font too broken to use")
@@ -31,3 +37,271 @@ def test_namedclass_in_slot():
     r.addRule(Substitution([["G", "@AB"]], [["X"]]))
     r.apply_to_buffer(buf, namedclasses={"AB": ["A", "B"]})
     assert buf.serialize(position=False) == "X|X|C"
+
+
+def test_coverage_index():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    r = Routine()
+    r.addRule(Substitution([["A"]], [["X"]]))
+    r.addRule(Substitution([["B"], ["C"]], [["Y"]]))
+    r.addRule(Substitution([["@AB"]], [["Z"]]))
+    namedclasses = {"AB": ["A", "B"]}
+    index = r.coverage_index(namedclasses)
+    assert index.rules_for("A") == [r.rules[0], r.rules[2]]
+    assert index.rules_for("B") == [r.rules[1], r.rules[2]]
+    assert index.rules_for("C") == []
+    assert r.coverage_index(namedclasses) is index
+
+    r.addRule(Substitution([["C"]], [["W"]]))
+    assert r.coverage_index(namedclasses).rules_for("C") == [r.rules[3]]
+
+    buf = Buffer(font, glyphs=["A", "B", "C", "B", "D"])
+    r.apply_to_buffer(buf, namedclasses=namedclasses)
+    assert buf.serialize(position=False) == "X|Y|Z|D"
+
+
+def test_class_kerning():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    kerning = ClassKerning(
+        [["A", "B"], ["C"]],
+        [["B", "C"], ["@AB"]],
+        [[[-50, 0], [0, 0]], [[0, 0], [-20, 10]]],
+        fields1=["xAdvance", "xPlacement"],
+    )
+    r = Routine(rules=[kerning])
+    namedclasses = {"AB": ["A", "B"]}
+    assert r.coverage_index(namedclasses).rules_for("C") == [kerning]
+    buf = Buffer(font, glyphs=["A", "B", "C", "A", "A"])
+    r.apply_to_buffer(buf, namedclasses=namedclasses)
+    expanded = Routine(rules=kerning.positionings())
+    other = Buffer(font, glyphs=["A", "B", "C", "A", "A"])
+    expanded.apply_to_buffer(other, namedclasses=namedclasses)
+    assert buf.serialize() == other.serialize()
+    assert buf.items[0].position.xAdvance == other.items[0].position.xAdvance
+    assert buf.items[2].position.xPlacement == 10
+
+
+def test_compiled_slots():
+    namedclasses = {"AB": ["A", "B"]}
+    rule = Substitution([["@AB", "C"]], [["X", "Y", "Z"]], precontext=[["D"]])
+    compiled = rule.compiled_slots(namedclasses)
+    assert compiled.input == (frozenset(["A", "B", "C"]),)
+    assert compiled.precontext == (frozenset(["D"]),)
+    assert compiled.single_mapping == {"A": "X", "B": "Y", "C": "Z"}
+    assert rule.compiled_slots(namedclasses) is compiled
+
+    rule.input = [["E"]]
+    rule.replacement = [["F"]]
+    assert rule.compiled_slots(namedclasses).input == (frozenset(["E"]),)
+    assert rule.compiled_slots(namedclasses).single_mapping == {"E": "F"}
+
+
+def test_incremental_update():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    buf = Buffer(font, glyphs=["A", "B", "C", "D", "E", "F", "G"])
+    for ix in [1, 4]:
+        buf.items[ix].feature_masks["test"] = True
+    buf.set_feature_mask("test")
+    assert list(buf.mask) == [0, 2, 3, 5, 6]
+
+    # Ligate C D
+    buf[1:3] = [buf.items[2]]
+    buf.update()
+    assert list(buf.mask) == [0, 2, 4, 5]
+    # Multiply F into F and a masked B
+    buf[2:3] = [buf.items[4], buf.items[1]]
+    buf.update()
+    expected = list(buf.mask)
+    buf.recompute_mask()
+    assert list(buf.mask) == expected == [0, 2, 4, 6]
+
+
+def test_mask_cache():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    buf = Buffer(font, unicodes="a\u0301b\u0300")
+    buf.map_to_glyphs()
+    buf.set_mask(0x8)
+    assert list(buf.mask) == [0, 2]
+    mask = buf.mask
+    filtering = ["gravecomb"]
+    buf.set_mask(0x10, filtering)
+    assert list(buf.mask) == [0, 2, 3]
+    buf.set_mask(0x8)
+    assert buf.mask is mask
+
+    # Changing the contents forgets the cached masks
+    buf.set_mask(0)
+    buf[1:2] = [copy(buf.items[0])]
+    buf.update()
+    buf.set_mask(0x8)
+    assert list(buf.mask) == [0, 1, 2]
+    buf.set_mask(0x10, filtering)
+    assert list(buf.mask) == [0, 1, 2, 3]
+
+
+def test_compact_buffer():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    buf = CompactBuffer(font, unicodes="fia\u0301b")
+    buf.map_to_glyphs()
+    assert buf.items[3].category == ("mark", None)
+    assert buf.items[0].glyph_id == list(font.glyphs.keys()).index("f")
+    buf.items[3].feature_masks["test"] = True
+    assert buf.items[3].feature_masks == {"test": True}
+    assert buf.items[4].feature_masks.get("test") is None
+
+    r = Routine(flags=0x8)
+    r.addRule(Substitution([["f"], ["i"]], [["f_i"]]))
+    r.addRule(Substitution([["a"]], [["b"]]))
+    r.addRule(Substitution([["b"]], [["c"], ["d"]]))
+    r.apply_to_buffer(buf)
+    assert buf.serialize(position=False) == "f_i|b|acutecomb|c|d"
+    assert [i.cluster for i in buf.items] == [0, 2, 3, 4, 4]
+    assert buf.items[0].ligated and buf.items[3].multiplied
+    plain = Buffer(font, unicodes="fia\u0301b")
+    plain.map_to_glyphs()
+    r.apply_to_buffer(plain)
+    assert [i.glyph for i in plain.items] == [i.glyph for i in buf.items]
+
+    # Items have no __dict__, and the rows of deleted items are reused
+    assert not hasattr(buf.items[0], "__dict__")
+    with pytest.raises(AttributeError):
+        buf.items[0].unknown_attribute = 1
+    rows = len(buf.store.glyph)
+    buf.items = buf.items[:1]
+    buf.glyph_digest()
+    assert len(buf.store) == 1
+    buf.store_unicode("fia")
+    assert len(buf.store.glyph) == rows
+
+    # Rules match plain items mixed into a compact buffer
+    buf = CompactBuffer(font, glyphs=["f", "i"])
+    buf.items[1:] = [BufferItem.new_glyph("i", font)]
+    r.apply_to_buffer(buf)
+    assert buf.serialize(position=False) == "f_i"
+
+
+def test_plan_cache():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    ff = FontFeatures()
+    r = Routine(name="ligatures")
+    r.addRule(Substitution([["f"], ["i"]], [["f_i"]]))
+    ff.addFeature("liga", [r])
+    shaper = Shaper(ff, font, max_plans=2)
+
+    buf = Buffer(font, unicodes="fig")
+    plan = shaper.plan(buf)
+    assert plan.complexshaper.__name__ == "BaseShaper"
+    assert [x for x in plan.lookups if x] == [[(r, "liga")]]
+    shaper.execute(buf)
+    assert buf.serialize(position=False) == "f_i|g"
+    assert shaper.plan(Buffer(font, unicodes="fi")) is plan
+
+    buf = Buffer(font, unicodes="fig")
+    shaper.execute(buf, features="-liga")
+    assert buf.serialize(position=False) == "f|i|g"
+    assert shaper.plan(buf, "-liga") is not plan
+
+    shaper.plan(Buffer(font, unicodes="fi", language="TRK"))
+    assert shaper.plan(Buffer(font, unicodes="fi")) is not plan
+
+
+def test_concurrent_shaping():
+    path = "tests/data/LibertinusSans-Regular.otf"
+    font = load(path)
+    shaper = Shaper(unparse(TTFont(path)), font, max_plans=2)
+    jobs = [
+        (text, features)
+        for text in ["office", "affluent", "Ta\u0301V", "\u03b1\u0301\u03c6", "fjord"]
+        for features in ["", "-liga", "+smcp", "-kern"]
+    ] * 5
+
+    def shape(job):
+        text, features = job
+        buf = Buffer(font, unicodes=text)
+        shaper.execute(buf, features=features)
+        return buf.serialize()
+
+    expected = [shape(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(shape, jobs)) == expected
+
+
+def test_execute_many():
+    path = "tests/data/LibertinusSans-Regular.otf"
+    font = load(path)
+    shaper = Shaper(unparse(TTFont(path)), font)
+    texts = ["office", "fjord", "", "AVA"] * 5
+    expected = [b.serialize() for b in shaper.execute_many(texts, features="-kern")]
+    assert expected[0] == "o=0+500|f_f.short=1+607|i=2+260|c=3+429|e=4+453"
+    results = shaper.execute_many(texts, features="-kern", workers=2, chunksize=3)
+    assert [b.serialize() for b in results] == expected
+
+
+def test_shaping_cache():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    ff = FontFeatures()
+    r = Routine(name="ligatures")
+    r.addRule(Substitution([["f"], ["i"]], [["f_i"]]))
+    ff.addFeature("liga", [r])
+    cache = ShapingCache(maxsize=2)
+    shaper = Shaper(ff, font, cache=cache)
+
+    def shape(text, features=""):
+        buf = Buffer(font, unicodes=text)
+        return shaper.execute(buf, features=features).serialize()
+
+    first = shape("fig")
+    assert first == "f_i=0+0|g=1+499"
+    assert shape("fig") == first
+    assert shape("fig", "-liga") != first
+    assert cache.info() == (1, 2, 2, 2)
+
+    r.addRule(Substitution([["g"]], [["h"]]))
+    shaper.clear_plans()
+    assert len(cache) == 0
+    assert shape("fig").startswith("f_i=0+0|h=1")
+
+
+@pytest.mark.parametrize("bufferclass", [Buffer, CompactBuffer])
+def test_shaping_cache_restores_fields(bufferclass):
+    path = "tests/data/LibertinusSans-Regular.otf"
+    font = load(path)
+    ff = unparse(TTFont(path))
+    cached = Shaper(ff, font, cache=ShapingCache())
+    text = "q\u0301 office"
+    cached.execute(bufferclass(font, unicodes=text))
+    restored = cached.execute(bufferclass(font, unicodes=text))
+    fresh = Shaper(ff, font).execute(bufferclass(font, unicodes=text))
+
+    assert len(restored.items) == len(fresh.items)
+    assert restored.items[1].attach_type == "mark"
+    for r, f in zip(restored.items, fresh.items):
+        assert r.codepoint == f.codepoint
+        assert r.shaped_fields() == f.shaped_fields()
+        assert r.position.xPlacement == f.position.xPlacement
+        assert r.position.yPlacement == f.position.yPlacement
+        assert r.position.xAdvance == f.position.xAdvance
+        assert r.position.yAdvance == f.position.yAdvance
+
+    # Restored items do not share mutable state with the cache
+    restored.items[0].feature_masks["liga"] = True
+    again = cached.execute(bufferclass(font, unicodes=text))
+    assert "liga" not in again.items[0].feature_masks
+
+
+def test_routine_digest():
+    font = load("tests/data/LibertinusSans-Regular.otf")
+    buf = Buffer(font, glyphs=["A", "B", "C"])
+    absent = Routine()
+    absent.addRule(Substitution([["X"]], [["Y"]]))
+    present = Routine()
+    present.addRule(Substitution([["B"]], [["X"]]))
+    assert absent.glyph_digest() == {"X"}
+
+    absent.apply_to_buffer(buf)
+    present.apply_to_buffer(buf)
+    assert buf.routines_skipped == 1 and buf.routines_applied == 1
+    # The buffer digest follows substitutions
+    absent.apply_to_buffer(buf)
+    assert buf.serialize(position=False) == "A|Y|C"
+    assert buf.routines_skipped == 1 and buf.routines_applied == 2
@@ -1,4 +1,4 @@
-from fontFeatures import Substitution, FontFeatures
+from fontFeatures import Substitution, FontFeatures, ClassKerning
 from fontTools.ttLib import TTFont
 from fontFeatures.ttLib.GPOSUnparser import GPOSUnparser
 from fontFeatures.ttLib import unparseLanguageSystems
@@ -37,16 +37,60 @@ class TestUnparse(unittest.TestCase):
         self.assertEqual(g.rules[0].asFea(), "pos uni0660.prop uni0667.prop 24;")
         self.assertEqual(g.rules[1].asFea(), "pos uni0660.prop uni0668.prop 24;")
 
+    def test_inverted_classdef(self):
+        subtable = self.lookups[76].SubTable[0]
+        classDefs = subtable.ClassDef2.classDefs
+        classes = self.unparser._invertClassDef(classDefs, self.font)
+        self.assertIs(self.unparser._invertClassDef(classDefs, self.font), classes)
+        self.assertNotIn(0, dict.keys(classes))  # Not gathered yet
+        self.assertIn(0, classes)
+        glyphs = set(self.font.getGlyphOrder())
+        self.assertEqual(classes[0], glyphs - set(classDefs.keys()))
+        self.assertEqual(classes.get(0), classes[0])
+        self.assertIsNone(classes.get(max(classDefs.values()) + 1))
+        self.assertEqual(
+            set(classes.get(1)), {g for g, c in classDefs.items() if c == 1}
+        )
+
     def test_pair_f2(self):
         g, _ = self.unparser.unparseLookup(self.lookups[76], 76)  # kerns
+        self.assertIsInstance(g.rules[0], ClassKerning)
+        positionings = g.rules[0].positionings()
         self.assertEqual(
-            g.rules[0].asFea(),
+            positionings[0].asFea(),
             "pos [zero zero.prop] [A Aacute Abreve Acircumflex Adieresis Agrave Amacron Aogonek Aring Atilde] -10;",
         )
         self.assertEqual(
-            g.rules[1].asFea(),
+            positionings[1].asFea(),
             "pos [zero zero.prop] [Y Yacute Ycircumflex Ydieresis Ygrave] -21;",
         )
+        self.assertIn(positionings[1].asFea(), g.asFea())
+
+    def test_pair_f2_roundtrip(self):
+        g, _ = self.unparser.unparseLookup(self.lookups[76], 76)
+        subtable = self.lookups[76].SubTable[0]
+        kerning = g.rules[0]
+        self.assertEqual(len(kerning.matrix), subtable.Class1Count)
+        self.assertEqual(len(kerning.matrix[0]), subtable.Class2Count)
+        ff = FontFeatures()
+        ff.addFeature("kern", [g])
+        font = TTFont("fonts/Amiri-Regular.ttf")
+        ff.buildBinaryFeatures(font)
+        lookup = font["GPOS"].table.LookupList.Lookup[0]
+        self.assertEqual({s.Format for s in lookup.SubTable}, {2})
+        unparser = GPOSUnparser(font["GPOS"], None, [])
+        unparser.font = font
+        rt, _ = unparser.unparseLookup(lookup, 0)
+
+        def cells(rules):
+            # The builder numbers the classes afresh
+            return {
+                (frozenset(p.glyphs[0]), frozenset(p.glyphs[1]), p.asFea())
+                for rule in rules
+                for p in rule.positionings()
+            }
+
+        self.assertEqual(cells(rt.rules), cells(g.rules))
 
     # def test_pair(self):
     #   g,_ = self.unparser.unparseLookup(self.lookups[56])
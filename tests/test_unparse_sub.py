@@ -1,4 +1,4 @@
-from fontFeatures import Substitution, FontFeatures
+from fontFeatures import Substitution, FontFeatures, Chaining, Attachment
 from fontTools.ttLib import TTFont
 from fontFeatures.ttLib.GSUBUnparser import GSUBUnparser
 from fontFeatures.ttLib import unparseLanguageSystems
@@ -44,3 +44,167 @@ class TestUnparse(unittest.TestCase):
     #         g.rules[0].asFea(),
     #         "sub uni0644' lookup SingleSubstitution32 uni0621' lookup SingleSubstitution31 uni0627' lookup SingleSubstitution32;",
     #     )
+
+
+def test_lazy():
+    from fontFeatures.ttLib import unparse
+
+    font = TTFont("fonts/Amiri-Regular.ttf", lazy=True)
+    ff = unparse(font, lazy=True)
+    eager = unparse(TTFont("fonts/Amiri-Regular.ttf"))
+    assert len(ff.routines) == len(eager.routines)
+    assert all(r.pending for r in ff.routines)
+    # Languages and flags are known before any rules are read
+    assert [r.languages for r in ff.routines] == [r.languages for r in eager.routines]
+    assert [r.flags for r in ff.routines] == [r.flags for r in eager.routines]
+    assert ff.scripts_and_languages == eager.scripts_and_languages
+    assert all(r.pending for r in ff.routines)
+
+    # Reading a chain leaves the routines it calls pending
+    chain = ff.routines[17]
+    assert chain.rules[0].asFea().startswith("sub [uni0640 uni0640.1")
+    called = next(l for l in chain.rules[0].lookups if l)[0].routine
+    assert not chain.pending
+    assert called.pending and called in ff.routines
+    assert called.stage == "sub"
+    assert [r.asFea() for r in called.rules] == [
+        r.asFea() for r in eager.routines[ff.routines.index(called)].rules
+    ]
+    assert not called.pending
+
+
+def test_lazy_threads():
+    import threading
+    from fontFeatures.ttLib import unparse
+
+    ff = unparse(TTFont("fonts/Amiri-Regular.ttf", lazy=True), lazy=True)
+    routine = ff.routines[0]
+    unparser = routine._source[0]
+    unparseLookup = unparser.unparseLookup
+
+    # A lookup which fails to read is tried again
+    def failing(*args):
+        raise ValueError("Bad lookup")
+
+    unparser.unparseLookup = failing
+    try:
+        routine.rules
+    except ValueError:
+        pass
+    assert routine.pending
+
+    # Other threads wait for the rules, rather than seeing none
+    started, release = threading.Event(), threading.Event()
+
+    def slow(*args):
+        started.set()
+        release.wait()
+        return unparseLookup(*args)
+
+    unparser.unparseLookup = slow
+    loader = threading.Thread(target=lambda: routine.rules)
+    loader.start()
+    started.wait()
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(len(routine.rules)))
+    reader.start()
+    release.set()
+    loader.join()
+    reader.join()
+    assert seen == [len(routine.rules)] and seen[0] > 0
+
+
+def test_workers():
+    from fontFeatures.ttLib import unparse
+
+    def summary(ff):
+        return [
+            (r.name, r.flags, r.languages, [rule.asFea() for rule in r.rules])
+            for r in ff.routines
+        ]
+
+    serial = unparse(TTFont("fonts/Amiri-Regular.ttf"))
+    parallel = unparse(TTFont("fonts/Amiri-Regular.ttf"), workers=2)
+    assert summary(parallel) == summary(serial)
+    chains = [r for r in parallel.allRules(Chaining) if any(r.lookups)]
+    for rule in chains:
+        for lookuplist in rule.lookups:
+            for reference in lookuplist or []:
+                assert reference.routine in parallel.routines
+                assert reference.name == reference.routine.name
+
+
+def _editSingleSubstitution(font):
+    # Changes a substitution in the font's GSUB table in memory only
+    for lookup in font["GSUB"].table.LookupList.Lookup:
+        for subtable in lookup.SubTable:
+            mapping = getattr(subtable, "mapping", None)
+            if mapping and mapping.get("uni0431") == "uni0431.ital":
+                mapping["uni0431"] = ".notdef"
+                return
+
+
+def _singleSubstitutions(ff, glyph):
+    return [
+        rule.asFea()
+        for rule in ff.allRules(Substitution)
+        if rule.input == [[glyph]] and len(rule.replacement) == 1
+    ]
+
+
+def test_workers_edited_table():
+    from fontFeatures.ttLib import unparse
+
+    font = TTFont("tests/data/LibertinusSans-Regular.otf")
+    _editSingleSubstitution(font)
+    serial = _singleSubstitutions(unparse(font), "uni0431")
+    assert "sub uni0431 by .notdef;" in serial
+
+    font = TTFont("tests/data/LibertinusSans-Regular.otf")
+    _editSingleSubstitution(font)
+    assert _singleSubstitutions(unparse(font, workers=2), "uni0431") == serial
+
+
+def test_cache(tmp_path):
+    import os
+    from fontFeatures.ttLib import unparse
+    from fontFeatures.ttLib.UnparseCache import UnparseCache
+
+    cache = UnparseCache(str(tmp_path))
+    font = TTFont("fonts/Amiri-Regular.ttf")
+    first = unparse(font, cache=cache)
+    assert len(cache.entries()) == 1
+    font2 = TTFont("fonts/Amiri-Regular.ttf")
+    second = unparse(font2, cache=cache)
+    assert second is not first
+    assert [r.name for r in second.routines] == [r.name for r in first.routines]
+    # Attachments refer to the font they were read from this time
+    fonts = {id(a.font) for a in second.allRules(Attachment) if a.font}
+    assert fonts == {id(font2)}
+
+    # Other arguments or another font make new entries
+    unparse(font, cache=cache, config={"SingleSubstitution3": "locl_ar"})
+    unparse(TTFont("fonts/Roboto-Regular.ttf"), cache=cache)
+    assert len(cache.entries()) == 3
+
+    # A damaged entry is read afresh
+    path = cache.entries()[-1][0]
+    with open(path, "wb") as f:
+        f.write(b"not a pickle")
+    unparse(TTFont("fonts/Roboto-Regular.ttf"), cache=cache)
+    assert os.path.getsize(path) > 100
+
+    # The least recently used entries go once the cache is too large
+    cache.max_size = cache.entries()[-1][1]
+    cache.evict()
+    assert [e[0] for e in cache.entries()] == [path]
+
+    # A table edited in memory does not hit the entry for the file
+    cache = UnparseCache(str(tmp_path / "edited"))
+    libertinus = "tests/data/LibertinusSans-Regular.otf"
+    unparse(TTFont(libertinus), cache=cache)
+    assert len(cache.entries()) == 1
+    font = TTFont(libertinus)
+    _editSingleSubstitution(font)
+    edited = _singleSubstitutions(unparse(font, cache=cache), "uni0431")
+    assert "sub uni0431 by .notdef;" in edited
@@ -0,0 +1,50 @@
+# Measures how shaping time scales with buffer length, comparing the
+# incremental Buffer.update against recategorizing the whole buffer after
+# every rule application.
+import timeit
+from argparse import ArgumentParser
+from babelfont import load
+from fontFeatures import Routine, Substitution
+from fontFeatures.shaperLib.Buffer import Buffer
+
+
+class FullUpdateBuffer(Buffer):
+    def update(self):
+        self.recategorize()
+
+
+parser = ArgumentParser()
+parser.add_argument(
+    "input",
+    help="font file to process",
+    metavar="FILE",
+    nargs="?",
+    default="tests/data/LibertinusSans-Regular.otf",
+)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument(
+    "--all", action="store_true", help="also time full updates on 10k glyphs"
+)
+args = parser.parse_args()
+font = load(args.input)
+
+routine = Routine(flags=0x8)
+routine.addRule(Substitution([["f"], ["i"]], [["F"]]))
+routine.addRule(Substitution([["a"]], [["A"]]))
+routine.addRule(Substitution([["e"]], [["E"], ["E"]]))
+
+pattern = ["f", "i", "a", "b", "e", "c", "d", "g", "h", "space"]
+
+for size in [1000, 10000]:
+    glyphs = (pattern * (size // len(pattern)))[:size]
+    for klass in [FullUpdateBuffer, Buffer]:
+        if klass is FullUpdateBuffer and size > 1000 and not args.all:
+            print("%6i glyphs, %-16s: (skipped, use --all)" % (size, klass.__name__))
+            continue
+
+        def run():
+            buf = klass(font, glyphs=glyphs)
+            routine.apply_to_buffer(buf)
+
+        best = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print("%6i glyphs, %-16s: %.3fs" % (size, klass.__name__, best))
@@ -0,0 +1,76 @@
+# Measures buildBinaryFeatures on the layout of an existing font, comparing
+# memoized involved_glyphs, stage and lookup_type against recomputing them
+# on every access. Also times the accesses on their own, as the build spends
+# most of its time elsewhere. Garbage collection is disabled during the build,
+# as a full collection landing in one run or the other swamps the difference.
+import copy
+import gc
+import time
+import timeit
+from argparse import ArgumentParser
+from fontTools.ttLib import TTFont
+from fontFeatures import Rule, Routine
+from fontFeatures.ttLib import unparse
+
+
+def uncached(self, name, compute):
+    return compute()
+
+
+def access(ff):
+    for routine in ff.routines:
+        routine.stage
+        routine.involved_glyphs
+        for rule in routine.rules:
+            rule.lookup_type()
+
+
+parser = ArgumentParser()
+parser.add_argument(
+    "input",
+    help="font file to process",
+    metavar="FILE",
+    nargs="?",
+    default="fonts/Amiri-Regular.ttf",
+)
+parser.add_argument("--repeat", type=int, default=5)
+args = parser.parse_args()
+
+font = TTFont(args.input)
+ff = unparse(font, do_gdef=True)
+print(
+    "%s: %i routines, %i rules"
+    % (args.input, len(ff.routines), sum(len(r.rules) for r in ff.routines))
+)
+
+memos = (Rule._memo, Routine._memo)
+builds = {}
+accesses = {}
+# Alternate between the two so that both see the same heap growth
+for _ in range(args.repeat):
+    for label in ["recomputed", "memoized"]:
+        if label == "recomputed":
+            Rule._memo = Routine._memo = uncached
+        else:
+            Rule._memo, Routine._memo = memos
+        elapsed = timeit.timeit(lambda: access(ff), number=10)
+        accesses[label] = min(accesses.get(label, elapsed), elapsed)
+
+        work = copy.deepcopy(ff)
+        target = TTFont(args.input)
+        for tag in ["GDEF", "GSUB", "GPOS"]:
+            if tag in target:
+                del target[tag]
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        work.buildBinaryFeatures(target)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        builds[label] = min(builds.get(label, elapsed), elapsed)
+
+for label in builds:
+    print(
+        "%-10s: 10x stage/involved_glyphs/lookup_type %.3fs, buildBinaryFeatures %.3fs"
+        % (label, accesses[label], builds[label])
+    )
@@ -0,0 +1,55 @@
+# Measures the memory held by the FontFeatures object unparsed from a font,
+# with and without compact glyph slots. Rules read without compaction share
+# coverage lists with the font, so the memory is measured both with the font
+# kept open (counting only what unparsing adds) and once it is closed
+# (counting everything the FontFeatures object keeps alive). Any fonts may
+# be given; large CJK fonts, with many rules sharing slots, gain the most.
+import gc
+import tracemalloc
+import warnings
+from argparse import ArgumentParser
+from fontTools.ttLib import TTFont
+from fontFeatures.ttLib import unparse
+
+parser = ArgumentParser()
+parser.add_argument(
+    "input",
+    help="font files to process",
+    metavar="FILE",
+    nargs="*",
+    default=["fonts/NotoNastaliqUrdu-Dummy.ttf", "fonts/Amiri-Regular.ttf"],
+)
+args = parser.parse_args()
+warnings.simplefilter("ignore")
+
+
+def measure(path, compact, keep_font):
+    gc.collect()
+    if keep_font:
+        font = TTFont(path)
+        for tag in ["GDEF", "GSUB", "GPOS"]:
+            if tag in font:
+                font[tag].table
+    tracemalloc.start()
+    if not keep_font:
+        font = TTFont(path)
+    ff = unparse(font, do_gdef=True, compact=compact)
+    if not keep_font:
+        del font
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current / 1024
+
+
+for path in args.input:
+    for compact in [False, True]:
+        print(
+            "%s, %-7s: %8.1f KiB with the font open, %8.1f KiB once closed"
+            % (
+                path,
+                "compact" if compact else "lists",
+                measure(path, compact, True),
+                measure(path, compact, False),
+            )
+        )